@@ -29,6 +29,8 @@
 
 import logging
 import time
+
+import numpy as np
 from twisted.spread import pb
 from twisted.internet import reactor, error
 from twisted.internet.defer import DeferredList
@@ -179,9 +181,4 @@ def assemble_qubit(realM, imagM):
     Reconstitute the qubit as array from its real and imaginary components given as a list.
     We need this since Twisted PB does not support sending complex valued object natively.
     """
-    M = realM
-    for s in range(len(M)):
-        for t in range(len(M)):
-            M[s][t] = realM[s][t] + 1j * imagM[s][t]
-
-    return M
+    return np.array(realM) + 1j * np.array(imagM)
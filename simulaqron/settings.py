@@ -45,6 +45,9 @@ class SimBackend(Enum):
     STABILIZER = "stabilizer"
     PROJECTQ = "projectq"
     QUTIP = "qutip"
+    HYBRID = "hybrid"
+    EXTENDED_STABILIZER = "extended_stabilizer"
+    BATCHED = "batched"
 
 
 class Config:
@@ -68,7 +71,15 @@ class Config:
         "sim_backend": SimBackend.STABILIZER.value,
         "network_config_file": os.path.join(config_folder, "network.json"),
         "noisy_qubits": False,
-        "t1": 1.0
+        "t1": 1.0,
+        "ext_stabilizer_precision": 0.0,
+        "batch_shots": 1,
+        "lock_manager": "",
+        "max_connections": 64,
+        "offload_threshold": 1048576,  # (bytes)
+        "offload_threads": 4,
+        "payload_compression": "zlib",
+        "payload_compression_threshold": 65536,  # (bytes)
     }
 
     class Decorator:
@@ -240,5 +251,85 @@ class Config:
     def t1(self, t1):
         pass
 
+    @property
+    @Decorator.get_setting
+    def ext_stabilizer_precision(self):
+        pass
+
+    @ext_stabilizer_precision.setter
+    @Decorator.set_setting
+    def ext_stabilizer_precision(self, ext_stabilizer_precision):
+        pass
+
+    @property
+    @Decorator.get_setting
+    def batch_shots(self):
+        pass
+
+    @batch_shots.setter
+    @Decorator.set_setting
+    def batch_shots(self, batch_shots):
+        pass
+
+    @property
+    @Decorator.get_setting
+    def lock_manager(self):
+        pass
+
+    @lock_manager.setter
+    @Decorator.set_setting
+    def lock_manager(self, lock_manager):
+        pass
+
+    @property
+    @Decorator.get_setting
+    def max_connections(self):
+        pass
+
+    @max_connections.setter
+    @Decorator.set_setting
+    def max_connections(self, max_connections):
+        pass
+
+    @property
+    @Decorator.get_setting
+    def offload_threshold(self):
+        pass
+
+    @offload_threshold.setter
+    @Decorator.set_setting
+    def offload_threshold(self, offload_threshold):
+        pass
+
+    @property
+    @Decorator.get_setting
+    def offload_threads(self):
+        pass
+
+    @offload_threads.setter
+    @Decorator.set_setting
+    def offload_threads(self, offload_threads):
+        pass
+
+    @property
+    @Decorator.get_setting
+    def payload_compression(self):
+        pass
+
+    @payload_compression.setter
+    @Decorator.set_setting
+    def payload_compression(self, payload_compression):
+        pass
+
+    @property
+    @Decorator.get_setting
+    def payload_compression_threshold(self):
+        pass
+
+    @payload_compression_threshold.setter
+    @Decorator.set_setting
+    def payload_compression_threshold(self, payload_compression_threshold):
+        pass
+
 
 simulaqron_settings = Config()
@@ -8,9 +8,10 @@ from daemons.interfaces import exit
 
 import simulaqron
 from simulaqron.network import Network
-from simulaqron.settings import simulaqron_settings, SimBackend
+from simulaqron.settings import simulaqron_settings
 from simulaqron.toolbox.manage_nodes import NetworksConfigConstructor
 from simulaqron.toolbox.reset import main as reset_simulaqron
+from simulaqron.virtual_node.engine_registry import default_engines
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 PID_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".simulaqron_pids")
@@ -53,6 +54,17 @@ class SimulaQronDaemon(run.RunDaemon):
             time.sleep(0.1)
 
 
+def _check_sim_backend(ctx, param, value):
+    """
+    Checks that the backend is an engine of the engine registry which can be used as sim_backend, this includes
+    engines registered through entry points.
+    """
+    engines = default_engines()
+    if value not in engines:
+        raise click.BadParameter(f"{value} is not one of {', '.join(engines)}")
+    return value
+
+
 def _is_positive_answer(answer):
     """
     Used to check if an answer is positive from a user.
@@ -231,9 +243,9 @@ def default():
 
 
 @set.command()
-@click.argument('value', type=click.Choice([b.value for b in SimBackend]))
+@click.argument('value', callback=_check_sim_backend)
 def sim_backend(value):
-    """The backend to use (stabilizer, projectq, qutip)."""
+    """The backend to use (stabilizer, projectq, qutip, hybrid, extended_stabilizer or an entry point engine)."""
     simulaqron_settings.sim_backend = value
 
 
@@ -254,7 +266,7 @@ def max_registers(value):
 @set.command()
 @click.argument('value', type=float)
 def conn_retry_time(value):
-    """If setup fails, how long to wait until a retry."""
+    """If setup fails, how long to wait at most until a retry."""
     simulaqron_settings.conn_retry_time = value
 
 
@@ -302,6 +314,62 @@ def t1(value):
     """The effective T1 to be used for noisy qubits"""
     simulaqron_settings.t1 = value
 
+
+@set.command()
+@click.argument('value', type=float)
+def ext_stabilizer_precision(value):
+    """Relative weight below which terms are dropped by the extended_stabilizer backend (0 is exact)"""
+    simulaqron_settings.ext_stabilizer_precision = value
+
+
+@set.command()
+@click.argument('value', type=int)
+def batch_shots(value):
+    """The number of shots simulated at once by the batched backend"""
+    simulaqron_settings.batch_shots = value
+
+
+@set.command()
+@click.argument('value', type=str)
+def lock_manager(value):
+    """Name of the node which grants the node locks for two qubit gates (empty to lock the nodes in order directly)"""
+    simulaqron_settings.lock_manager = value
+
+
+@set.command()
+@click.argument('value', type=int)
+def max_connections(value):
+    """Maximal number of connections a virtual node keeps open to other virtual nodes (0 for no limit)"""
+    simulaqron_settings.max_connections = value
+
+
+@set.command()
+@click.argument('value', type=int)
+def offload_threshold(value):
+    """Number of bytes of state from which operations on a register are run in a separate thread (0 for never)"""
+    simulaqron_settings.offload_threshold = value
+
+
+@set.command()
+@click.argument('value', type=int)
+def offload_threads(value):
+    """Maximal number of threads running operations on large registers"""
+    simulaqron_settings.offload_threads = value
+
+
+@set.command()
+@click.argument('value', type=click.Choice(["none", "zlib", "lzma"]))
+def payload_compression(value):
+    """Compression of the registers sent to other nodes (none/zlib/lzma)"""
+    simulaqron_settings.payload_compression = value
+
+
+@set.command()
+@click.argument('value', type=int)
+def payload_compression_threshold(value):
+    """Number of bytes from which the arrays of registers sent to other nodes are compressed"""
+    simulaqron_settings.payload_compression_threshold = value
+
 ###############
 # get command #
 ###############
@@ -315,7 +383,7 @@ def get():
 
 @get.command()
 def sim_backend():
-    """The backend to use (stabilizer, projectq, qutip)."""
+    """The backend to use (stabilizer, projectq, qutip, hybrid, extended_stabilizer or an entry point engine)."""
     print(simulaqron_settings.sim_backend)
 
 
@@ -333,7 +401,7 @@ def max_registers():
 
 @get.command()
 def conn_retry_time():
-    """If setup fails, how long to wait until a retry."""
+    """If setup fails, how long to wait at most until a retry."""
     print(simulaqron_settings.conn_retry_time)
 
 
@@ -375,6 +443,54 @@ def t1():
     """The effective T1 to be used for noisy qubits"""
     print(simulaqron_settings.t1)
 
+
+@get.command()
+def ext_stabilizer_precision():
+    """Relative weight below which terms are dropped by the extended_stabilizer backend (0 is exact)"""
+    print(simulaqron_settings.ext_stabilizer_precision)
+
+
+@get.command()
+def batch_shots():
+    """The number of shots simulated at once by the batched backend"""
+    print(simulaqron_settings.batch_shots)
+
+
+@get.command()
+def lock_manager():
+    """Name of the node which grants the node locks for two qubit gates (empty to lock the nodes in order directly)"""
+    print(simulaqron_settings.lock_manager)
+
+
+@get.command()
+def max_connections():
+    """Maximal number of connections a virtual node keeps open to other virtual nodes (0 for no limit)"""
+    print(simulaqron_settings.max_connections)
+
+
+@get.command()
+def offload_threshold():
+    """Number of bytes of state from which operations on a register are run in a separate thread (0 for never)"""
+    print(simulaqron_settings.offload_threshold)
+
+
+@get.command()
+def offload_threads():
+    """Maximal number of threads running operations on large registers"""
+    print(simulaqron_settings.offload_threads)
+
+
+@get.command()
+def payload_compression():
+    """Compression of the registers sent to other nodes (none/zlib/lzma)"""
+    print(simulaqron_settings.payload_compression)
+
+
+@get.command()
+def payload_compression_threshold():
+    """Number of bytes from which the arrays of registers sent to other nodes are compressed"""
+    print(simulaqron_settings.payload_compression_threshold)
+
 ###############
 # node command #
 ###############
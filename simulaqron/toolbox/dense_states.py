@@ -0,0 +1,374 @@
+##########################################################################################
+#
+# This file contains functions for manipulating dense pure states (state vectors) using numpy.
+# A state on n qubits is stored as a complex array of shape (2,) * n, where axis i corresponds
+# to qubit i. A state on no qubits is an array of shape () containing the global amplitude.
+#
+##########################################################################################
+
+import math
+from functools import lru_cache
+
+import numpy as np
+
+_f = 1 / math.sqrt(2)
+
+# Single qubit gates
+X = np.array([[0, 1], [1, 0]], dtype=complex)
+Y = np.array([[0, -1j], [1j, 0]], dtype=complex)
+Z = np.array([[1, 0], [0, -1]], dtype=complex)
+H = np.array([[_f, _f], [_f, -_f]], dtype=complex)
+K = np.array([[_f, -1j * _f], [1j * _f, -_f]], dtype=complex)
+T = np.array([[1, 0], [0, np.exp(1j * np.pi / 4)]], dtype=complex)
+
+# Two qubit gates
+CNOT = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]], dtype=complex)
+CPHASE = np.diag([1, 1, 1, -1]).astype(complex)
+
+# Qubits whose reduced state has a purity within this distance of 1 are considered to be in a product state
+PURITY_TOLERANCE = 1e-9
+
+
+def empty_state():
+    """
+    Returns the state on no qubits.
+    """
+    return np.ones((), dtype=complex)
+
+
+def basis_state(bits):
+    """
+    Returns the computational basis state given by the list of bits.
+    """
+    state = np.zeros((2,) * len(bits), dtype=complex)
+    state[tuple(bits)] = 1
+    return state
+
+
+def num_qubits(state):
+    """
+    Returns the number of qubits of the state.
+    """
+    return state.ndim
+
+
+def rotation(n, a):
+    """
+    Returns the unitary of a rotation around the axis n with the angle a.
+
+    :param n: tuple of floats
+        A tuple of three numbers specifying the rotation axis, e.g n=(1,0,0)
+    :param a: float
+        The rotation angle in radians.
+    """
+    nNorm = np.linalg.norm(n)
+    if nNorm == 0:
+        raise ValueError("Rotation vector n can't be 0")
+    nx, ny, nz = (c / nNorm for c in n)
+    return math.cos(a / 2) * np.identity(2, dtype=complex) - 1j * math.sin(a / 2) * (nx * X + ny * Y + nz * Z)
+
+
+def tensor(state1, state2):
+    """
+    Returns the tensor product of two states, the qubits of state1 come first.
+    """
+    return np.tensordot(state1, state2, axes=0)
+
+
+def apply_gate(state, gate, axes):
+    """
+    Applies the unitary gate, acting on len(axes) qubits, to the qubits of the state given by axes.
+
+    :param state: :obj:`numpy.array`
+    :param gate: array_like
+        A 2^k x 2^k matrix, where k = len(axes).
+    :param axes: list of int
+        The qubits the gate acts on, in the order of the tensor factors of the gate.
+    :return: The new state
+    :rtype: :obj:`numpy.array`
+    """
+    k = len(axes)
+    gate = np.asarray(gate, dtype=complex).reshape((2,) * (2 * k))
+    state = np.tensordot(gate, state, axes=(list(range(k, 2 * k)), list(axes)))
+    return np.moveaxis(state, list(range(k)), list(axes))
+
+
+def measure(state, axis, inplace=False):
+    """
+    Measures the qubit given by axis in the standard basis.
+
+    :param state: :obj:`numpy.array`
+    :param axis: int
+    :param inplace: bool
+        If False the measured qubit is removed from the returned state, otherwise it is kept in the post-measurement
+        state.
+    :return: The outcome and the post-measurement state
+    :rtype: tuple
+    """
+    slices = np.moveaxis(state, axis, 0)
+    probs = np.array([np.vdot(slices[0], slices[0]).real, np.vdot(slices[1], slices[1]).real])
+    probs = probs / probs.sum()
+    outcome = int(np.random.choice([0, 1], p=probs))
+    post = slices[outcome] / math.sqrt(probs[outcome])
+    if inplace:
+        new_state = np.zeros_like(state)
+        np.moveaxis(new_state, axis, 0)[outcome] = post
+        return outcome, new_state
+    return outcome, post
+
+
+@lru_cache(maxsize=256)
+def _ket_trace_plan(n, keep):
+    """
+    Returns the permutation of the axes of a state on n qubits which puts the qubits in keep first.
+    """
+    return list(keep) + [axis for axis in range(n) if axis not in keep]
+
+
+@lru_cache(maxsize=256)
+def _dm_trace_plan(n, keep):
+    """
+    Returns the einsum subscripts to trace out all qubits not in keep from a density matrix on n qubits, reshaped
+    to have one axis per qubit for the rows followed by one axis per qubit for the columns.
+    """
+    rows = list(range(n))
+    columns = [n + axis if axis in keep else axis for axis in range(n)]
+    output = [axis for axis in keep] + [n + axis for axis in keep]
+    return rows + columns, output
+
+
+def reduced_density_matrix(state, keep):
+    """
+    Returns the density matrix of the qubits in keep, tracing out the others.
+
+    :param state: :obj:`numpy.array`
+    :param keep: list of int
+        The qubits to keep, in the order they should appear in the density matrix.
+    :return: The 2^k x 2^k density matrix, where k = len(keep)
+    :rtype: :obj:`numpy.array`
+    """
+    keep = tuple(keep)
+    n = state.ndim
+    k = len(keep)
+    matrix = np.transpose(state, _ket_trace_plan(n, keep)).reshape(2 ** k, 2 ** (n - k))
+    return matrix @ matrix.conj().T
+
+
+def partial_trace(rho, keep):
+    """
+    Returns the density matrix of the qubits in keep, tracing out the others.
+
+    :param rho: :obj:`numpy.array`
+        A 2^n x 2^n density matrix.
+    :param keep: list of int
+        The qubits to keep, in the order they should appear in the density matrix.
+    :return: The 2^k x 2^k density matrix, where k = len(keep)
+    :rtype: :obj:`numpy.array`
+    """
+    keep = tuple(keep)
+    n = int(math.log2(rho.shape[0]))
+    k = len(keep)
+    subscripts, output = _dm_trace_plan(n, keep)
+    reduced = np.einsum(np.asarray(rho).reshape((2,) * (2 * n)), subscripts, output)
+    return reduced.reshape(2 ** k, 2 ** k)
+
+
+def single_qubit_purities(state):
+    """
+    Returns the purity Tr(rho_i^2) of the reduced state rho_i of every qubit i. A qubit is in a product state with
+    the others exactly if its purity is 1.
+
+    :param state: :obj:`numpy.array`
+    :rtype: :obj:`numpy.array`
+    """
+    rhos = [reduced_density_matrix(state, [axis]) for axis in range(state.ndim)]
+    return np.array([np.vdot(rho, rho).real for rho in rhos])
+
+
+def dm_single_qubit_purities(rho):
+    """
+    As single_qubit_purities but for the 2^n x 2^n density matrix rho.
+    """
+    n = int(math.log2(rho.shape[0]))
+    rhos = [partial_trace(rho, [axis]) for axis in range(n)]
+    return np.array([np.vdot(r, r).real for r in rhos])
+
+
+def pure_state(rho):
+    """
+    Returns the state vector of the pure density matrix rho, i.e. its eigenvector with the largest eigenvalue.
+    """
+    values, vectors = np.linalg.eigh(rho)
+    return vectors[:, np.argmax(values)]
+
+
+def _marginal(probs, axes):
+    """
+    Sums the probabilities, given with one axis per qubit, over all qubits not in axes.
+    """
+    n = probs.ndim
+    k = len(axes)
+    probs = np.transpose(probs, _ket_trace_plan(n, tuple(axes))).reshape(2 ** k, 2 ** (n - k))
+    return probs.sum(axis=1)
+
+
+def probabilities(state, axes):
+    """
+    Returns the probabilities of the outcomes of measuring the qubits in axes in the standard basis.
+    The outcome of axes[0] is the most significant bit of the index.
+
+    :param state: :obj:`numpy.array`
+    :param axes: list of int
+    :rtype: :obj:`numpy.array`
+    """
+    return _marginal(np.abs(state) ** 2, axes)
+
+
+def dm_probabilities(rho, axes):
+    """
+    As probabilities but for the 2^n x 2^n density matrix rho.
+    """
+    n = int(math.log2(rho.shape[0]))
+    return _marginal(np.diagonal(rho).real.reshape((2,) * n), axes)
+
+
+def _sample(probs, k):
+    """
+    Samples an outcome from the probabilities and returns it as a list of k bits, the most significant first.
+    """
+    probs = np.clip(probs, 0, None)
+    index = int(np.random.choice(len(probs), p=probs / probs.sum()))
+    return [(index >> (k - 1 - j)) & 1 for j in range(k)], probs[index] / probs.sum()
+
+
+def measure_qubits(state, axes, inplace=False):
+    """
+    Measures the qubits given by axes in the standard basis, sampling the joint outcome at once.
+
+    :param state: :obj:`numpy.array`
+    :param axes: list of int
+    :param inplace: bool
+        If False the measured qubits are removed from the returned state, otherwise they are kept in the
+        post-measurement state.
+    :return: The outcomes, in the order of axes, and the post-measurement state
+    :rtype: tuple
+    """
+    outcomes, p = _sample(probabilities(state, axes), len(axes))
+    index = [slice(None)] * state.ndim
+    for axis, outcome in zip(axes, outcomes):
+        index[axis] = outcome
+    post = state[tuple(index)] / math.sqrt(p)
+    if inplace:
+        new_state = np.zeros_like(state)
+        new_state[tuple(index)] = post
+        return outcomes, new_state
+    return outcomes, post
+
+
+def dm_measure_qubits(rho, axes, inplace=False):
+    """
+    As measure_qubits but for the 2^n x 2^n density matrix rho.
+    """
+    n = int(math.log2(rho.shape[0]))
+    outcomes, p = _sample(dm_probabilities(rho, axes), len(axes))
+    index = [slice(None)] * n
+    for axis, outcome in zip(axes, outcomes):
+        index[axis] = outcome
+    index = tuple(index + index)
+    rho = np.asarray(rho).reshape((2,) * (2 * n))
+    post = rho[index] / p
+    if inplace:
+        new_rho = np.zeros_like(rho)
+        new_rho[index] = post
+        return outcomes, new_rho.reshape(2 ** n, 2 ** n)
+    m = 2 ** (n - len(axes))
+    return outcomes, post.reshape(m, m)
+
+
+_PAULIS = {"X": X, "Y": Y, "Z": Z}
+
+
+def _apply_pauli_string(state, pauli_string, axes):
+    if len(pauli_string) != len(axes):
+        raise ValueError("Pauli string {} does not match the number of qubits {}".format(pauli_string, len(axes)))
+    for pauli, axis in zip(pauli_string, axes):
+        if pauli == "I":
+            continue
+        if pauli not in _PAULIS:
+            raise ValueError("Cannot parse {} as a Pauli string".format(pauli_string))
+        state = apply_gate(state, _PAULIS[pauli], [axis])
+    return state
+
+
+def expectation(state, pauli_string, axes):
+    """
+    Returns the expectation value of a tensor product of Paulis.
+
+    :param state: :obj:`numpy.array`
+    :param pauli_string: str
+        A string of the characters I, X, Y and Z, e.g. "XZ"
+    :param axes: list of int
+        The qubits the Paulis act on, in the order of pauli_string.
+    :rtype: float
+    """
+    return float(np.vdot(state, _apply_pauli_string(state, pauli_string, axes)).real)
+
+
+def dm_expectation(rho, pauli_string, axes):
+    """
+    As expectation but for the 2^n x 2^n density matrix rho.
+    """
+    n = int(math.log2(rho.shape[0]))
+    # Apply the Paulis to the row indices of rho
+    prho = _apply_pauli_string(np.asarray(rho).reshape((2,) * (2 * n)), pauli_string, axes)
+    return float(np.trace(prho.reshape(2 ** n, 2 ** n)).real)
+
+
+def apply_pauli_row(vec, row, n):
+    """
+    Applies the Pauli operator given as a row of a StabilizerState to the flattened state vec.
+    Qubit 0 corresponds to the most significant bit of the index.
+    """
+    idx = np.arange(2 ** n)
+    x = np.asarray(row[:n], dtype=bool)
+    z = np.asarray(row[n:2 * n], dtype=bool)
+    x_mask = 0
+    for q in np.flatnonzero(x):
+        x_mask |= 1 << (n - 1 - q)
+    parity = np.zeros(2 ** n, dtype=int)
+    for q in np.flatnonzero(z):
+        parity ^= (idx >> (n - 1 - q)) & 1
+    # P = (-1)^phase * i^(#Y) * X^x Z^z
+    coefficient = (-1) ** int(row[-1]) * 1j ** int(np.sum(x & z))
+    new_vec = np.empty_like(vec)
+    new_vec[idx ^ x_mask] = coefficient * (1 - 2 * parity) * vec
+    return new_vec
+
+
+def stabilizer_to_state(stabilizer_state):
+    """
+    Converts a StabilizerState to a dense state, by projecting a computational basis state in the support of the
+    state onto the common +1 eigenspace of the generators.
+
+    :param stabilizer_state: :obj:`simulaqron.toolbox.stabilizer_states.StabilizerState`
+    :return: The dense state
+    :rtype: :obj:`numpy.array`
+    """
+    n = stabilizer_state.num_qubits
+    if n == 0:
+        return empty_state()
+    group = stabilizer_state.to_array(standard_form=True)
+
+    # Rows without X-part are the Z-type constraints on the support, after Gaussian elimination
+    # each of these fixes the bit of its pivot column
+    bits = [0] * n
+    for row in group:
+        if not row[:n].any():
+            pivot = np.flatnonzero(row[n:2 * n])[0]
+            bits[pivot] = int(row[-1])
+
+    vec = basis_state(bits).reshape(-1)
+    for row in group:
+        vec = (vec + apply_pauli_row(vec, row, n)) / 2
+    vec = vec / np.linalg.norm(vec)
+    return vec.reshape((2,) * n)
@@ -0,0 +1,490 @@
+##########################################################################################
+#
+# This file contains a class for describing states which are close to stabilizer states,
+# i.e. states prepared by Clifford circuits with only a few non-Clifford gates.
+#
+# A state is written as U|phi>, where U is a Clifford unitary and |phi> is a sparse superposition
+# of computational basis states. U is stored as a tableau of the images of the Pauli X and Z
+# operators of each qubit (destabilizers and stabilizers). Clifford gates only update the tableau.
+# Any other gate is decomposed into Pauli operators, each of which acts on |phi> as a signed
+# permutation of the basis states. The cost is therefore exponential only in the number of
+# non-Clifford gates, not in the number of qubits.
+#
+##########################################################################################
+
+import math
+
+import numpy as np
+
+from simulaqron.toolbox.stabilizer_states import StabilizerState
+from simulaqron.toolbox import dense_states
+
+# Terms with a relative weight below this value are always considered to be numerical noise
+_MIN_WEIGHT = 1e-20
+
+# Conjugation tables for single qubit Cliffords: G X^x Z^z G^dagger = i^k X^x' Z^z', indexed by 2 * x + z
+_TABLES = {
+    "H": ((0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 2)),
+    "S": ((0, 0, 0), (0, 1, 0), (1, 1, 1), (1, 0, 1)),
+    "K": ((0, 0, 0), (1, 1, 1), (1, 0, 2), (0, 1, 3)),
+    "X": ((0, 0, 0), (0, 1, 2), (1, 0, 0), (1, 1, 2)),
+    "Y": ((0, 0, 0), (0, 1, 2), (1, 0, 2), (1, 1, 0)),
+    "Z": ((0, 0, 0), (0, 1, 0), (1, 0, 2), (1, 1, 2)),
+}
+_TABLES = {name: np.array(table) for name, table in _TABLES.items()}
+
+
+def _popcount(a):
+    return bin(a).count("1")
+
+
+def _bits_to_int(bits):
+    return sum(1 << int(i) for i in np.flatnonzero(bits))
+
+
+class ExtendedStabilizerState:
+    def __init__(self, num_qubits=0, precision=0.0):
+        """
+        Creates a state on num_qubits qubits, all in the state \|0\>.
+
+        :param num_qubits: int
+        :param precision: float
+            Terms of the superposition whose relative weight is below precision are dropped after every
+            non-Clifford gate and measurement. A value of 0 keeps the simulation exact, larger values trade
+            accuracy for speed.
+        """
+        n = num_qubits
+        # Row i is the destabilizer U X_i U^dagger, row n + i the stabilizer U Z_i U^dagger.
+        # A row represents the Pauli i^phase X^x Z^z.
+        self._x = np.zeros((2 * n, n), dtype=bool)
+        self._z = np.zeros((2 * n, n), dtype=bool)
+        self._x[:n] = np.identity(n, dtype=bool)
+        self._z[n:] = np.identity(n, dtype=bool)
+        self._phase = np.zeros(2 * n, dtype=int)
+        # Basis state (bit i is qubit i) -> amplitude
+        self.terms = {0: complex(1)}
+        self.precision = precision
+
+    @property
+    def num_qubits(self):
+        return self._x.shape[1]
+
+    @property
+    def num_terms(self):
+        return len(self.terms)
+
+    def __len__(self):
+        return self.num_qubits
+
+    def copy(self):
+        new_state = ExtendedStabilizerState(precision=self.precision)
+        new_state._x = self._x.copy()
+        new_state._z = self._z.copy()
+        new_state._phase = self._phase.copy()
+        new_state.terms = dict(self.terms)
+        return new_state
+
+    def to_lists(self):
+        """
+        Returns the state as lists, which can be sent using twisted.
+        The first element describes the tableau and the second the terms of the superposition as [basis, real, imag].
+        """
+        tableau = [self._x.tolist(), self._z.tolist(), self._phase.tolist()]
+        terms = [[a, c.real, c.imag] for a, c in self.terms.items()]
+        return tableau, terms
+
+    @classmethod
+    def from_lists(cls, tableau, terms, precision=0.0):
+        """
+        Creates a state from the output of to_lists.
+        """
+        x, z, phase = tableau
+        n = len(phase) // 2
+        new_state = cls(precision=precision)
+        new_state._x = np.array(x, dtype=bool).reshape(2 * n, n)
+        new_state._z = np.array(z, dtype=bool).reshape(2 * n, n)
+        new_state._phase = np.array(phase, dtype=int)
+        new_state.terms = {int(a): complex(re, im) for a, re, im in terms}
+        return new_state
+
+    def to_arrays(self):
+        """
+        Returns the state as a dictionary of numpy arrays: the tableau as x, z and phase and the terms of the
+        superposition as basis and amplitudes. The basis states are stored as unsigned 64 bit integers, so this is
+        only possible for states of at most 64 qubits.
+        """
+        if self.num_qubits > 64:
+            raise ValueError("Basis states of more than 64 qubits do not fit in 64 bit integers")
+        return {
+            "x": self._x,
+            "z": self._z,
+            "phase": self._phase,
+            "basis": np.fromiter(self.terms.keys(), dtype=np.uint64, count=len(self.terms)),
+            "amplitudes": np.fromiter(self.terms.values(), dtype=complex, count=len(self.terms)),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, precision=0.0):
+        """
+        Creates a state from the output of to_arrays.
+        """
+        new_state = cls(precision=precision)
+        new_state._x = np.array(arrays["x"], dtype=bool)
+        new_state._z = np.array(arrays["z"], dtype=bool)
+        new_state._phase = np.array(arrays["phase"], dtype=int)
+        new_state.terms = dict(zip(arrays["basis"].tolist(), arrays["amplitudes"].tolist()))
+        return new_state
+
+    def add_qubit(self):
+        r"""
+        Appends a qubit in the state \|0\> to the current state
+        :return: None
+        """
+        new_state = self.tensor_product(ExtendedStabilizerState(1))
+        self._x, self._z, self._phase, self.terms = new_state._x, new_state._z, new_state._phase, new_state.terms
+
+    def tensor_product(self, other):
+        """
+        Performs the tensor product with another ExtendedStabilizerState and returns a new ExtendedStabilizerState.
+        The qubits of self come first.
+        """
+        n1 = self.num_qubits
+        n2 = other.num_qubits
+        n = n1 + n2
+        new_state = ExtendedStabilizerState(precision=self.precision)
+        new_state._x = np.zeros((2 * n, n), dtype=bool)
+        new_state._z = np.zeros((2 * n, n), dtype=bool)
+        new_state._phase = np.zeros(2 * n, dtype=int)
+        # First the destabilizers (kind 0) and then the stabilizers (kind 1) of both states
+        for kind in range(2):
+            src1 = slice(kind * n1, (kind + 1) * n1)
+            src2 = slice(kind * n2, (kind + 1) * n2)
+            dst1 = slice(kind * n, kind * n + n1)
+            dst2 = slice(kind * n + n1, (kind + 1) * n)
+            new_state._x[dst1, :n1] = self._x[src1]
+            new_state._z[dst1, :n1] = self._z[src1]
+            new_state._phase[dst1] = self._phase[src1]
+            new_state._x[dst2, n1:] = other._x[src2]
+            new_state._z[dst2, n1:] = other._z[src2]
+            new_state._phase[dst2] = other._phase[src2]
+        new_state.terms = {
+            a1 | (a2 << n1): c1 * c2 for a1, c1 in self.terms.items() for a2, c2 in other.terms.items()
+        }
+        return new_state
+
+    def _check_position(self, position):
+        n = self.num_qubits
+        if not (position >= 0 and position < n):
+            raise ValueError("position= {} if not a valid qubit position (i.e. in [0, {}]".format(position, n))
+
+    def _apply_table(self, position, name):
+        """
+        Applies the single qubit Clifford with the given conjugation table to the tableau.
+        """
+        self._check_position(position)
+        table = _TABLES[name]
+        idx = 2 * self._x[:, position].astype(int) + self._z[:, position]
+        self._x[:, position] = table[idx, 0]
+        self._z[:, position] = table[idx, 1]
+        self._phase = (self._phase + table[idx, 2]) % 4
+
+    def apply_X(self, position):
+        self._apply_table(position, "X")
+
+    def apply_Y(self, position):
+        self._apply_table(position, "Y")
+
+    def apply_Z(self, position):
+        self._apply_table(position, "Z")
+
+    def apply_H(self, position):
+        self._apply_table(position, "H")
+
+    def apply_K(self, position):
+        self._apply_table(position, "K")
+
+    def apply_S(self, position):
+        self._apply_table(position, "S")
+
+    def apply_CNOT(self, control, target):
+        """
+        Applies CNOT using qubit 'control' as control and 'target' as target.
+        """
+        self._check_position(control)
+        self._check_position(target)
+        if control == target:
+            raise ValueError("Control and target qubits cannot be the same")
+        self._x[:, target] ^= self._x[:, control]
+        self._z[:, control] ^= self._z[:, target]
+
+    def apply_CZ(self, control, target):
+        """
+        Applies CZ using qubit 'control' as control and 'target' as target.
+        """
+        self._check_position(control)
+        self._check_position(target)
+        if control == target:
+            raise ValueError("Control and target qubits cannot be the same")
+        self._phase = (self._phase + 2 * (self._x[:, control] & self._x[:, target])) % 4
+        self._z[:, control] ^= self._x[:, target]
+        self._z[:, target] ^= self._x[:, control]
+
+    def _row(self, i):
+        return self._x[i], self._z[i], self._phase[i]
+
+    @staticmethod
+    def _multiply(p1, p2):
+        """
+        Multiplies the Paulis p1 = i^k1 X^x1 Z^z1 and p2 = i^k2 X^x2 Z^z2.
+        """
+        x1, z1, k1 = p1
+        x2, z2, k2 = p2
+        return x1 ^ x2, z1 ^ z2, (k1 + k2 + 2 * int(np.sum(z1 & x2))) % 4
+
+    def _set_row(self, i, pauli):
+        self._x[i], self._z[i], self._phase[i] = pauli
+
+    def _decompose(self, x, z, k=0):
+        """
+        Writes the Pauli i^k X^x Z^z as U (i^kappa X^b Z^e) U^dagger.
+
+        :return: the bits b and e as ints and kappa
+        :rtype: tuple
+        """
+        n = self.num_qubits
+        x = np.asarray(x, dtype=bool)
+        z = np.asarray(z, dtype=bool)
+        anticommute = ((self._x.astype(int) @ z + self._z.astype(int) @ x) % 2).astype(bool)
+        b = anticommute[n:]
+        e = anticommute[:n]
+        pauli = (np.zeros(n, dtype=bool), np.zeros(n, dtype=bool), 0)
+        for i in np.flatnonzero(b):
+            pauli = self._multiply(pauli, self._row(i))
+        for i in np.flatnonzero(e):
+            pauli = self._multiply(pauli, self._row(n + i))
+        return _bits_to_int(b), _bits_to_int(e), (k - pauli[2]) % 4
+
+    def _pauli_terms(self, x, z, k=0):
+        """
+        Returns the terms of the Pauli i^k X^x Z^z applied to the state.
+        """
+        b, e, kappa = self._decompose(x, z, k)
+        factor = 1j ** kappa
+        return {a ^ b: factor * (-1) ** _popcount(a & e) * c for a, c in self.terms.items()}
+
+    def apply_unitary(self, gate, positions):
+        """
+        Applies an arbitrary unitary to the qubits at positions, by decomposing it into Pauli operators.
+
+        :param gate: array_like
+            A 2^m x 2^m matrix, where m = len(positions).
+        :param positions: list of int
+        """
+        for position in positions:
+            self._check_position(position)
+        m = len(positions)
+        gate = np.asarray(gate, dtype=complex)
+        n = self.num_qubits
+        new_terms = {}
+        for xs in range(2 ** m):
+            for zs in range(2 ** m):
+                x_bits = [(xs >> (m - 1 - j)) & 1 for j in range(m)]
+                z_bits = [(zs >> (m - 1 - j)) & 1 for j in range(m)]
+                pauli = np.ones((1, 1), dtype=complex)
+                for xb, zb in zip(x_bits, z_bits):
+                    pauli = np.kron(pauli, np.linalg.matrix_power(dense_states.X, xb) @
+                                    np.linalg.matrix_power(dense_states.Z, zb))
+                coefficient = np.trace(pauli.conj().T @ gate) / 2 ** m
+                if abs(coefficient) < 1e-12:
+                    continue
+                x = np.zeros(n, dtype=bool)
+                z = np.zeros(n, dtype=bool)
+                x[list(positions)] = x_bits
+                z[list(positions)] = z_bits
+                for a, c in self._pauli_terms(x, z).items():
+                    new_terms[a] = new_terms.get(a, 0) + coefficient * c
+        self.terms = new_terms
+        self._truncate()
+
+    def apply_T(self, position):
+        self.apply_unitary(dense_states.T, [position])
+
+    def apply_rotation(self, position, n, a):
+        """
+        Applies a rotation around the axis n with the angle a to the qubit at position.
+        """
+        self.apply_unitary(dense_states.rotation(n, a), [position])
+
+    def _truncate(self):
+        """
+        Removes the terms with a relative weight below the precision and renormalizes.
+        """
+        norm = sum(abs(c) ** 2 for c in self.terms.values())
+        threshold = max(self.precision, _MIN_WEIGHT) * norm
+        self.terms = {a: c for a, c in self.terms.items() if abs(c) ** 2 > threshold}
+        norm = math.sqrt(sum(abs(c) ** 2 for c in self.terms.values()))
+        self.terms = {a: c / norm for a, c in self.terms.items()}
+
+    # The following methods apply a Clifford G to |phi> and replace U by U G^dagger, which leaves the state unchanged.
+
+    def _rebase_CNOT(self, control, target):
+        n = self.num_qubits
+        self.terms = {a ^ (((a >> control) & 1) << target): c for a, c in self.terms.items()}
+        self._set_row(control, self._multiply(self._row(control), self._row(target)))
+        self._set_row(n + target, self._multiply(self._row(n + control), self._row(n + target)))
+
+    def _rebase_CZ(self, qubit1, qubit2):
+        n = self.num_qubits
+        self.terms = {a: c * (-1) ** ((a >> qubit1) & (a >> qubit2) & 1) for a, c in self.terms.items()}
+        destab1 = self._multiply(self._row(qubit1), self._row(n + qubit2))
+        destab2 = self._multiply(self._row(n + qubit1), self._row(qubit2))
+        self._set_row(qubit1, destab1)
+        self._set_row(qubit2, destab2)
+
+    def _rebase_S(self, qubit):
+        n = self.num_qubits
+        self.terms = {a: c * 1j ** ((a >> qubit) & 1) for a, c in self.terms.items()}
+        x, z, k = self._multiply(self._row(qubit), self._row(n + qubit))
+        self._set_row(qubit, (x, z, (k + 3) % 4))
+
+    def _rebase_H(self, qubit):
+        n = self.num_qubits
+        f = 1 / math.sqrt(2)
+        new_terms = {}
+        for a, c in self.terms.items():
+            a0 = a & ~(1 << qubit)
+            a1 = a | (1 << qubit)
+            sign = -1 if (a >> qubit) & 1 else 1
+            new_terms[a0] = new_terms.get(a0, 0) + f * c
+            new_terms[a1] = new_terms.get(a1, 0) + sign * f * c
+        self.terms = new_terms
+        destab = self._row(qubit)
+        stab = self._row(n + qubit)
+        destab = (destab[0].copy(), destab[1].copy(), destab[2])
+        self._set_row(qubit, (stab[0].copy(), stab[1].copy(), stab[2]))
+        self._set_row(n + qubit, destab)
+        self._truncate()
+
+    def _make_diagonal(self, x, z):
+        """
+        Changes U such that the Pauli X^x Z^z is U (+-Z^e) U^dagger, i.e. diagonal on |phi>.
+        """
+        b, e, _ = self._decompose(x, z)
+        if b == 0:
+            return
+        bits = [i for i in range(self.num_qubits) if (b >> i) & 1]
+        pivot = bits[0]
+        for i in bits[1:]:
+            self._rebase_CNOT(pivot, i)
+        _, e, _ = self._decompose(x, z)
+        for i in range(self.num_qubits):
+            if i != pivot and (e >> i) & 1:
+                self._rebase_CZ(pivot, i)
+        if (e >> pivot) & 1:
+            self._rebase_S(pivot)
+        self._rebase_H(pivot)
+
+    def measure(self, position, inplace=True):
+        """
+        Measures the qubit at position in the standard basis. The qubit is kept in the post-measurement state.
+
+        :param position: The position of the qubit.
+        :type position: int
+        :return: The measurement outcome
+        :rtype: int
+        """
+        if not inplace:
+            raise NotImplementedError("Qubits cannot be removed from an ExtendedStabilizerState")
+        self._check_position(position)
+        x = np.zeros(self.num_qubits, dtype=bool)
+        z = np.zeros(self.num_qubits, dtype=bool)
+        z[position] = True
+        self._make_diagonal(x, z)
+        _, e, kappa = self._decompose(x, z)
+        sign = 1 if kappa == 0 else -1
+
+        outcomes = {a: int(sign * (-1) ** _popcount(a & e) == -1) for a in self.terms}
+        p1 = sum(abs(c) ** 2 for a, c in self.terms.items() if outcomes[a] == 1)
+        p1 = min(max(p1 / sum(abs(c) ** 2 for c in self.terms.values()), 0), 1)
+        outcome = int(np.random.choice([0, 1], p=[1 - p1, p1]))
+
+        self.terms = {a: c for a, c in self.terms.items() if outcomes[a] == outcome}
+        self._truncate()
+        return outcome
+
+    def expectation(self, operator):
+        """
+        Returns the expectation value of a Pauli operator, without changing the state.
+
+        :param operator: A string of the characters I, X, Y and Z of length num_qubits, e.g. "XIZ"
+        :type operator: str
+        :rtype: float
+        """
+        if len(operator) != self.num_qubits or not all(pauli in "IXYZ" for pauli in operator):
+            raise ValueError("Cannot parse {} as a Pauli operator.".format(operator))
+        x = np.array([pauli in "XY" for pauli in operator], dtype=bool)
+        z = np.array([pauli in "YZ" for pauli in operator], dtype=bool)
+        # Y = i X Z
+        k = operator.count("Y")
+        new_terms = self._pauli_terms(x, z, k)
+        norm = sum(abs(c) ** 2 for c in self.terms.values())
+        return float(sum(c.conjugate() * new_terms.get(a, 0) for a, c in self.terms.items()).real / norm)
+
+    def probabilities(self, positions):
+        """
+        Returns the probabilities of the outcomes of measuring the qubits at positions in the standard basis,
+        without changing the state. The outcome of positions[0] is the most significant bit of the index.
+        These are computed from the expectation values of the products of Z's on the qubits.
+
+        :param positions: The positions of the qubits.
+        :type positions: list of int
+        :rtype: :obj:`numpy.array`
+        """
+        for position in positions:
+            self._check_position(position)
+        k = len(positions)
+        n = self.num_qubits
+        norm = sum(abs(c) ** 2 for c in self.terms.values())
+        values = np.empty(2 ** k)
+        for subset in range(2 ** k):
+            z = np.zeros(n, dtype=bool)
+            for j, position in enumerate(positions):
+                z[position] = (subset >> (k - 1 - j)) & 1
+            new_terms = self._pauli_terms(np.zeros(n, dtype=bool), z)
+            values[subset] = sum(c.conjugate() * new_terms.get(a, 0) for a, c in self.terms.items()).real / norm
+        # Walsh-Hadamard transform, P(o) = sum_S (-1)^(o.S) <Z_S> / 2^k
+        values = values.reshape((2,) * k)
+        for axis in range(k):
+            values = dense_states.apply_gate(values, [[1, 1], [1, -1]], [axis]).real
+        return np.clip(values.reshape(-1) / 2 ** k, 0, 1)
+
+    def to_stabilizer_state(self):
+        """
+        Returns the StabilizerState U|0>.
+        """
+        n = self.num_qubits
+        rows = []
+        for i in range(n, 2 * n):
+            x, z, k = self._row(i)
+            # i^k X^x Z^z = (-1)^r i^(x.z) X^x Z^z
+            r = ((k - int(np.sum(x & z))) % 4) // 2
+            rows.append(np.concatenate((x, z, [r])))
+        return StabilizerState(np.array(rows, dtype=bool).reshape(n, 2 * n + 1))
+
+    def to_state_vector(self):
+        """
+        Returns the state as a dense array of shape (2,) * n, up to a global phase.
+        This is exponential in the number of qubits and mainly useful for testing.
+        """
+        n = self.num_qubits
+        base = dense_states.stabilizer_to_state(self.to_stabilizer_state()).reshape(-1)
+        vec = np.zeros(2 ** n, dtype=complex)
+        for a, c in self.terms.items():
+            pauli = (np.zeros(n, dtype=bool), np.zeros(n, dtype=bool), 0)
+            for i in range(n):
+                if (a >> i) & 1:
+                    pauli = self._multiply(pauli, self._row(i))
+            x, z, k = pauli
+            r = ((k - int(np.sum(x & z))) % 4) // 2
+            vec += c * dense_states.apply_pauli_row(base, np.concatenate((x, z, [r])), n)
+        return vec.reshape((2,) * n)
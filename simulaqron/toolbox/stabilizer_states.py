@@ -455,6 +455,120 @@ class StabilizerState:
         if len(stabilizer) != num_cols:
             raise ValueError("Stabilizer must be of length {}, not {}".format(num_cols, len(stabilizer)))
 
+    def expectation(self, operator):
+        """
+        Returns the expectation value of a Pauli operator, which is +1 or -1 if it (up to sign) is in the stabilizer
+        group and 0 otherwise.
+
+        Args:
+            operator (str or list): The Pauli operator, in the same form as for ``contains``.
+        """
+        if isinstance(operator, str):
+            op = self._str_to_operator(operator)
+            if op is None:
+                raise ValueError("Cannot parse {} as a Pauli operator.".format(operator))
+        else:
+            op = [bool(entry) for entry in operator]
+        if len(op) == 2 * self.num_qubits:
+            op.append(False)
+        if not self._is_symplectic(np.concatenate((self._group, [op]), axis=0)):
+            return 0
+        # Since the group is maximal either the operator or minus the operator is in the group
+        if self.contains(op):
+            return 1
+        return -1
+
+    def probabilities(self, positions):
+        """
+        Returns the probabilities of the outcomes of measuring the qubits at positions in the standard basis,
+        without changing the state. The outcome of positions[0] is the most significant bit of the index.
+
+        :param positions: The positions of the qubits.
+        :type positions: list of int
+        :rtype: :obj:`numpy.array`
+        """
+        n = self.num_qubits
+        k = len(positions)
+        # Find the elements of the group which are products of Z's on the measured qubits, by eliminating the
+        # X-part and the Z-part of the other qubits. The identity block keeps track of which generators are combined.
+        others = [i for i in range(n) if i not in positions]
+        columns = list(range(n)) + [n + i for i in others]
+        matrix = np.concatenate((self._group[:, columns], np.identity(n, dtype=bool)), axis=1)
+        h = 0
+        for col in range(len(columns)):
+            rows = np.flatnonzero(matrix[h:, col]) + h
+            if len(rows) == 0:
+                continue
+            matrix[[h, rows[0]]] = matrix[[rows[0], h]]
+            for row in np.flatnonzero(matrix[:, col]):
+                if row != h:
+                    matrix[row] ^= matrix[h]
+            h += 1
+            if h == n:
+                break
+
+        # Each remaining Z-type element (-1)^r Z^z fixes the parity z.bits to r
+        outcomes = np.arange(2 ** k)
+        bits = (outcomes[:, None] >> np.arange(k - 1, -1, -1)) & 1
+        valid = np.ones(2 ** k, dtype=bool)
+        for combination in matrix[h:, len(columns):]:
+            element = np.zeros(2 * n + 1, dtype=bool)
+            for i in np.flatnonzero(combination):
+                element = self._multiply_stabilizers(element, self._group[i])
+            z = element[[n + i for i in positions]].astype(int)
+            valid &= (bits @ z) % 2 == int(element[-1])
+        return valid / np.count_nonzero(valid)
+
+    def single_qubit_pauli(self, position):
+        """
+        If the qubit at position is not entangled with the other qubits, returns the (x, z)-part of the Pauli operator
+        it is an eigenstate of, otherwise None.
+        The qubit is not entangled if all generators act on it with either the identity or the same Pauli.
+
+        :param position: The position of the qubit.
+        :type position: int
+        :rtype: tuple of bool or None
+        """
+        n = self.num_qubits
+        x_col = self._group[:, position]
+        z_col = self._group[:, position + n]
+        support = np.logical_or(x_col, z_col)
+        paulis = set(zip(x_col[support], z_col[support]))
+        if len(paulis) == 1:
+            return paulis.pop()
+        return None
+
+    def separable_positions(self):
+        """
+        Returns the positions of the qubits which are not entangled with the other qubits, see ``single_qubit_pauli``.
+
+        :rtype: list of int
+        """
+        n = self.num_qubits
+        # Encode the Pauli each generator acts with on each qubit as 1 (X), 2 (Z) or 3 (Y), the qubit is separable
+        # exactly if only one of these appears in its column
+        codes = self._group[:, :n].astype(int) + 2 * self._group[:, n:2 * n]
+        kinds = sum((codes == code).any(axis=0).astype(int) for code in (1, 2, 3))
+        return np.flatnonzero(kinds == 1).tolist()
+
+    def single_qubit_state(self, position):
+        """
+        Returns the state of a qubit which is not entangled with the other qubits.
+
+        :param position: The position of the qubit.
+        :type position: int
+        :return: The state of the qubit
+        :rtype: :obj:`simulaqron.toolbox.stabilizer_states.StabilizerState`
+        """
+        pauli = self.single_qubit_pauli(position)
+        if pauli is None:
+            raise ValueError("The qubit at position {} is entangled with other qubits.".format(position))
+        n = self.num_qubits
+        operator = [False] * (2 * n)
+        operator[position], operator[position + n] = pauli
+        phase = self.expectation(operator) == -1
+        return StabilizerState([[pauli[0], pauli[1], phase]])
+
     def add_qubit(self):
         r"""
         Appends a qubit in the state \|0\> to the current state
@@ -504,7 +618,8 @@ class StabilizerState:
 
             phases = np.append(self._group[:, -1:], other._group[:, -1:], 0)
             new_group = np.concatenate((new_X_stab, new_Z_stab, phases), 1)
-            return StabilizerState(new_group)
+            # The generators of both states commute, so do the ones of the product
+            return StabilizerState(new_group, check_symplectic=False)
 
     def to_array(self, standard_form=False, return_pivot_columns=False):
         """
@@ -528,6 +643,52 @@ class StabilizerState:
         else:
             return np.array(self._group, dtype=bool)
 
+    def to_packed(self):
+        """
+        Returns the generators of this stabilizer group with their bits packed into bytes using numpy.packbits,
+        which takes an eighth of the memory of to_array. The state can be restored with from_packed.
+
+        :return: The X-part, the Z-part and the phases of the generators, the rows of the parts are packed separately
+        :rtype: tuple of :obj:`numpy.array`
+        """
+        n = self.num_qubits
+        if n == 0:
+            return np.zeros((0, 0), dtype=np.uint8), np.zeros((0, 0), dtype=np.uint8), np.zeros(0, dtype=np.uint8)
+        return (
+            np.packbits(self._group[:, :n], axis=1),
+            np.packbits(self._group[:, n:-1], axis=1),
+            np.packbits(self._group[:, -1]),
+        )
+
+    @classmethod
+    def from_packed(cls, x_part, z_part, phases, num_qubits):
+        """
+        Creates the stabilizer state of which to_packed returned the generators. Since these come from a
+        StabilizerState they are trusted to commute and the checks done by __init__ are skipped.
+
+        :param x_part: The packed X-part of the generators
+        :type x_part: :obj:`numpy.array`
+        :param z_part: The packed Z-part of the generators
+        :type z_part: :obj:`numpy.array`
+        :param phases: The packed phases of the generators
+        :type phases: :obj:`numpy.array`
+        :param num_qubits: The number of qubits of the state
+        :type num_qubits: int
+        :return: The stabilizer state
+        :rtype: :obj:`StabilizerState`
+        """
+        state = cls()
+        if num_qubits == 0:
+            return state
+        state._group = np.concatenate((
+            np.unpackbits(x_part, axis=1, count=num_qubits),
+            np.unpackbits(z_part, axis=1, count=num_qubits),
+            np.unpackbits(phases, count=num_qubits)[:, np.newaxis],
+        ), 1).view(bool)
+        state._nr_rows = num_qubits
+        state._nr_cols = 2 * num_qubits + 1
+        return state
+
     def apply_X(self, position):
         """
         Applies the Pauli X operator to qubit 'position' of the stabilizer state and updates the generators.
@@ -28,7 +28,28 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import abc
+import functools
+import heapq
+import lzma
+import os
+import socket
+import time
+import zlib
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # Python < 3.8
+    shared_memory = None
+
+import numpy as np
 from twisted.spread import pb
+from twisted.internet import reactor
+from twisted.internet.defer import DeferredLock, FirstError, gatherResults, inlineCallbacks, maybeDeferred
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+from simulaqron.settings import simulaqron_settings
 
 
 class quantumError(pb.Error):
@@ -51,6 +72,542 @@ class virtNetError(Exception):
         return repr(self.value)
 
 
+class lockStatistics:
+    """
+    Counts how often locks were acquired and how long acquirers had to wait for them.
+    """
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.contended = 0
+        self.waitTime = 0.0
+        self.maxWaitTime = 0.0
+
+    def record(self, waitTime):
+        """
+        Records an acquisition which had to wait waitTime seconds.
+        """
+        self.contended += 1
+        self.waitTime += waitTime
+        self.maxWaitTime = max(self.maxWaitTime, waitTime)
+
+    def to_dict(self):
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "wait_time": self.waitTime,
+            "max_wait_time": self.maxWaitTime,
+        }
+
+
+class countingLock(DeferredLock):
+    """
+    A DeferredLock which records in statistics how long acquirers waited. Waiters are queued in order and the lock is
+    handed to the next one as soon as it is released.
+
+    Arguments:
+    statistics	lockStatistics to record to, by default a new one is used
+    """
+
+    def __init__(self, statistics=None):
+        super().__init__()
+        if statistics is None:
+            statistics = lockStatistics()
+        self.statistics = statistics
+
+    def acquire(self):
+        self.statistics.acquisitions += 1
+        if not self.locked:
+            return super().acquire()
+
+        start = time.perf_counter()
+
+        def record(lock):
+            self.statistics.record(time.perf_counter() - start)
+            return lock
+
+        return super().acquire().addCallback(record)
+
+    def try_acquire(self):
+        """
+        Acquires the lock directly if it is free, without creating a Deferred.
+
+        :return: Whether the lock was acquired. If so, it should be released with release.
+        """
+        if self.locked:
+            return False
+        self.statistics.acquisitions += 1
+        self.locked = True
+        return True
+
+
+# Wait times for the locks of all registers in this process
+registerLockStatistics = lockStatistics()
+
+
+class mergeStatistics:
+    """
+    Counts the registers moved to a node to be merged there and the number of bytes of state moved for them, as well
+    as the bytes actually sent after encoding and the time spent encoding and decoding.
+    """
+
+    def __init__(self):
+        self.merges = 0
+        self.qubitsMoved = 0
+        self.bytesMoved = 0
+        self.maxBytesMoved = 0
+        self.wireBytes = 0
+        self.encodeTime = 0.0
+        self.decodeTime = 0.0
+
+    def record(self, qubits, nbytes, wireBytes=None, encodeTime=0.0, decodeTime=0.0):
+        """
+        Records a merge which moved a register of qubits qubits, whose state took nbytes bytes. Of these wireBytes
+        were sent, which is nbytes if not given.
+        """
+        self.merges += 1
+        self.qubitsMoved += qubits
+        self.bytesMoved += nbytes
+        self.maxBytesMoved = max(self.maxBytesMoved, nbytes)
+        self.wireBytes += nbytes if wireBytes is None else wireBytes
+        self.encodeTime += encodeTime
+        self.decodeTime += decodeTime
+
+    @property
+    def compressionRatio(self):
+        """
+        The number of bytes of state moved per byte sent.
+        """
+        if self.wireBytes == 0:
+            return 1.0
+        return self.bytesMoved / self.wireBytes
+
+    def to_dict(self):
+        return {
+            "merges": self.merges,
+            "qubits_moved": self.qubitsMoved,
+            "bytes_moved": self.bytesMoved,
+            "max_bytes_moved": self.maxBytesMoved,
+            "wire_bytes": self.wireBytes,
+            "compression_ratio": self.compressionRatio,
+            "encode_time": self.encodeTime,
+            "decode_time": self.decodeTime,
+        }
+
+
+# Functions to compress and decompress buffers, by the names used in the setting payload_compression
+_COMPRESSORS = {
+    "zlib": (functools.partial(zlib.compress, level=1), zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _host_id():
+    """
+    Returns a string identifying the host this process runs on, which is sent along with shared memory payloads so
+    that the receiver can tell whether it can map the segment. Nodes may have the same IP address on different
+    hosts, for instance behind NAT or in containers, so the hostname and, on Linux, the boot id are used.
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            bootID = f.read().strip()
+    except OSError:
+        bootID = ""
+    return f"{socket.gethostname()}/{bootID}"
+
+
+class registerPayload(pb.Copyable, pb.RemoteCopy):
+    """
+    State of a register as it is sent to another node to be merged there. The numpy arrays describing the state are
+    sent as their raw bytes together with their dtype and shape, so sending them amounts to copying their buffers
+    instead of serializing every entry as a Python object.
+
+    Arrays with few nonzero entries, such as the state vectors of GHZ states, are sent as the indices and values of
+    these entries. Encoded arrays of at least payload_compression_threshold bytes are moreover compressed with the
+    codec of the setting payload_compression, if that makes them smaller.
+
+    Small payloads are sent in one message. The arrays of payloads larger than streamThreshold are not part of the
+    message, instead the receiver preallocates them and fetches their contents from a payloadStream at the sender
+    with receive, one chunk per message.
+
+    If sharedMemory is set and the platform supports it, the arrays are instead copied into a shared memory segment,
+    of which only the name is sent. This is meant for nodes on the same host. The segment is owned by a
+    payloadSegment at the sender, which unlinks it once the receiver has mapped it, or after shareTimeout seconds.
+    The receiver uses the arrays in the segment without copying them and closes its mapping with release. If the
+    receiver cannot map the segment, the arrays are streamed from the sender instead.
+
+    Arguments:
+    kind		what the arrays describe, checked by the engine absorbing the payload
+    qubits		numbers of the qubits in the register, in the order of their positions in the state
+    arrays		dictionary of numpy arrays describing the state
+    info		other small data needed to restore the state, such as the order of the qubits
+    """
+
+    # Buffers are sent in chunks, since Twisted PB does not accept strings longer than banana.SIZE_LIMIT
+    chunkSize = 512 * 1024
+
+    # Payloads with more bytes than this after encoding are streamed
+    streamThreshold = 4 * 1024 * 1024
+
+    # Maximal number of chunks requested at the same time when streaming
+    window = 4
+
+    # Arrays with at most this fraction of nonzero entries are sent sparsely
+    sparseFillRatio = 0.25
+
+    # Seconds after which the sender unlinks a shared memory segment which the receiver has not mapped
+    shareTimeout = 60
+
+    def __init__(self, kind=None, qubits=(), arrays=None, info=None):
+        self.kind = kind
+        self.qubits = list(qubits)
+        self.arrays = {} if arrays is None else arrays
+        self.info = {} if info is None else info
+
+        # Reference to the payloadStream of the sender if the arrays still have to be received
+        self.stream = None
+
+        # Whether to send the arrays through shared memory, and the segment holding the arrays when received so
+        self.sharedMemory = False
+        self._segment = None
+
+        # Reference to the payloadSegment of the sender while it waits for the segment to be mapped
+        self._segmentOwner = None
+
+        # Encodings and buffers of the arrays which are decoded once they are received
+        self._encoded = {}
+
+        # Number of bytes which were sent and time spent encoding and decoding, for payloads received from other nodes
+        self.wireBytes = None
+        self.encodeTime = 0.0
+        self.decodeTime = 0.0
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes of the arrays.
+        """
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def _encode(self, array):
+        """
+        Encodes an array as the bytes which are sent.
+
+        Returns a tuple (encoding, buffer) of a dictionary describing the encoding and a flat numpy array of bytes.
+        """
+        flat = np.ascontiguousarray(array).reshape(-1)
+        encoding = {"sparse": None, "codec": None}
+
+        nonzero = np.flatnonzero(flat)
+        indexType = np.dtype(np.uint32 if flat.size < 2 ** 32 else np.uint64)
+        sparseBytes = len(nonzero) * (indexType.itemsize + flat.itemsize)
+        if len(nonzero) <= self.sparseFillRatio * flat.size and sparseBytes < flat.nbytes:
+            encoding["sparse"] = indexType.str
+            buffer = np.concatenate([nonzero.astype(indexType).view(np.uint8), flat[nonzero].view(np.uint8)])
+        else:
+            buffer = flat.view(np.uint8)
+
+        codec = simulaqron_settings.payload_compression
+        if codec in _COMPRESSORS and buffer.nbytes >= simulaqron_settings.payload_compression_threshold:
+            compressed = _COMPRESSORS[codec][0](buffer)
+            if len(compressed) < buffer.nbytes:
+                encoding["codec"] = codec
+                buffer = np.frombuffer(compressed, dtype=np.uint8)
+
+        return encoding, buffer
+
+    @staticmethod
+    def _decode(encoding, buffer, dtype, shape):
+        """
+        Restores an array from the bytes in buffer, which were encoded as described by encoding.
+        """
+        dtype = np.dtype(dtype)
+        if encoding["codec"] is not None:
+            buffer = bytearray(_COMPRESSORS[encoding["codec"]][1](buffer))
+
+        if encoding["sparse"] is None:
+            return np.frombuffer(buffer, dtype=dtype).reshape(shape)
+
+        indexType = np.dtype(encoding["sparse"])
+        num = len(buffer) // (indexType.itemsize + dtype.itemsize)
+        array = np.zeros(int(np.prod(shape, dtype=np.int64)), dtype=dtype)
+        indices = np.frombuffer(buffer, dtype=indexType, count=num)
+        array[indices] = np.frombuffer(buffer, dtype=dtype, count=num, offset=num * indexType.itemsize)
+        return array.reshape(shape)
+
+    @staticmethod
+    def can_share():
+        """
+        Whether payloads can be sent through shared memory on this platform. Segments are unlinked by the receiver
+        before the sender's handle is closed, which requires POSIX semantics.
+        """
+        return shared_memory is not None and os.name == "posix"
+
+    def _share(self):
+        """
+        Copies the arrays into a new shared memory segment. Returns the name of the segment, the offsets of the arrays
+        and the host it was created on, together with the payloadSegment owning the segment.
+        """
+        segment = shared_memory.SharedMemory(create=True, size=max(1, self.nbytes))
+        try:
+            buffers = {}
+            offsets = {}
+            offset = 0
+            for name, array in self.arrays.items():
+                buffer = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+                buffers[name] = np.frombuffer(segment.buf, dtype=np.uint8, count=buffer.nbytes, offset=offset)
+                buffers[name][:] = buffer
+                offsets[name] = offset
+                offset += buffer.nbytes
+        except BaseException:
+            segment.unlink()
+            buffers = {}
+            segment.close()
+            raise
+        return {"name": segment.name, "offsets": offsets, "host": _host_id()}, payloadSegment(segment, buffers)
+
+    def _attach(self, shared, arrays):
+        """
+        Maps the arrays in the shared memory segment created by _share at the sender. Returns False if the segment
+        cannot be mapped, because the sender runs on another host or has unlinked it already.
+        """
+        if shared["host"] != _host_id():
+            return False
+        try:
+            segment = shared_memory.SharedMemory(name=shared["name"])
+        except FileNotFoundError:
+            return False
+        # The sender unlinks the segment, so the resource tracker of this process should not
+        resource_tracker.unregister(segment._name, "shared_memory")
+
+        self._segment = segment
+        try:
+            for name, (dtype, shape) in arrays.items():
+                self.arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf,
+                                               offset=shared["offsets"][name])
+        except BaseException:
+            self.release()
+            raise
+        self.wireBytes = self.nbytes
+        return True
+
+    def release(self):
+        """
+        Closes the shared memory segment holding the arrays, if any, after which the arrays are no longer available.
+        """
+        if self._segmentOwner is not None:
+            # receive was not called, the sender can unlink the segment all the same
+            self._segmentOwner.callRemote("close").addErrback(lambda failure: None)
+            self._segmentOwner = None
+        if self._segment is None:
+            return
+        self.arrays = {}
+        try:
+            self._segment.close()
+        except BufferError:
+            # An engine still refers to the arrays, the mapping is closed once they are garbage collected
+            pass
+        self._segment = None
+
+    def getStateToCopy(self):
+        if self.sharedMemory and self.can_share():
+            arrays = {name: (array.dtype.str, list(array.shape)) for name, array in self.arrays.items()}
+            shared, owner = self._share()
+            return {
+                "kind": self.kind,
+                "qubits": self.qubits,
+                "arrays": arrays,
+                "info": self.info,
+                "shared": shared,
+                "segment": owner,
+            }
+
+        start = time.perf_counter()
+        arrays = {}
+        buffers = {}
+        for name, array in self.arrays.items():
+            encoding, buffers[name] = self._encode(array)
+            arrays[name] = (array.dtype.str, list(array.shape), encoding, buffers[name].nbytes)
+        state = {
+            "kind": self.kind,
+            "qubits": self.qubits,
+            "arrays": arrays,
+            "info": self.info,
+            "encodeTime": time.perf_counter() - start,
+        }
+        if sum(buffer.nbytes for buffer in buffers.values()) > self.streamThreshold:
+            state["stream"] = payloadStream(buffers)
+        else:
+            state["chunks"] = {
+                name: [buffer[i:i + self.chunkSize].tobytes() for i in range(0, len(buffer), self.chunkSize)]
+                for name, buffer in buffers.items()
+            }
+        return state
+
+    def setCopyableState(self, state):
+        self.kind = state["kind"]
+        self.qubits = state["qubits"]
+        self.info = state["info"]
+        self.arrays = {}
+        self.stream = state.get("stream")
+        self.sharedMemory = False
+        self._segment = None
+        self._segmentOwner = None
+        self._encoded = {}
+        self.wireBytes = 0
+        self.encodeTime = state.get("encodeTime", 0.0)
+        self.decodeTime = 0.0
+        if "shared" in state:
+            if self._attach(state["shared"], state["arrays"]):
+                self._segmentOwner = state["segment"]
+            else:
+                # The raw arrays are streamed from the segment at the sender instead
+                self.stream = state["segment"]
+                for name, (dtype, shape) in state["arrays"].items():
+                    self.arrays[name] = np.empty(shape, dtype=np.dtype(dtype))
+                self.wireBytes = self.nbytes
+            return
+
+        start = time.perf_counter()
+        for name, (dtype, shape, encoding, length) in state["arrays"].items():
+            self.wireBytes += length
+            if self.stream is None:
+                buffer = bytearray().join(state["chunks"][name])
+                self.arrays[name] = self._decode(encoding, buffer, dtype, shape)
+            else:
+                # Raw arrays are written here by receive, encoded ones are replaced once decoded
+                self.arrays[name] = np.empty(shape, dtype=np.dtype(dtype))
+                if encoding["sparse"] is not None or encoding["codec"] is not None:
+                    self._encoded[name] = (encoding, np.empty(length, dtype=np.uint8))
+        self.decodeTime = time.perf_counter() - start
+
+    @inlineCallbacks
+    def receive(self):
+        """
+        Fetches the contents of the arrays if the payload is streamed, and does nothing otherwise. The chunks are
+        written into the preallocated arrays as they arrive. At most window chunks are requested at a time, so the
+        sender only has to produce data as fast as it is stored, and both nodes handle other messages in between.
+        For payloads sent through shared memory, this tells the sender that the segment is mapped and can be
+        unlinked.
+        """
+        if self._segmentOwner is not None:
+            owner = self._segmentOwner
+            self._segmentOwner = None
+            yield owner.callRemote("close")
+        if self.stream is None:
+            return
+
+        for name, array in self.arrays.items():
+            if name in self._encoded:
+                buffer = self._encoded[name][1]
+            else:
+                buffer = array.reshape(-1).view(np.uint8)
+            offsets = range(0, len(buffer), self.chunkSize)
+            for i in range(0, len(offsets), self.window):
+                requested = offsets[i:i + self.window]
+                try:
+                    chunks = yield gatherResults(
+                        [self.stream.callRemote("read", name, offset) for offset in requested], consumeErrors=True
+                    )
+                except FirstError as err:
+                    err.subFailure.raiseException()
+                for offset, chunk in zip(requested, chunks):
+                    buffer[offset:offset + len(chunk)] = np.frombuffer(chunk, dtype=np.uint8)
+
+        yield self.stream.callRemote("close")
+        self.stream = None
+
+        start = time.perf_counter()
+        for name, (encoding, buffer) in self._encoded.items():
+            array = self.arrays[name]
+            self.arrays[name] = self._decode(encoding, buffer, array.dtype, array.shape)
+        self._encoded = {}
+        self.decodeTime += time.perf_counter() - start
+
+
+class payloadStream(pb.Referenceable):
+    """
+    Serves the buffers of a registerPayload which is streamed to another node, one chunk per request.
+
+    Arguments:
+    buffers		dictionary of the buffers of the arrays of the payload as flat arrays of bytes
+    """
+
+    def __init__(self, buffers):
+        self.buffers = buffers
+
+    def remote_read(self, name, offset):
+        """
+        Returns the chunk of the buffer name starting at offset.
+        """
+        return self.buffers[name][offset:offset + registerPayload.chunkSize].tobytes()
+
+    def remote_close(self):
+        """
+        Releases the buffers once the receiver has all chunks.
+        """
+        self.buffers = {}
+
+
+class payloadSegment(payloadStream):
+    """
+    Owns the shared memory segment of a registerPayload sent through shared memory. The segment stays registered
+    with the resource tracker of the sender until close is called, which the receiver does once it has mapped the
+    segment, or until registerPayload.shareTimeout seconds have passed. If the receiver cannot map the segment, it
+    streams the arrays from here instead.
+
+    Arguments:
+    segment		the shared memory segment
+    buffers		dictionary of the arrays of the payload as flat arrays of bytes in the segment
+    """
+
+    def __init__(self, segment, buffers):
+        super().__init__(buffers)
+        self.segment = segment
+        self._timeout = reactor.callLater(registerPayload.shareTimeout, self.remote_close)
+
+    def remote_close(self):
+        """
+        Unlinks the segment and closes the mapping of the sender. Mappings of the receiver stay valid.
+        """
+        super().remote_close()
+        if self._timeout.active():
+            self._timeout.cancel()
+        if self.segment is None:
+            return
+        segment = self.segment
+        self.segment = None
+        try:
+            segment.close()
+        except BufferError:
+            # A chunk being sent still refers to the buffer, the mapping is closed once it is garbage collected
+            pass
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+pb.setUnjellyableForClass(registerPayload, registerPayload)
+
+
+_offloadPool = None
+
+
+def get_offload_pool():
+    """
+    Returns the pool of at most offload_threads threads running operations on large registers, which is started on
+    first use and stopped when the reactor shuts down.
+    """
+    global _offloadPool
+    if _offloadPool is None:
+        _offloadPool = ThreadPool(0, max(1, simulaqron_settings.offload_threads), name="simulaqron-engine")
+        _offloadPool.start()
+        reactor.addSystemEventTrigger("during", "shutdown", _offloadPool.stop)
+    return _offloadPool
+
+
 class quantumEngine(pb.Referenceable):
     """
     Basic quantum engine. Abstract class meant to be subclassed to implement different simulation backends.
@@ -62,6 +619,9 @@ class quantumEngine(pb.Referenceable):
         maxQubits	maximum number of qubits this register supports
     """
 
+    # Registers with more qubits in use are not scanned for separable qubits, see should_split
+    maxSplitQubits = 12
+
     def __init__(self, node, num, maxQubits=10):
         """
         Initialize the simple engine. If no number is given for maxQubits, the assumption will be 10.
@@ -76,6 +636,214 @@ class quantumEngine(pb.Referenceable):
         # Node that actually simulates this register
         self.simNode = node
 
+        # Qubits are referred to by a number which does not change when other qubits are removed or when
+        # registers are merged. This maps the number of each qubit to its position in the simulated state.
+        self.qubitPositions = {}
+
+        # Numbers which have been freed again, the smallest one is handed out first. Numbers taken over by
+        # _renumber are skipped when they come up.
+        self._freeNums = []
+        self._nextNum = 0
+
+        # Lock serializing operations on this register which do not restructure it, such as single qubit gates
+        self.lock = countingLock(registerLockStatistics)
+
+        # Numbers of qubits which have been measured out and reset to \|0\>. Their slots are kept in the register
+        # and handed back by take_spare_qubit, instead of removing the qubit and adding a fresh one later.
+        self.spareQubits = []
+
+        # Operations run by run on a large state are executed one at a time in a thread, in the order requested
+        self._workLock = DeferredLock()
+        self._pending = 0
+
+    def is_large(self):
+        """
+        Whether the state of this register is of at least offload_threshold bytes, so that operations on it are run
+        in a separate thread by run.
+        :rtype: bool
+        """
+        threshold = simulaqron_settings.offload_threshold
+        return threshold > 0 and self.state_nbytes() >= threshold
+
+    def runs_inline(self):
+        """
+        Whether run calls functions on this register directly, which is the case if the register is not large and
+        no operation started by run is pending on it.
+        :rtype: bool
+        """
+        return self._pending == 0 and not self.is_large()
+
+    def run(self, func, *args):
+        """
+        Calls func(*args), where func operates on this register, such as one of its methods. If runs_inline, func is
+        called directly and its result returned. Otherwise a Deferred firing with the result is returned, and func is
+        called once the functions passed to run before it have finished, so that operations on the same register are
+        done one at a time and in order. If the register is large by then, func is called in a thread of the pool of
+        get_offload_pool, meanwhile the reactor keeps handling messages.
+        :param func: The function to call
+        :param args: The arguments to pass to func
+        """
+        if self.runs_inline():
+            return func(*args)
+
+        def call():
+            if self.is_large():
+                d = deferToThreadPool(reactor, get_offload_pool(), func, *args)
+            else:
+                d = maybeDeferred(func, *args)
+            return d.addBoth(done)
+
+        def done(result):
+            self._pending -= 1
+            return result
+
+        self._pending += 1
+        return self._workLock.run(call)
+
+    def get_qubit_numbers(self):
+        """
+        Returns the numbers of the qubits in this register, in the order of their positions in the simulated state.
+        :rtype: list of int
+        """
+        return sorted(self.qubitPositions, key=self.qubitPositions.get)
+
+    def _add_position(self, position):
+        """
+        Assigns the smallest unused number to the qubit at the given position in the simulated state.
+        :return: The qubit number
+        :rtype: int
+        """
+        while self._freeNums and self._freeNums[0] in self.qubitPositions:
+            heapq.heappop(self._freeNums)
+        if self._freeNums:
+            num = heapq.heappop(self._freeNums)
+        else:
+            num = self._nextNum
+            self._nextNum += 1
+        self.qubitPositions[num] = position
+        return num
+
+    def _renumber(self, oldNum, newNum):
+        """
+        Gives the qubit with number oldNum the unused number newNum, keeping its position, and frees oldNum.
+        """
+        self.qubitPositions[newNum] = self.qubitPositions.pop(oldNum)
+        heapq.heappush(self._freeNums, oldNum)
+
+    def _get_position(self, qubitNum):
+        """
+        Returns the position in the simulated state of the qubit with number qubitNum.
+        :rtype: int
+        """
+        try:
+            return self.qubitPositions[qubitNum]
+        except KeyError:
+            raise quantumError("No such qubit {} in register.".format(qubitNum))
+
+    def _remove_position(self, qubitNum, compact=True):
+        """
+        Frees the number of the qubit qubitNum. If compact is True, the qubit has been removed from the simulated
+        state and the positions of the qubits after it are shifted down. This takes time linear in the number of
+        qubits, which is less than removing the qubit from the state costs any of the engines.
+        :return: The position of the removed qubit
+        :rtype: int
+        """
+        position = self._get_position(qubitNum)
+        del self.qubitPositions[qubitNum]
+        heapq.heappush(self._freeNums, qubitNum)
+        if compact:
+            for num, pos in self.qubitPositions.items():
+                if pos > position:
+                    self.qubitPositions[num] = pos - 1
+        return position
+
+    def _absorb_positions(self, numbers, offset):
+        """
+        Assigns numbers to qubits absorbed from another register, which are put at the positions offset, offset + 1,...
+        of the simulated state.
+
+        Arguments:
+        numbers		the numbers of the qubits in the other register, in the order of their positions
+        offset		position of the first absorbed qubit
+        :return: Dictionary mapping the numbers in the other register to the new numbers
+        :rtype: dict
+        """
+        return {num: self._add_position(offset + k) for k, num in enumerate(numbers)}
+
+    def reset_qubit(self, qubitNum):
+        """
+        Measures the qubit qubitNum in the standard basis and resets it to \|0\> in place. The qubit is kept in the
+        register as a spare, which is handed back by take_spare_qubit.
+
+        Arguments:
+        qubitNum	qubit to be reset
+        :return: The measurement outcome
+        :rtype: int
+        """
+        outcome = self.measure_qubit_inplace(qubitNum)
+        if outcome == 1:
+            self.apply_X(qubitNum)
+        self.spareQubits.append(qubitNum)
+        return outcome
+
+    def take_spare_qubit(self):
+        """
+        Hands back the slot of a qubit reset by reset_qubit, which is in the \|0\> state.
+        :return: The qubit number, or None if there are no spare qubits
+        :rtype: int
+        """
+        if self.spareQubits:
+            return self.spareQubits.pop()
+        return None
+
+    def drop_spare_qubits(self, keep=0):
+        """
+        Removes spare qubits from the simulated state, until at most keep of them are left.
+
+        Arguments:
+        keep		number of spare qubits to keep (default 0)
+        """
+        while len(self.spareQubits) > keep:
+            self.remove_qubit(self.spareQubits.pop())
+
+    def separable_qubits(self):
+        """
+        Returns the numbers of the qubits which are in a pure state, and hence in a product state with the rest of
+        the register. Engines which can detect this override it, by default no qubits are returned.
+        :rtype: list of int
+        """
+        return []
+
+    def should_split(self):
+        """
+        Whether the virtual node should look for separable qubits in this register after removing a qubit from it.
+        For dense states separable_qubits costs about as much as applying a gate to every qubit, so this is only
+        the case if at most maxSplitQubits qubits are in use. Engines for which separable_qubits is cheap override
+        it.
+        :rtype: bool
+        """
+        return self.activeQubits - len(self.spareQubits) <= self.maxSplitQubits
+
+    def _separable_state(self, qubitNum):
+        """
+        Returns the state of the separable qubit qubitNum, in the form taken by add_qubit.
+        """
+        raise quantumError("Cannot split qubits from registers of {}".format(self.__class__.__name__))
+
+    def split_qubit(self, qubitNum, other):
+        """
+        Moves the qubit qubitNum, which must be one of separable_qubits, to the register other.
+
+        Arguments:
+        qubitNum	qubit to be moved
+        other		register of the same engine to move the qubit to
+        :return: The number of the qubit in other
+        :rtype: int
+        """
+        newNum = other.add_qubit(self._separable_state(qubitNum))
+        self.remove_qubit(qubitNum)
+        return newNum
+
     @abc.abstractmethod
     def add_fresh_qubit(self):
         """
@@ -112,6 +880,44 @@ class quantumEngine(pb.Referenceable):
         """
         pass
 
+    def state_nbytes(self):
+        """
+        Returns the number of bytes of the state sent by get_register_payload, without the spare qubits which are
+        dropped before sending. This is the cost of moving the register to another node. By default this is the size
+        of a complex state vector.
+        :rtype: int
+        """
+        return 16 * 2 ** (self.activeQubits - len(self.spareQubits))
+
+    def get_register_payload(self):
+        """
+        Returns the state of the entire register as a registerPayload, which is how registers are sent to other
+        nodes. Engines override this to put their state in numpy arrays, by default the lists of get_register_RI
+        are sent.
+        :rtype: :class:`registerPayload`
+        """
+        R, I = self.get_register_RI()
+        return registerPayload("lists", self.get_qubit_numbers(), info={"R": R, "I": I})
+
+    def absorb_payload(self, payload):
+        """
+        Absorb the qubits of a register sent as a registerPayload by get_register_payload of the same engine.
+        This is done by tensoring the state at the end.
+
+        Arguments:
+        payload		the registerPayload describing the state
+        :return: The new numbers of the absorbed qubits, in the order of payload.qubits
+        :rtype: list of int
+        """
+        self._check_payload(payload, "lists")
+        return self.absorb_parts(payload.info["R"], payload.info["I"], len(payload.qubits))
+
+    def _check_payload(self, payload, *kinds):
+        if payload.kind not in kinds:
+            raise quantumError(
+                "Cannot absorb a payload of kind {} into {}".format(payload.kind, self.__class__.__name__)
+            )
+
     @abc.abstractmethod
     def apply_H(self, qubitNum):
         """
@@ -242,6 +1048,70 @@ class quantumEngine(pb.Referenceable):
         """
         pass
 
+    def _check_qubit_list(self, qList):
+        """
+        Checks that the qubits in qList are in this register and distinct.
+        """
+        numbers = self.get_qubit_numbers()
+        for qubitNum in qList:
+            if qubitNum not in numbers:
+                raise quantumError("No such qubit {} in register.".format(qubitNum))
+        if len(set(qList)) != len(qList):
+            raise quantumError("The qubits {} are not distinct.".format(qList))
+
+    def _pauli_positions(self, pauli_string, qList):
+        """
+        Checks the arguments of expectation and returns the positions of the qubits the Paulis act on.
+        """
+        if qList is None:
+            qList = self.get_qubit_numbers()
+        self._check_qubit_list(qList)
+        if len(pauli_string) != len(qList):
+            raise ValueError("Pauli string {} does not match the qubits {}".format(pauli_string, qList))
+        return [self._get_position(qubitNum) for qubitNum in qList]
+
+    def measure_qubits(self, qList, inplace=False):
+        """
+        Measures the qubits in qList in the standard basis. Engines which can sample the joint outcome at once
+        override this, by default the qubits are measured one by one.
+
+        Arguments:
+        qList		list of qubits to be measured
+        inplace		if False the measured qubits are deleted
+        :return: The measurement outcomes, in the order of qList
+        :rtype: list of int
+        """
+        self._check_qubit_list(qList)
+        outcomes = [self.measure_qubit_inplace(qubitNum) for qubitNum in qList]
+        if not inplace:
+            for qubitNum in qList:
+                self.remove_qubit(qubitNum)
+        return outcomes
+
+    @abc.abstractmethod
+    def probabilities(self, qList):
+        """
+        Returns the probabilities of the outcomes of measuring the qubits in qList in the standard basis, without
+        changing the state. The outcome of the first qubit in qList is the most significant bit of the index.
+
+        Arguments:
+        qList		list of qubits
+        :rtype: list of float
+        """
+        pass
+
+    @abc.abstractmethod
+    def expectation(self, pauli_string, qList=None):
+        """
+        Returns the expectation value of a tensor product of Paulis, without changing the state.
+
+        Arguments:
+        pauli_string	string of the characters I, X, Y and Z, e.g. "XZ"
+        qList		the qubits the Paulis act on, by default all qubits in the order of get_qubit_numbers
+        :rtype: float
+        """
+        pass
+
     @abc.abstractmethod
     def replace_qubit(self, qubitNum, state):
         """
@@ -254,7 +1124,8 @@ class quantumEngine(pb.Referenceable):
     def absorb(self, other):
         """
         Absorb the qubits from the other engine into this one. This is done by tensoring the state at the end.
-        :rtype: None
+        :return: Dictionary mapping the numbers of the qubits in other to their new numbers
+        :rtype: dict
         """
         pass
 
@@ -267,6 +1138,7 @@ class quantumEngine(pb.Referenceable):
         R		real part of the qubit state as a list
         I		imaginary part as a list
         activeQ		active number of qubits
-        :rtype: None
+        :return: The new numbers of the absorbed qubits, in the order of their positions in the given state
+        :rtype: list of int
         """
         pass
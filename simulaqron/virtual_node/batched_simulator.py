@@ -0,0 +1,412 @@
+#
+# Copyright (c) 2017, Stephanie Wehner and Axel Dahlberg
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by Stephanie Wehner, QuTech.
+# 4. Neither the name of the QuTech organization nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY <COPYRIGHT HOLDER> ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+
+from simulaqron.virtual_node.basics import quantumEngine, quantumError, noQubitError, registerPayload
+from simulaqron.toolbox import dense_states
+from simulaqron.settings import simulaqron_settings
+
+
+class batchedEngine(quantumEngine):
+    """
+    Quantum engine which simulates a number of independent runs (shots) of the same circuit at once.
+    The state vectors of all shots are stored in one array with a leading batch axis, such that every gate is a
+    single vectorized operation on all shots. Measurements are sampled independently for every shot, so the shots
+    only differ by their measurement outcomes. Measurement results are therefore lists with one outcome per shot.
+    Since NetQASM applications expect a single outcome, this engine can not be the sim_backend of a node, and is
+    used for single registers created with remote_new_register(backend="batched") or on its own.
+
+    Attributes:
+        maxQubits:	maximum number of qubits this engine will support.
+        shots:		the number of shots simulated
+        qubitReg:	the state, an array of shape (shots, 2, ..., 2) where axis i + 1 is the qubit at position i
+    """
+
+    def __init__(self, node, num, maxQubits=10, shots=None):
+        """
+        Initialize the simple engine. If no number is given for maxQubits, the assumption will be 10.
+        If no number of shots is given, the setting batch_shots is used.
+        """
+
+        super().__init__(node=node, num=num, maxQubits=maxQubits)
+
+        if shots is None:
+            shots = simulaqron_settings.batch_shots
+        self.shots = shots
+        self.qubitReg = np.ones(shots, dtype=complex)
+
+    @property
+    def activeQubits(self):
+        return self.qubitReg.ndim - 1
+
+    def _axes(self, qList):
+        return [self._get_position(qubitNum) + 1 for qubitNum in qList]
+
+    def _tensor(self, other):
+        """
+        Appends the qubits of other, an array of shape (shots, 2, ..., 2), to the register.
+        """
+        if other.shape[0] != self.shots:
+            raise quantumError("Cannot merge registers with {} and {} shots.".format(self.shots, other.shape[0]))
+        n = self.activeQubits
+        m = other.ndim - 1
+        state = self.qubitReg.reshape(self.shots, -1, 1) * other.reshape(self.shots, 1, -1)
+        self.qubitReg = state.reshape((self.shots,) + (2,) * (n + m))
+
+    def _probabilities(self, axes):
+        """
+        Returns the probabilities of the joint outcomes of the qubits at axes for every shot, as an array of shape
+        (shots, 2^k).
+        """
+        k = len(axes)
+        probs = np.abs(self.qubitReg) ** 2
+        others = [axis for axis in range(1, self.qubitReg.ndim) if axis not in axes]
+        probs = np.transpose(probs, [0] + list(axes) + others).reshape(self.shots, 2 ** k, -1)
+        return probs.sum(axis=2)
+
+    def _collapse(self, axes, inplace):
+        """
+        Samples the joint outcome of the qubits at axes for every shot and collapses the state.
+        :return: The outcomes, an array of shape (shots, k)
+        """
+        k = len(axes)
+        probs = self._probabilities(axes)
+        cumulative = np.cumsum(probs, axis=1)
+        sample = np.random.random(self.shots) * cumulative[:, -1]
+        index = np.minimum((cumulative < sample[:, None]).sum(axis=1), 2 ** k - 1)
+        p = probs[np.arange(self.shots), index]
+        outcomes = (index[:, None] >> np.arange(k - 1, -1, -1)) & 1
+
+        # Move the measured qubits directly after the batch axis and pick the slice of the outcome of every shot
+        state = np.moveaxis(self.qubitReg, axes, list(range(1, k + 1)))
+        post = state[(np.arange(self.shots),) + tuple(outcomes.T)]
+        post = post / np.sqrt(p).reshape((self.shots,) + (1,) * (post.ndim - 1))
+        if inplace:
+            new_state = np.zeros_like(state)
+            new_state[(np.arange(self.shots),) + tuple(outcomes.T)] = post
+            self.qubitReg = np.moveaxis(new_state, list(range(1, k + 1)), axes)
+        else:
+            self.qubitReg = post
+        return outcomes
+
+    def add_fresh_qubit(self):
+        """
+        Add a new qubit initialized in the \|0\> state.
+        """
+        return self.add_qubit([1, 0])
+
+    def add_qubit(self, newQubit):
+        """
+        Add new qubit in the state described by the vector newQubit ([a, b]), the same for all shots.
+        """
+        # Check if we are still allowed to add qubits
+        if self.activeQubits >= self.maxQubits:
+            raise noQubitError("No more qubits available in register.")
+
+        state = np.asarray(newQubit, dtype=complex)
+        if state.shape != (2,):
+            raise ValueError("'newQubit' should be a state vector of length 2")
+        num = self._add_position(self.activeQubits)
+        self.qubitReg = self.qubitReg[..., None] * state
+
+        return num
+
+    def remove_qubit(self, qubitNum):
+        """
+        Removes the qubit with the desired number qubitNum
+        """
+        if qubitNum not in self.qubitPositions:
+            raise quantumError("No such qubit to remove")
+
+        self.measure_qubit(qubitNum)
+
+    def get_register_RI(self):
+        """
+        Retrieves the entire register in real and imaginary parts and returns the result as a
+        list. Twisted only likes to send real valued lists, not complex ones.
+        Both have the shape (shots, 2^n).
+        """
+        state = self.qubitReg.reshape(self.shots, -1)
+        Re = state.real.tolist()
+        Im = state.imag.tolist()
+
+        return Re, Im
+
+    def get_register_payload(self):
+        """
+        Returns the state vectors of all shots as a registerPayload, with the state of shot s in row s.
+        """
+        state = self.qubitReg.reshape(self.shots, -1)
+        return registerPayload("batched_state_vectors", self.get_qubit_numbers(), {"state": state})
+
+    def state_nbytes(self):
+        """
+        Returns the number of bytes of the state vectors of all shots sent by get_register_payload.
+        """
+        return self.shots * 16 * 2 ** (self.activeQubits - len(self.spareQubits))
+
+    def apply_H(self, qubitNum):
+        """
+        Applies a Hadamard gate to the qubits with number qubitNum.
+        """
+        self.apply_onequbit_gate(dense_states.H, qubitNum)
+
+    def apply_K(self, qubitNum):
+        """
+        Applies a K gate to the qubits with number qubitNum. Maps computational basis to Y eigenbasis.
+        """
+        self.apply_onequbit_gate(dense_states.K, qubitNum)
+
+    def apply_X(self, qubitNum):
+        """
+        Applies a X gate to the qubits with number qubitNum.
+        """
+        self.apply_onequbit_gate(dense_states.X, qubitNum)
+
+    def apply_Z(self, qubitNum):
+        """
+        Applies a Z gate to the qubits with number qubitNum.
+        """
+        self.apply_onequbit_gate(dense_states.Z, qubitNum)
+
+    def apply_Y(self, qubitNum):
+        """
+        Applies a Y gate to the qubits with number qubitNum.
+        """
+        self.apply_onequbit_gate(dense_states.Y, qubitNum)
+
+    def apply_T(self, qubitNum):
+        """
+        Applies a T gate to the qubits with number qubitNum.
+        """
+        self.apply_onequbit_gate(dense_states.T, qubitNum)
+
+    def apply_rotation(self, qubitNum, n, a):
+        """
+        Applies a rotation around the axis n with the angle a to qubit with number qubitNum. If n is zero a ValueError
+        is raised.
+
+        :param qubitNum: int
+            Qubit number
+        :param n: tuple of floats
+            A tuple of three numbers specifying the rotation axis, e.g n=(1,0,0)
+        :param a: float
+            The rotation angle in radians.
+        """
+        self.apply_onequbit_gate(dense_states.rotation(n, a), qubitNum)
+
+    def apply_CNOT(self, qubitNum1, qubitNum2):
+        """
+        Applies the CNOT to the qubit with the numbers qubitNum1 and qubitNum2.
+        """
+        self.apply_twoqubit_gate(dense_states.CNOT, qubitNum1, qubitNum2)
+
+    def apply_CPHASE(self, qubitNum1, qubitNum2):
+        """
+        Applies the CPHASE to the qubit with the numbers qubitNum1 and qubitNum2.
+        """
+        self.apply_twoqubit_gate(dense_states.CPHASE, qubitNum1, qubitNum2)
+
+    def apply_onequbit_gate(self, gate, qubitNum):
+        """
+        Applies a unitary gate to the specified qubit, in all shots.
+
+        Arguments:
+        gate       The unitary to be applied as a 2x2 array
+        qubitNum 	the number of the qubit this gate is applied to
+        """
+        self.qubitReg = dense_states.apply_gate(self.qubitReg, gate, self._axes([qubitNum]))
+
+    def apply_twoqubit_gate(self, gate, qubit1, qubit2):
+        """
+        Applies a unitary gate to the two specified qubits, in all shots.
+
+        Arguments:
+        gate       The unitary to be applied as a 4x4 array
+        qubit1 		the first qubit
+        qubit2		the second qubit
+        """
+        if qubit1 == qubit2:
+            raise ValueError("Control and target qubits cannot be the same")
+        self.qubitReg = dense_states.apply_gate(self.qubitReg, gate, self._axes([qubit1, qubit2]))
+
+    def measure_qubit_inplace(self, qubitNum):
+        """
+        Measures the desired qubit in the standard basis, independently in every shot. The quantum register
+        is in the post-measurment state corresponding to the obtained outcomes.
+
+        Arguments:
+        qubitNum	qubit to be measured
+        :return: The outcome of every shot
+        :rtype: list of int
+        """
+        if qubitNum not in self.qubitPositions:
+            raise quantumError("No such qubit to be measured.")
+
+        return self._collapse(self._axes([qubitNum]), inplace=True)[:, 0].tolist()
+
+    def measure_qubit(self, qubitNum):
+        """
+        Measures the desired qubit in the standard basis, independently in every shot, and deletes the qubit.
+
+        Arguments:
+        qubitNum	qubit to be measured
+        :return: The outcome of every shot
+        :rtype: list of int
+        """
+        if qubitNum not in self.qubitPositions:
+            raise quantumError("No such qubit to be measured.")
+
+        outcomes = self._collapse(self._axes([qubitNum]), inplace=False)
+        self._remove_position(qubitNum)
+
+        return outcomes[:, 0].tolist()
+
+    def measure_qubits(self, qList, inplace=False):
+        """
+        Measures the qubits in qList in the standard basis, sampling the joint outcome of every shot at once.
+
+        Arguments:
+        qList		list of qubits to be measured
+        inplace		if False the measured qubits are deleted
+        :return: The outcomes of every shot, a list of length shots of lists in the order of qList
+        :rtype: list of list of int
+        """
+        self._check_qubit_list(qList)
+        outcomes = self._collapse(self._axes(qList), inplace=inplace)
+        if not inplace:
+            for qubitNum in qList:
+                self._remove_position(qubitNum)
+
+        return outcomes.tolist()
+
+    def reset_qubit(self, qubitNum):
+        """
+        Measures the qubit qubitNum in every shot and resets it to \|0\> in place, keeping it as a spare qubit.
+
+        Arguments:
+        qubitNum	qubit to be reset
+        :return: The outcome of every shot
+        :rtype: list of int
+        """
+        outcomes = self.measure_qubit_inplace(qubitNum)
+
+        # After the measurement only one of the two slices is non-zero in every shot, move it to the |0> slice
+        state = np.moveaxis(self.qubitReg, self._axes([qubitNum])[0], 1)
+        state[:, 0] += state[:, 1]
+        state[:, 1] = 0
+        self.spareQubits.append(qubitNum)
+
+        return outcomes
+
+    def probabilities(self, qList):
+        """
+        Returns the probabilities of the outcomes of measuring the qubits in qList in the standard basis, without
+        changing the state. The outcome of the first qubit in qList is the most significant bit of the index.
+
+        Arguments:
+        qList		list of qubits
+        :return: The probabilities for every shot
+        :rtype: list of list of float
+        """
+        self._check_qubit_list(qList)
+        return self._probabilities(self._axes(qList)).tolist()
+
+    def expectation(self, pauli_string, qList=None):
+        """
+        Returns the expectation value of a tensor product of Paulis, without changing the state.
+
+        Arguments:
+        pauli_string	string of the characters I, X, Y and Z, e.g. "XZ"
+        qList		the qubits the Paulis act on, by default all qubits in the order of get_qubit_numbers
+        :return: The expectation value for every shot
+        :rtype: list of float
+        """
+        axes = [position + 1 for position in self._pauli_positions(pauli_string, qList)]
+        state = self.qubitReg
+        for pauli, axis in zip(pauli_string, axes):
+            if pauli != "I":
+                state = dense_states.apply_gate(state, getattr(dense_states, pauli), [axis])
+        values = np.sum(self.qubitReg.conj() * state, axis=tuple(range(1, state.ndim))).real
+        return values.tolist()
+
+    def replace_qubit(self, qubitNum, state):
+        """
+        Replaces the qubit at position qubitNum with the one given by state.
+        """
+        raise NotImplementedError("Currently you cannot replace a qubit using the batched engine")
+
+    def absorb(self, other):
+        """
+        Absorb the qubits from the other engine into this one. This is done by tensoring the state at the end,
+        shot by shot.
+        """
+
+        # Check whether there is space
+        newNum = self.activeQubits + other.activeQubits
+        if newNum > self.maxQubits:
+            raise quantumError("Cannot merge: qubits exceed the maximum available.\n")
+
+        offset = self.activeQubits
+        self._tensor(other.qubitReg)
+
+        return self._absorb_positions(other.get_qubit_numbers(), offset)
+
+    def absorb_parts(self, R, I, activeQ):
+        """
+        Absorb the qubits, given in pieces
+
+        Arguments:
+        R		real part of the state of every shot, of shape (shots, 2^activeQ)
+        I		imaginary part, of the same shape
+        activeQ		active number of qubits
+        """
+        # Check whether there is space
+        newNum = self.activeQubits + activeQ
+        if newNum > self.maxQubits:
+            raise quantumError("Cannot merge: qubits exceed the maximum available.\n")
+
+        return self._absorb_state(np.array(R) + 1j * np.array(I), activeQ)
+
+    def absorb_payload(self, payload):
+        """
+        Absorb the qubits of a register sent as a registerPayload by get_register_payload.
+        """
+        self._check_payload(payload, "batched_state_vectors")
+        activeQ = len(payload.qubits)
+        if self.activeQubits + activeQ > self.maxQubits:
+            raise quantumError("Cannot merge: qubits exceed the maximum available.\n")
+        return self._absorb_state(payload.arrays["state"], activeQ)
+
+    def _absorb_state(self, state, activeQ):
+        offset = self.activeQubits
+        self._tensor(state.reshape((len(state),) + (2,) * activeQ))
+
+        return [self._add_position(offset + k) for k in range(activeQ)]
@@ -0,0 +1,185 @@
+#
+# Copyright (c) 2017, Stephanie Wehner and Axel Dahlberg
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by Stephanie Wehner, QuTech.
+# 4. Neither the name of the QuTech organization nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+#########################
+# REGISTRY OF SIMULATION ENGINES
+#########################
+#
+# Engines are registered by name and only imported the first time a register using them is created.
+# This means that a virtual node which only uses the stabilizer engine never imports qutip or projectq.
+#
+# Third-party engines can be added either by calling register_engine, or by exposing an entry point
+# in the group "simulaqron.engines" pointing to a subclass of quantumEngine, for example in setup.py:
+#
+#     entry_points={
+#         "simulaqron.engines": ["my_engine = my_package.my_module:myEngine"],
+#     }
+#
+# after which "my_engine" can be used as sim_backend, or passed as backend to virtualNode.remote_new_register.
+
+import importlib
+
+from simulaqron.settings import SimBackend
+from simulaqron.virtual_node.basics import quantumEngine, quantumError
+
+ENTRY_POINT_GROUP = "simulaqron.engines"
+
+# Name of engine -> class or "module:attribute" path of the class
+_engines = {
+    SimBackend.STABILIZER.value: "simulaqron.virtual_node.stabilizer_simulator:stabilizerEngine",
+    SimBackend.PROJECTQ.value: "simulaqron.virtual_node.project_q_simulator:projectQEngine",
+    SimBackend.QUTIP.value: "simulaqron.virtual_node.qutip_simulator:qutipEngine",
+    SimBackend.HYBRID.value: "simulaqron.virtual_node.hybrid_simulator:hybridEngine",
+    SimBackend.EXTENDED_STABILIZER.value: (
+        "simulaqron.virtual_node.extended_stabilizer_simulator:extendedStabilizerEngine"
+    ),
+    SimBackend.BATCHED.value: "simulaqron.virtual_node.batched_simulator:batchedEngine",
+}
+
+# Engines whose measurements return one outcome per shot instead of a single outcome. These can not be used as
+# sim_backend, since the virtual nodes and the NetQASM backend expect single outcomes, and are only available for
+# single registers through the backend argument of virtualNode.remote_new_register.
+_register_only = {SimBackend.BATCHED.value}
+
+# Whether the entry points of installed packages have been added to _engines
+_loaded_entry_points = False
+
+
+def register_engine(name, engine):
+    """
+    Registers a simulation engine under the given name, overriding any engine with the same name.
+
+    :param name: str
+        The name of the engine, as used for sim_backend.
+    :param engine: type or str
+        Either a subclass of quantumEngine or a path of the form "module:attribute" to one. In the latter case
+        the module is only imported when the engine is first used.
+    """
+    if not isinstance(engine, str) and not (isinstance(engine, type) and issubclass(engine, quantumEngine)):
+        raise TypeError("engine should be a subclass of quantumEngine or a str of the form 'module:attribute'")
+    _engines[name] = engine
+
+
+def available_engines():
+    """
+    Returns the names of all registered engines, without importing them.
+
+    :return: The names of the engines
+    :rtype: list of str
+    """
+    _load_entry_points()
+    return list(_engines.keys())
+
+
+def default_engines():
+    """
+    Returns the names of all registered engines which can be used as sim_backend, without importing them.
+
+    :return: The names of the engines
+    :rtype: list of str
+    """
+    return [name for name in available_engines() if name not in _register_only]
+
+
+def get_default_engine(name):
+    """
+    Returns the engine class registered under the given name, to be used as sim_backend.
+
+    :param name: str
+        The name of the engine.
+    :return: The engine class
+    :rtype: type
+    """
+    if name in _register_only:
+        raise quantumError(
+            f"Backend {name} can not be used as sim_backend, it is only available for single registers through "
+            "the backend argument of remote_new_register"
+        )
+    return get_engine(name)
+
+
+def get_engine(name):
+    """
+    Returns the engine class registered under the given name, importing it if this has not been done yet.
+
+    :param name: str
+        The name of the engine, as used for sim_backend.
+    :return: The engine class
+    :rtype: type
+    """
+    engine = _engines.get(name)
+    if engine is None:
+        _load_entry_points()
+        engine = _engines.get(name)
+        if engine is None:
+            raise quantumError(f"Unknown backend {name}")
+    if isinstance(engine, str):
+        engine = _import_engine(name, engine)
+        _engines[name] = engine
+    return engine
+
+
+def _import_engine(name, path):
+    """
+    Imports the engine given by the path "module:attribute".
+    """
+    module_name, _, attribute = path.partition(":")
+    try:
+        module = importlib.import_module(module_name)
+        engine = getattr(module, attribute)
+    except (ImportError, AttributeError) as err:
+        raise quantumError(f"Could not load backend {name} from {path}: {err}")
+    if not (isinstance(engine, type) and issubclass(engine, quantumEngine)):
+        raise quantumError(f"Backend {name} given by {path} is not a subclass of quantumEngine")
+    return engine
+
+
+def _load_entry_points():
+    """
+    Adds the engines exposed as entry points by installed packages. Engines registered explicitly take precedence.
+    """
+    global _loaded_entry_points
+    if _loaded_entry_points:
+        return
+    _loaded_entry_points = True
+
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        # Python < 3.8, no entry points to load
+        return
+
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        group = eps.select(group=ENTRY_POINT_GROUP)
+    else:
+        group = eps.get(ENTRY_POINT_GROUP, [])
+    for ep in group:
+        if ep.name not in _engines:
+            _engines[ep.name] = ep.value
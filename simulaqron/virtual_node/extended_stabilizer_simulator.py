@@ -0,0 +1,390 @@
+#
+# Copyright (c) 2017, Stephanie Wehner and Axel Dahlberg
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by Stephanie Wehner, QuTech.
+# 4. Neither the name of the QuTech organization nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY <COPYRIGHT HOLDER> ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+
+from simulaqron.virtual_node.basics import quantumEngine, quantumError, noQubitError, registerPayload
+from simulaqron.toolbox.stabilizer_states import StabilizerState
+from simulaqron.toolbox.extended_stabilizer_states import ExtendedStabilizerState
+from simulaqron.settings import simulaqron_settings
+
+
+class extendedStabilizerEngine(quantumEngine):
+    """
+    Quantum engine for circuits consisting of Clifford operations and a small number of non-Clifford operations.
+    The state is stored as a Clifford unitary acting on a sparse superposition of basis states (see
+    simulaqron.toolbox.extended_stabilizer_states), so the cost is exponential only in the number of T gates and
+    rotations, not in the number of qubits.
+
+    Qubits cannot be removed from such a state, instead removed qubits are measured, reset to \|0\> and reused
+    by the next call to add_fresh_qubit.
+
+    Attributes:
+        maxQubits:	maximum number of qubits this engine will support.
+        precision:	terms of the superposition with a relative weight below this are dropped, 0 is exact.
+    """
+
+    def __init__(self, node, num, maxQubits=10, precision=None):
+        """
+        Initialize the simple engine. If no number is given for maxQubits, the assumption will be 10.
+        If no precision is given, the setting ext_stabilizer_precision is used.
+        """
+
+        super().__init__(node=node, num=num, maxQubits=maxQubits)
+
+        if precision is None:
+            precision = simulaqron_settings.ext_stabilizer_precision
+        self.precision = precision
+        self.qubitReg = ExtendedStabilizerState(precision=precision)
+
+        # Positions in qubitReg which are in the state |0> and can be reused
+        self.freePositions = []
+
+    @property
+    def activeQubits(self):
+        return len(self.qubitPositions)
+
+    def _new_position(self):
+        """
+        Returns a position in qubitReg which is in the state |0>, reusing a removed qubit if possible.
+        """
+        if self.freePositions:
+            return self.freePositions.pop(self.freePositions.index(min(self.freePositions)))
+        self.qubitReg.add_qubit()
+        return self.qubitReg.num_qubits - 1
+
+    def add_fresh_qubit(self):
+        """
+        Add a new qubit initialized in the \|0\> state.
+        """
+        # Check if we are still allowed to add qubits
+        if self.activeQubits >= self.maxQubits:
+            raise noQubitError("No more qubits available in register.")
+
+        num = self._add_position(self._new_position())
+
+        return num
+
+    def add_qubit(self, newQubit):
+        """
+        Add new qubit in the state described by newQubit. This can either be an array containing the generator of
+        the stabilizer group, in the form required by the StabilizerState class, or a state vector of length 2.
+        """
+        state = np.asarray(newQubit)
+        if state.ndim == 1 and np.issubdtype(state.dtype, np.number):
+            if state.shape != (2,):
+                raise ValueError("'newQubit' should be a state vector of length 2")
+            a, b = state.astype(complex) / np.linalg.norm(state)
+            # Unitary mapping |0> to the state
+            gate = np.array([[a, -b.conjugate()], [b, a.conjugate()]])
+            num = self.add_fresh_qubit()
+            self.qubitReg.apply_unitary(gate, [self._get_position(num)])
+            return num
+
+        try:
+            qubit = StabilizerState(newQubit)
+        except Exception:
+            raise ValueError("'newQubits' was not in the correct form to be given as an argument to StabilizerState")
+        if qubit.num_qubits != 1:
+            raise ValueError("Can only add a single qubit")
+        x, z, phase = qubit.to_array()[0]
+        num = self.add_fresh_qubit()
+        position = self._get_position(num)
+        if x and z:
+            self.qubitReg.apply_K(position)
+        elif x:
+            self.qubitReg.apply_H(position)
+        if phase:
+            # Flip to the -1 eigenstate
+            if x:
+                self.qubitReg.apply_Z(position)
+            else:
+                self.qubitReg.apply_X(position)
+        return num
+
+    def remove_qubit(self, qubitNum):
+        """
+        Removes the qubit with the desired number qubitNum
+        """
+        if qubitNum not in self.qubitPositions:
+            raise quantumError("No such qubit to remove")
+
+        self.measure_qubit(qubitNum)
+
+    def get_register_RI(self):
+        """
+        Retrieves the entire register in real and imaginary part. Twisted only likes to send real valued lists,
+        not complex ones.
+        The real part describes the Clifford tableau together with the positions of the qubits in it and the
+        imaginary part the terms of the superposition, see ExtendedStabilizerState.to_lists.
+        """
+        tableau, terms = self.qubitReg.to_lists()
+        positions = [self.qubitPositions[q] for q in self.get_qubit_numbers()]
+        Re = [tableau, positions, list(self.freePositions)]
+        Im = terms
+
+        return Re, Im
+
+    def get_register_payload(self):
+        """
+        Returns the tableau and the terms of the superposition as a registerPayload, see
+        ExtendedStabilizerState.to_arrays, together with the positions of the qubits in the tableau.
+        Registers of more than 64 qubits are sent as lists.
+        """
+        if self.qubitReg.num_qubits > 64:
+            return super().get_register_payload()
+        positions = [self.qubitPositions[q] for q in self.get_qubit_numbers()]
+        info = {"positions": positions, "freePositions": list(self.freePositions)}
+        return registerPayload("extended_stabilizer", self.get_qubit_numbers(), self.qubitReg.to_arrays(), info)
+
+    def state_nbytes(self):
+        """
+        Returns the number of bytes of the tableau and the terms of the superposition sent by get_register_payload.
+        """
+        n = self.qubitReg.num_qubits
+        return 4 * n * n + 16 * n + 24 * len(self.qubitReg.terms)
+
+    def get_state_vector(self):
+        """
+        Returns the state vector of the register, as a flat array of length 2^n, up to a global phase.
+        This is exponential in the number of qubits and mainly useful for testing.
+        """
+        state = self.qubitReg.to_state_vector()
+        # Removed qubits are in |0>
+        state = state[tuple(0 if p in self.freePositions else slice(None) for p in range(state.ndim))]
+        kept = [p for p in range(self.qubitReg.num_qubits) if p not in self.freePositions]
+        order = [kept.index(self.qubitPositions[q]) for q in self.get_qubit_numbers()]
+        return np.transpose(state, order).reshape(-1)
+
+    def apply_H(self, qubitNum):
+        """
+        Applies a Hadamard gate to the qubits with number qubitNum.
+        """
+        self.qubitReg.apply_H(self._get_position(qubitNum))
+
+    def apply_K(self, qubitNum):
+        """
+        Applies a K gate to the qubits with number qubitNum. Maps computational basis to Y eigenbasis.
+        """
+        self.qubitReg.apply_K(self._get_position(qubitNum))
+
+    def apply_X(self, qubitNum):
+        """
+        Applies a X gate to the qubits with number qubitNum.
+        """
+        self.qubitReg.apply_X(self._get_position(qubitNum))
+
+    def apply_Z(self, qubitNum):
+        """
+        Applies a Z gate to the qubits with number qubitNum.
+        """
+        self.qubitReg.apply_Z(self._get_position(qubitNum))
+
+    def apply_Y(self, qubitNum):
+        """
+        Applies a Y gate to the qubits with number qubitNum.
+        """
+        self.qubitReg.apply_Y(self._get_position(qubitNum))
+
+    def apply_T(self, qubitNum):
+        """
+        Applies a T gate to the qubits with number qubitNum.
+        """
+        self.qubitReg.apply_T(self._get_position(qubitNum))
+
+    def apply_rotation(self, qubitNum, n, a):
+        """
+        Applies a rotation around the axis n with the angle a to qubit with number qubitNum. If n is zero a ValueError
+        is raised.
+
+        :param qubitNum: int
+            Qubit number
+        :param n: tuple of floats
+            A tuple of three numbers specifying the rotation axis, e.g n=(1,0,0)
+        :param a: float
+            The rotation angle in radians.
+        """
+        self.qubitReg.apply_rotation(self._get_position(qubitNum), n, a)
+
+    def apply_CNOT(self, qubitNum1, qubitNum2):
+        """
+        Applies the CNOT to the qubit with the numbers qubitNum1 and qubitNum2.
+        """
+        self.qubitReg.apply_CNOT(self._get_position(qubitNum1), self._get_position(qubitNum2))
+
+    def apply_CPHASE(self, qubitNum1, qubitNum2):
+        """
+        Applies the CPHASE to the qubit with the numbers qubitNum1 and qubitNum2.
+        """
+        self.qubitReg.apply_CZ(self._get_position(qubitNum1), self._get_position(qubitNum2))
+
+    def apply_onequbit_gate(self, gate, qubitNum):
+        """
+        Applies a unitary gate to the specified qubit.
+
+        Arguments:
+        gate       The unitary to be applied as a 2x2 array
+        qubitNum 	the number of the qubit this gate is applied to
+        """
+        self.qubitReg.apply_unitary(gate, [self._get_position(qubitNum)])
+
+    def apply_twoqubit_gate(self, gate, qubit1, qubit2):
+        """
+        Applies a unitary gate to the two specified qubits.
+
+        Arguments:
+        gate       The unitary to be applied as a 4x4 array
+        qubit1 		the first qubit
+        qubit2		the second qubit
+        """
+        if qubit1 == qubit2:
+            raise ValueError("Control and target qubits cannot be the same")
+        self.qubitReg.apply_unitary(gate, [self._get_position(qubit1), self._get_position(qubit2)])
+
+    def measure_qubit_inplace(self, qubitNum):
+        """
+        Measures the desired qubit in the standard basis. This returns the classical outcome. The quantum register
+        is in the post-measurment state corresponding to the obtained outcome.
+
+        Arguments:
+        qubitNum	qubit to be measured
+        """
+
+        # Check we have such a qubit...
+        if qubitNum not in self.qubitPositions:
+            raise quantumError("No such qubit to be measured.")
+
+        outcome = self.qubitReg.measure(self._get_position(qubitNum))
+
+        # return measurement outcome
+        return outcome
+
+    def measure_qubit(self, qubitNum):
+        """
+        Measures the desired qubit in the standard basis. This returns the classical outcome and deletes the qubit.
+
+        Arguments:
+        qubitNum	qubit to be measured
+        """
+        outcome = self.measure_qubit_inplace(qubitNum)
+
+        # Reset the qubit to |0> such that it can be reused
+        position = self._remove_position(qubitNum, compact=False)
+        if outcome == 1:
+            self.qubitReg.apply_X(position)
+        self.freePositions.append(position)
+
+        return outcome
+
+    def probabilities(self, qList):
+        """
+        Returns the probabilities of the outcomes of measuring the qubits in qList in the standard basis, without
+        changing the state. The outcome of the first qubit in qList is the most significant bit of the index.
+
+        Arguments:
+        qList		list of qubits
+        """
+        self._check_qubit_list(qList)
+        return self.qubitReg.probabilities([self._get_position(qubitNum) for qubitNum in qList]).tolist()
+
+    def expectation(self, pauli_string, qList=None):
+        """
+        Returns the expectation value of a tensor product of Paulis, without changing the state.
+
+        Arguments:
+        pauli_string	string of the characters I, X, Y and Z, e.g. "XZ"
+        qList		the qubits the Paulis act on, by default all qubits in the order of get_qubit_numbers
+        """
+        positions = self._pauli_positions(pauli_string, qList)
+        operator = ["I"] * self.qubitReg.num_qubits
+        for pauli, position in zip(pauli_string, positions):
+            operator[position] = pauli
+        return self.qubitReg.expectation("".join(operator))
+
+    def replace_qubit(self, qubitNum, state):
+        """
+        Replaces the qubit at position qubitNum with the one given by state.
+        """
+        raise NotImplementedError("Currently you cannot replace a qubit using the extended stabilizer engine")
+
+    def absorb(self, other):
+        """
+        Absorb the qubits from the other engine into this one. This is done by tensoring the state at the end.
+        """
+
+        # Check whether there is space
+        newNum = self.activeQubits + other.activeQubits
+        if newNum > self.maxQubits:
+            raise quantumError("Cannot merge: qubits exceed the maximum available.\n")
+
+        otherNums = other.get_qubit_numbers()
+        positions = [other.qubitPositions[q] for q in otherNums]
+        newNums = self._absorb_state(other.qubitReg, positions, other.freePositions)
+
+        return dict(zip(otherNums, newNums))
+
+    def absorb_parts(self, R, I, activeQ):
+        """
+        Absorb the qubits, given in pieces
+
+        Arguments:
+        R		The tableau and positions of the qubits (from get_register_RI)
+        I		The terms of the superposition (from get_register_RI)
+        activeQ		active number of qubits
+        """
+        # Check whether there is space
+        newNum = self.activeQubits + activeQ
+        if newNum > self.maxQubits:
+            raise quantumError("Cannot merge: qubits exceed the maximum available.\n")
+
+        tableau, positions, freePositions = R
+        state = ExtendedStabilizerState.from_lists(tableau, I, precision=self.precision)
+        return self._absorb_state(state, positions, freePositions)
+
+    def absorb_payload(self, payload):
+        """
+        Absorb the qubits of a register sent as a registerPayload by get_register_payload.
+        """
+        self._check_payload(payload, "extended_stabilizer", "lists")
+        if payload.kind == "lists":
+            return super().absorb_payload(payload)
+
+        # Check whether there is space
+        if self.activeQubits + len(payload.qubits) > self.maxQubits:
+            raise quantumError("Cannot merge: qubits exceed the maximum available.\n")
+
+        state = ExtendedStabilizerState.from_arrays(payload.arrays, precision=self.precision)
+        return self._absorb_state(state, payload.info["positions"], payload.info["freePositions"])
+
+    def _absorb_state(self, state, positions, freePositions):
+        offset = self.qubitReg.num_qubits
+        self.qubitReg = self.qubitReg.tensor_product(state)
+        self.freePositions = self.freePositions + [p + offset for p in freePositions]
+
+        return [self._add_position(p + offset) for p in positions]
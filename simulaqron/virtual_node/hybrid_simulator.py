@@ -0,0 +1,619 @@
+#
+# Copyright (c) 2017, Stephanie Wehner and Axel Dahlberg
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by Stephanie Wehner, QuTech.
+# 4. Neither the name of the QuTech organization nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY <COPYRIGHT HOLDER> ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+
+from simulaqron.virtual_node.basics import quantumEngine, quantumError, noQubitError, registerPayload
+from simulaqron.toolbox.stabilizer_states import StabilizerState
+from simulaqron.toolbox import dense_states
+
+
+class hybridEngine(quantumEngine):
+    """
+    Quantum engine which uses the stabilizer formalism for as long as possible and only switches to a dense state
+    vector for the qubits which undergo a non-Clifford operation.
+
+    The register is stored as the tensor product of a stabilizer state and a dense state vector. All qubits start
+    out in the stabilizer part. When a non-Clifford operation is applied to a qubit in the stabilizer part, the qubit
+    is moved to the dense part. If the qubit is not entangled with the rest of the stabilizer part only this qubit is
+    converted, otherwise the whole stabilizer part is. Qubits measured in place are moved back to the stabilizer part.
+
+    Attributes:
+        maxQubits:	maximum number of qubits this engine will support.
+        stabReg:	the stabilizer part of the register
+        denseReg:	the dense part of the register (see simulaqron.toolbox.dense_states)
+        stabQubits:	the numbers of the qubits in the stabilizer part, in the order they appear there
+        denseQubits:	the numbers of the qubits in the dense part, in the order they appear there
+    """
+
+    def __init__(self, node, num, maxQubits=10):
+        """
+        Initialize the simple engine. If no number is given for maxQubits, the assumption will be 10.
+        """
+
+        super().__init__(node=node, num=num, maxQubits=maxQubits)
+
+        self.stabReg = StabilizerState()
+        self.denseReg = dense_states.empty_state()
+        self.stabQubits = []
+        self.denseQubits = []
+
+    @property
+    def activeQubits(self):
+        return len(self.stabQubits) + len(self.denseQubits)
+
+    @property
+    def promoted(self):
+        """
+        Whether any qubit of this register is simulated using a dense state vector.
+        """
+        return len(self.denseQubits) > 0
+
+    def _locate(self, qubitNum):
+        """
+        Returns whether the qubit is in the stabilizer part and its position in that part.
+        """
+        if qubitNum in self.stabQubits:
+            return True, self.stabQubits.index(qubitNum)
+        if qubitNum in self.denseQubits:
+            return False, self.denseQubits.index(qubitNum)
+        raise quantumError("No such qubit {} in register.".format(qubitNum))
+
+    def _to_dense(self, qubitNum):
+        """
+        Makes sure the qubit is in the dense part of the register.
+        """
+        if qubitNum not in self.stabQubits:
+            return
+        position = self.stabQubits.index(qubitNum)
+        pauli = self.stabReg.single_qubit_pauli(position)
+        if pauli is not None:
+            # Only this qubit needs to be converted. Rotate the qubit to the standard basis, read out its state
+            # deterministically and rotate it back
+            if pauli == (True, False):
+                clifford = dense_states.H
+                self.stabReg.apply_H(position)
+            elif pauli == (True, True):
+                clifford = dense_states.K
+                self.stabReg.apply_K(position)
+            else:
+                clifford = None
+            outcome = self.stabReg.measure(position, inplace=False)
+            state = dense_states.basis_state([outcome])
+            if clifford is not None:
+                state = dense_states.apply_gate(state, clifford, [0])
+            self.stabQubits.pop(position)
+            self.denseReg = dense_states.tensor(self.denseReg, state)
+            self.denseQubits.append(qubitNum)
+        else:
+            state = dense_states.stabilizer_to_state(self.stabReg)
+            self.denseReg = dense_states.tensor(self.denseReg, state)
+            self.denseQubits.extend(self.stabQubits)
+            self.stabReg = StabilizerState()
+            self.stabQubits = []
+
+    def _new_numbers(self, count):
+        """
+        Returns the count smallest numbers not used by any qubit in the register.
+        """
+        used = set(self.stabQubits) | set(self.denseQubits)
+        numbers = []
+        num = 0
+        while len(numbers) < count:
+            if num not in used:
+                numbers.append(num)
+            num += 1
+        return numbers
+
+    def get_qubit_numbers(self):
+        """
+        Returns the numbers of the qubits in this register, in the order they appear in the output of
+        get_register_RI.
+        :rtype: list of int
+        """
+        if not self.promoted:
+            return list(self.stabQubits)
+        return sorted(self.stabQubits + self.denseQubits)
+
+    def _check_space(self, numNew):
+        if self.activeQubits + numNew > self.maxQubits:
+            raise quantumError("Cannot merge: qubits exceed the maximum available.\n")
+
+    def add_fresh_qubit(self):
+        """
+        Add a new qubit initialized in the \|0\> state.
+        """
+        # Check if we are still allowed to add qubits
+        if self.activeQubits >= self.maxQubits:
+            raise noQubitError("No more qubits available in register.")
+
+        num = self._new_numbers(1)[0]
+
+        # Prepare a clean qubit state in |0>
+        self.stabReg.add_qubit()
+        self.stabQubits.append(num)
+
+        return num
+
+    def add_qubit(self, newQubit):
+        """
+        Add new qubit in the state described by newQubit. This can either be an array containing the generators of
+        the stabilizer group, in the form required by the StabilizerState class, or a state vector of length 2.
+        """
+        # Check if we are still allowed to add qubits
+        if self.activeQubits >= self.maxQubits:
+            raise noQubitError("No more qubits available in register.")
+
+        num = self._new_numbers(1)[0]
+
+        state = np.asarray(newQubit)
+        if state.ndim == 1 and np.issubdtype(state.dtype, np.number):
+            if state.shape != (2,):
+                raise ValueError("'newQubit' should be a state vector of length 2")
+            self.denseReg = dense_states.tensor(self.denseReg, state.astype(complex))
+            self.denseQubits.append(num)
+        else:
+            try:
+                qubit = StabilizerState(newQubit)
+            except Exception:
+                raise ValueError(
+                    "'newQubits' was not in the correct form to be given as an argument to StabilizerState"
+                )
+            self.stabReg = self.stabReg.tensor_product(qubit)
+            self.stabQubits.append(num)
+
+        return num
+
+    def remove_qubit(self, qubitNum):
+        """
+        Removes the qubit with the desired number qubitNum
+        """
+        if qubitNum not in self.stabQubits and qubitNum not in self.denseQubits:
+            raise quantumError("No such qubit to remove")
+
+        self.measure_qubit(qubitNum)
+
+    def get_register_RI(self):
+        """
+        Retrieves the entire register in real and imaginary part. Twisted only likes to send real valued lists,
+        not complex ones.
+        If no qubit has been promoted to a dense state, the real part will be the boolean matrix describing the
+        generators and the imaginary part will be None, as for the stabilizer engine.
+        Otherwise the real and imaginary part are those of the state vector of the whole register.
+        In both cases the qubits are ordered as given by get_qubit_numbers.
+        """
+        if not self.promoted:
+            Re = self.stabReg.to_array().tolist()
+            Im = None
+        else:
+            state = self.get_state_vector()
+            Re = state.real.tolist()
+            Im = state.imag.tolist()
+
+        return Re, Im
+
+    def get_register_payload(self):
+        """
+        Returns the state of the register as a registerPayload. As for get_register_RI, this is the generator matrix
+        if no qubit has been promoted to a dense state and otherwise the state vector of the whole register.
+        """
+        if not self.promoted:
+            x_part, z_part, phases = self.stabReg.to_packed()
+            return registerPayload(
+                "stabilizer",
+                self.get_qubit_numbers(),
+                {"x": x_part, "z": z_part, "phases": phases},
+                {"num_qubits": self.stabReg.num_qubits},
+            )
+        return registerPayload("state_vector", self.get_qubit_numbers(), {"state": self.get_state_vector()})
+
+    def state_nbytes(self):
+        """
+        Returns the number of bytes of the packed generators or state vector sent by get_register_payload.
+        """
+        n = self.activeQubits - len(self.spareQubits)
+        if not self.promoted:
+            return (2 * n + 1) * ((n + 7) // 8)
+        return 16 * 2 ** n
+
+    def get_state_vector(self):
+        """
+        Returns the state vector of the whole register, as a flat array of length 2^n.
+        This converts the stabilizer part to a dense state, but leaves the register unchanged.
+        """
+        state = dense_states.tensor(self.denseReg, dense_states.stabilizer_to_state(self.stabReg))
+        order = self.denseQubits + self.stabQubits
+        state = np.transpose(state, np.argsort(order))
+        return state.reshape(-1)
+
+    def get_qubits(self, qList):
+        """
+        Returns the density matrix of the qubits with numbers in qList, as a numpy array.
+        The qubits appear in the order given by get_qubit_numbers.
+        If all qubits are in the dense part the stabilizer part is not converted.
+        """
+        for qubitNum in qList:
+            self._locate(qubitNum)
+        qList = [q for q in self.get_qubit_numbers() if q in qList]
+        if all(q in self.denseQubits for q in qList):
+            state = self.denseReg
+            order = self.denseQubits
+        else:
+            state = dense_states.tensor(self.denseReg, dense_states.stabilizer_to_state(self.stabReg))
+            order = self.denseQubits + self.stabQubits
+        return dense_states.reduced_density_matrix(state, [order.index(q) for q in qList])
+
+    def get_qubits_RI(self, qList):
+        """
+        Retrieves the qubits in the list and returns the result as a list divided into
+        a real and imaginary part. Twisted only likes to send real values lists,
+        not complex ones.
+
+        Arguments
+        qList		list of qubits to retrieve, e.g. [1, 4]
+        """
+        rho = self.get_qubits(qList)
+        Re = rho.real.tolist()
+        Im = rho.imag.tolist()
+
+        return (Re, Im)
+
+    def _apply_clifford(self, qubitNum, name, gate):
+        """
+        Applies the Clifford gate either in the stabilizer formalism, using the method name of StabilizerState,
+        or to the dense part using the unitary gate.
+        """
+        in_stab, position = self._locate(qubitNum)
+        if in_stab:
+            getattr(self.stabReg, name)(position)
+        else:
+            self.denseReg = dense_states.apply_gate(self.denseReg, gate, [position])
+
+    def apply_H(self, qubitNum):
+        """
+        Applies a Hadamard gate to the qubits with number qubitNum.
+        """
+        self._apply_clifford(qubitNum, "apply_H", dense_states.H)
+
+    def apply_K(self, qubitNum):
+        """
+        Applies a K gate to the qubits with number qubitNum. Maps computational basis to Y eigenbasis.
+        """
+        self._apply_clifford(qubitNum, "apply_K", dense_states.K)
+
+    def apply_X(self, qubitNum):
+        """
+        Applies a X gate to the qubits with number qubitNum.
+        """
+        self._apply_clifford(qubitNum, "apply_X", dense_states.X)
+
+    def apply_Z(self, qubitNum):
+        """
+        Applies a Z gate to the qubits with number qubitNum.
+        """
+        self._apply_clifford(qubitNum, "apply_Z", dense_states.Z)
+
+    def apply_Y(self, qubitNum):
+        """
+        Applies a Y gate to the qubits with number qubitNum.
+        """
+        self._apply_clifford(qubitNum, "apply_Y", dense_states.Y)
+
+    def apply_T(self, qubitNum):
+        """
+        Applies a T gate to the qubits with number qubitNum.
+        """
+        self.apply_onequbit_gate(dense_states.T, qubitNum)
+
+    def apply_rotation(self, qubitNum, n, a):
+        """
+        Applies a rotation around the axis n with the angle a to qubit with number qubitNum. If n is zero a ValueError
+        is raised.
+
+        :param qubitNum: int
+            Qubit number
+        :param n: tuple of floats
+            A tuple of three numbers specifying the rotation axis, e.g n=(1,0,0)
+        :param a: float
+            The rotation angle in radians.
+        """
+        self.apply_onequbit_gate(dense_states.rotation(n, a), qubitNum)
+
+    def apply_CNOT(self, qubitNum1, qubitNum2):
+        """
+        Applies the CNOT to the qubit with the numbers qubitNum1 and qubitNum2.
+        """
+        if qubitNum1 in self.stabQubits and qubitNum2 in self.stabQubits:
+            self.stabReg.apply_CNOT(self.stabQubits.index(qubitNum1), self.stabQubits.index(qubitNum2))
+        else:
+            self.apply_twoqubit_gate(dense_states.CNOT, qubitNum1, qubitNum2)
+
+    def apply_CPHASE(self, qubitNum1, qubitNum2):
+        """
+        Applies the CPHASE to the qubit with the numbers qubitNum1 and qubitNum2.
+        """
+        if qubitNum1 in self.stabQubits and qubitNum2 in self.stabQubits:
+            self.stabReg.apply_CZ(self.stabQubits.index(qubitNum1), self.stabQubits.index(qubitNum2))
+        else:
+            self.apply_twoqubit_gate(dense_states.CPHASE, qubitNum1, qubitNum2)
+
+    def apply_onequbit_gate(self, gate, qubitNum):
+        """
+        Applies a unitary gate to the specified qubit. The qubit is moved to the dense part of the register.
+
+        Arguments:
+        gate       The unitary to be applied as a 2x2 array
+        qubitNum 	the number of the qubit this gate is applied to
+        """
+        self._locate(qubitNum)
+        self._to_dense(qubitNum)
+        position = self.denseQubits.index(qubitNum)
+        self.denseReg = dense_states.apply_gate(self.denseReg, gate, [position])
+
+    def apply_twoqubit_gate(self, gate, qubit1, qubit2):
+        """
+        Applies a unitary gate to the two specified qubits. The qubits are moved to the dense part of the register.
+
+        Arguments:
+        gate       The unitary to be applied as a 4x4 array
+        qubit1 		the first qubit
+        qubit2		the second qubit
+        """
+        if qubit1 == qubit2:
+            raise ValueError("Control and target qubits cannot be the same")
+        self._locate(qubit1)
+        self._locate(qubit2)
+        self._to_dense(qubit1)
+        self._to_dense(qubit2)
+        positions = [self.denseQubits.index(qubit1), self.denseQubits.index(qubit2)]
+        self.denseReg = dense_states.apply_gate(self.denseReg, gate, positions)
+
+    def measure_qubit_inplace(self, qubitNum):
+        """
+        Measures the desired qubit in the standard basis. This returns the classical outcome. The quantum register
+        is in the post-measurment state corresponding to the obtained outcome.
+        Since the qubit is no longer entangled after the measurement it is moved back to the stabilizer part.
+
+        Arguments:
+        qubitNum	qubit to be measured
+        """
+
+        in_stab, position = self._locate(qubitNum)
+        if in_stab:
+            return self.stabReg.measure(position, inplace=True)
+
+        outcome, self.denseReg = dense_states.measure(self.denseReg, position)
+        self.denseQubits.pop(position)
+        self.stabReg.add_qubit()
+        if outcome == 1:
+            self.stabReg.apply_X(self.stabReg.num_qubits - 1)
+        self.stabQubits.append(qubitNum)
+
+        # return measurement outcome
+        return outcome
+
+    def measure_qubit(self, qubitNum):
+        """
+        Measures the desired qubit in the standard basis. This returns the classical outcome and deletes the qubit.
+
+        Arguments:
+        qubitNum	qubit to be measured
+        """
+        in_stab, position = self._locate(qubitNum)
+        if in_stab:
+            outcome = self.stabReg.measure(position, inplace=False)
+            self.stabQubits.pop(position)
+        else:
+            outcome, self.denseReg = dense_states.measure(self.denseReg, position)
+            self.denseQubits.pop(position)
+
+        return outcome
+
+    def measure_qubits(self, qList, inplace=False):
+        """
+        Measures the qubits in qList in the standard basis. The joint outcome of the qubits in the dense part is
+        sampled at once. As for measure_qubit_inplace, measured qubits are moved back to the stabilizer part.
+
+        Arguments:
+        qList		list of qubits to be measured
+        inplace		if False the measured qubits are deleted
+        """
+        self._check_qubit_list(qList)
+        outcomes = {}
+        for qubitNum in qList:
+            if qubitNum in self.stabQubits:
+                position = self.stabQubits.index(qubitNum)
+                outcomes[qubitNum] = self.stabReg.measure(position, inplace=inplace)
+                if not inplace:
+                    self.stabQubits.pop(position)
+
+        denseList = [q for q in qList if q in self.denseQubits]
+        if denseList:
+            axes = [self.denseQubits.index(q) for q in denseList]
+            bits, self.denseReg = dense_states.measure_qubits(self.denseReg, axes)
+            for qubitNum, outcome in zip(denseList, bits):
+                self.denseQubits.remove(qubitNum)
+                outcomes[qubitNum] = outcome
+                if inplace:
+                    self.stabReg.add_qubit()
+                    if outcome == 1:
+                        self.stabReg.apply_X(self.stabReg.num_qubits - 1)
+                    self.stabQubits.append(qubitNum)
+
+        return [outcomes[qubitNum] for qubitNum in qList]
+
+    def probabilities(self, qList):
+        """
+        Returns the probabilities of the outcomes of measuring the qubits in qList in the standard basis, without
+        changing the state. The outcome of the first qubit in qList is the most significant bit of the index.
+        The distributions of the two parts are computed separately.
+
+        Arguments:
+        qList		list of qubits
+        """
+        self._check_qubit_list(qList)
+        denseList = [q for q in qList if q in self.denseQubits]
+        stabList = [q for q in qList if q in self.stabQubits]
+        densePart = dense_states.probabilities(self.denseReg, [self.denseQubits.index(q) for q in denseList])
+        if stabList:
+            stabPart = self.stabReg.probabilities([self.stabQubits.index(q) for q in stabList])
+        else:
+            stabPart = np.ones(1)
+        probs = np.outer(densePart, stabPart).reshape((2,) * len(qList))
+        order = denseList + stabList
+        probs = np.transpose(probs, [order.index(q) for q in qList])
+        return probs.reshape(-1).tolist()
+
+    def expectation(self, pauli_string, qList=None):
+        """
+        Returns the expectation value of a tensor product of Paulis, without changing the state.
+        This is the product of the expectation values on the two parts.
+
+        Arguments:
+        pauli_string	string of the characters I, X, Y and Z, e.g. "XZ"
+        qList		the qubits the Paulis act on, by default all qubits in the order of get_qubit_numbers
+        """
+        if qList is None:
+            qList = self.get_qubit_numbers()
+        self._check_qubit_list(qList)
+        if len(pauli_string) != len(qList):
+            raise ValueError("Pauli string {} does not match the qubits {}".format(pauli_string, qList))
+
+        densePaulis = ""
+        denseAxes = []
+        operator = ["I"] * len(self.stabQubits)
+        for pauli, qubitNum in zip(pauli_string, qList):
+            if qubitNum in self.denseQubits:
+                densePaulis += pauli
+                denseAxes.append(self.denseQubits.index(qubitNum))
+            else:
+                operator[self.stabQubits.index(qubitNum)] = pauli
+
+        value = dense_states.expectation(self.denseReg, densePaulis, denseAxes)
+        if any(pauli != "I" for pauli in operator):
+            value *= self.stabReg.expectation("".join(operator))
+        return float(value)
+
+    def should_split(self):
+        """
+        Only the dense part is costly to scan for separable qubits, so this is bounded by its number of qubits.
+        """
+        return len(self.denseQubits) <= self.maxSplitQubits
+
+    def separable_qubits(self):
+        """
+        Returns the numbers of the qubits which are in a product state with the rest of the register. These are the
+        qubits in the stabilizer part which are not entangled with the others and the qubits in the dense part whose
+        reduced state is pure.
+        """
+        separable = [self.stabQubits[position] for position in self.stabReg.separable_positions()]
+        if self.denseQubits:
+            purities = dense_states.single_qubit_purities(self.denseReg)
+            separable += [
+                self.denseQubits[axis] for axis in np.flatnonzero(purities > 1 - dense_states.PURITY_TOLERANCE)
+            ]
+        return separable
+
+    def _separable_state(self, qubitNum):
+        isStab, position = self._locate(qubitNum)
+        if isStab:
+            return self.stabReg.single_qubit_state(position).to_array().tolist()
+        rho = dense_states.reduced_density_matrix(self.denseReg, [position])
+        return dense_states.pure_state(rho).tolist()
+
+    def replace_qubit(self, qubitNum, state):
+        """
+        Replaces the qubit at position qubitNum with the one given by state.
+        """
+        raise NotImplementedError("Currently you cannot replace a qubit using the hybrid engine")
+
+    def absorb(self, other):
+        """
+        Absorb the qubits from the other engine into this one. This is done by tensoring the state at the end.
+        The stabilizer and dense parts are tensored separately, so no part of either register is converted.
+        """
+
+        # Check whether there is space
+        self._check_space(other.activeQubits)
+
+        otherNums = other.get_qubit_numbers()
+        mapping = dict(zip(otherNums, self._new_numbers(len(otherNums))))
+        self.stabReg = self.stabReg.tensor_product(other.stabReg)
+        self.stabQubits = self.stabQubits + [mapping[q] for q in other.stabQubits]
+        self.denseReg = dense_states.tensor(self.denseReg, other.denseReg)
+        self.denseQubits = self.denseQubits + [mapping[q] for q in other.denseQubits]
+
+        return mapping
+
+    def absorb_parts(self, R, I, activeQ):
+        """
+        Absorb the qubits, given in pieces
+
+        Arguments:
+        R		Either the array describing the stabilizer state (from StabilizerState.to_array)
+                or the real part of the state vector
+        I		None if R describes a stabilizer state, otherwise the imaginary part of the state vector
+        activeQ		active number of qubits
+        """
+        # Check whether there is space
+        self._check_space(activeQ)
+
+        newQubits = self._new_numbers(activeQ)
+        if I is None:
+            self._absorb_stabilizer(StabilizerState(R), newQubits)
+        else:
+            self._absorb_dense(np.array(R) + 1j * np.array(I), newQubits)
+
+        return newQubits
+
+    def absorb_payload(self, payload):
+        """
+        Absorb the qubits of a register sent as a registerPayload by get_register_payload.
+        """
+        self._check_payload(payload, "stabilizer", "state_vector")
+        activeQ = len(payload.qubits)
+        self._check_space(activeQ)
+
+        newQubits = self._new_numbers(activeQ)
+        if payload.kind == "stabilizer":
+            arrays = payload.arrays
+            state = StabilizerState.from_packed(arrays["x"], arrays["z"], arrays["phases"], payload.info["num_qubits"])
+            self._absorb_stabilizer(state, newQubits)
+        else:
+            self._absorb_dense(payload.arrays["state"], newQubits)
+
+        return newQubits
+
+    def _absorb_stabilizer(self, state, newQubits):
+        self.stabReg = self.stabReg.tensor_product(state)
+        self.stabQubits = self.stabQubits + newQubits
+
+    def _absorb_dense(self, state, newQubits):
+        self.denseReg = dense_states.tensor(self.denseReg, state.reshape((2,) * len(newQubits)))
+        self.denseQubits = self.denseQubits + newQubits
@@ -33,7 +33,8 @@ except ImportError:
     raise RuntimeError("If you want to use the projectq backend you need to install the python package 'projectq'")
 import numpy as np
 
-from simulaqron.virtual_node.basics import quantumEngine, quantumError, noQubitError
+from simulaqron.virtual_node.basics import quantumEngine, quantumError, noQubitError, registerPayload
+from simulaqron.toolbox import dense_states
 
 
 class projectQEngine(quantumEngine):
@@ -64,8 +65,8 @@ class projectQEngine(quantumEngine):
         # Check first that project Q garbage collector not already removed qubits
         self.eng.flush()
         if not len(self.eng.backend.cheat()[0]) == 0:
-            for _ in range(self.activeQubits):
-                self.measure_qubit(0)
+            for qubitNum in self.get_qubit_numbers():
+                self.measure_qubit(qubitNum)
 
     def add_fresh_qubit(self):
         """
@@ -80,7 +81,7 @@ class projectQEngine(quantumEngine):
 
         self.qubitReg.append(qubit)
 
-        num = self.activeQubits
+        num = self._add_position(self.activeQubits)
 
         self.activeQubits += 1
 
@@ -99,7 +100,7 @@ class projectQEngine(quantumEngine):
         num = self.add_fresh_qubit()
 
         # Transform the new qubit into the correct state
-        pQ.ops.StatePreparation(newQubit) | self.qubitReg[num]
+        pQ.ops.StatePreparation(newQubit) | self.qubitReg[self._get_position(num)]
 
         return num
 
@@ -107,7 +108,7 @@ class projectQEngine(quantumEngine):
         """
         Removes the qubit with the desired number qubitNum
         """
-        if (qubitNum + 1) > self.activeQubits:
+        if qubitNum not in self.qubitPositions:
             raise quantumError("No such qubit to remove")
 
         self.measure_qubit(qubitNum)
@@ -117,6 +118,28 @@ class projectQEngine(quantumEngine):
         Retrieves the entire register in real and imaginary parts and returns the result as a
         list. Twisted only likes to send real valued lists, not complex ones.
         """
+        q_reg_order, state = self._cheat()
+
+        # Note previously the format of real and imaginary numbers were
+        # expected, use the same even though Re will be the qubit mapping
+        # and Im the state
+        Re = tuple(state.real.tolist())
+        Im = tuple(state.imag.tolist())
+
+        return q_reg_order, (Re, Im)
+
+    def get_register_payload(self):
+        """
+        Returns the state vector of the register as a registerPayload, together with the mapping from positions in
+        the register to bit positions in the state.
+        """
+        q_reg_order, state = self._cheat()
+        return registerPayload("state_vector", self.get_qubit_numbers(), {"state": state}, {"order": q_reg_order})
+
+    def _cheat(self):
+        """
+        Returns the mapping from positions in qubitReg to bit positions in the state and the state vector.
+        """
         self.eng.flush()
         order, state = self.eng.backend.cheat()
         # Update the order based on the positions in the qubitReg
@@ -125,13 +148,43 @@ class projectQEngine(quantumEngine):
         for i, q in enumerate(self.qubitReg):
             q_reg_order[i] = order[q.id]
 
-        # Note previously the format of real and imaginary numbers were
-        # expected, use the same even though Re will be the qubit mapping
-        # and Im the state
-        Re = tuple(n.real for n in state)
-        Im = tuple(n.imag for n in state)
+        return q_reg_order, np.asarray(state, dtype=complex)
 
-        return q_reg_order, (Re, Im)
+    def _get_state(self, qList):
+        """
+        Returns the state vector of the register with one axis per qubit, and the axes of the qubits in qList.
+        """
+        self.eng.flush()
+        order, state = self.eng.backend.cheat()
+        n = len(state).bit_length() - 1
+        # Bit b of the index of the state vector belongs to the qubit with ID order[b], which is axis n - 1 - b
+        # of the state as a tensor
+        axes = [n - 1 - order[self.qubitReg[self._get_position(qubitNum)].id] for qubitNum in qList]
+        return np.array(state).reshape((2,) * n), axes
+
+    def get_qubits(self, qList):
+        """
+        Returns the density matrix of the qubits with numbers in qList, as a numpy array.
+        The qubits appear in the order of their positions in the register.
+        """
+        qList = sorted(qList, key=self._get_position)
+        state, axes = self._get_state(qList)
+        return dense_states.reduced_density_matrix(state, axes)
+
+    def get_qubits_RI(self, qList):
+        """
+        Retrieves the qubits in the list and returns the result as a list divided into
+        a real and imaginary part. Twisted only likes to send real values lists,
+        not complex ones.
+
+        Arguments
+        qList		list of qubits to retrieve, e.g. [1, 4]
+        """
+        rho = self.get_qubits(qList)
+        Re = rho.real.tolist()
+        Im = rho.imag.tolist()
+
+        return (Re, Im)
 
     def apply_H(self, qubitNum):
         """
@@ -219,10 +272,10 @@ class projectQEngine(quantumEngine):
         qubitNum 	the number of the qubit this gate is applied to
         """
 
-        if (qubitNum + 1) > self.activeQubits:
+        if qubitNum not in self.qubitPositions:
             raise quantumError("No such qubit to apply a single qubit gate to")
 
-        gate | self.qubitReg[qubitNum]
+        gate | self.qubitReg[self._get_position(qubitNum)]
 
     def apply_twoqubit_gate(self, gate, qubit1, qubit2):
         """
@@ -233,16 +286,16 @@ class projectQEngine(quantumEngine):
         qubit1 		the first qubit
         qubit2		the second qubit
         """
-        if (qubit1 + 1) > self.activeQubits:
+        if qubit1 not in self.qubitPositions:
             raise quantumError("No such qubit to act as a control qubit")
 
-        if (qubit2 + 1) > self.activeQubits:
+        if qubit2 not in self.qubitPositions:
             raise quantumError("No such qubit to act as a target qubit")
 
         if qubit1 == qubit2:
             raise quantumError("Control and target are equal")
 
-        gate | (self.qubitReg[qubit1], self.qubitReg[qubit2])
+        gate | (self.qubitReg[self._get_position(qubit1)], self.qubitReg[self._get_position(qubit2)])
 
     def measure_qubit_inplace(self, qubitNum):
         """
@@ -254,14 +307,15 @@ class projectQEngine(quantumEngine):
         """
 
         # Check we have such a qubit...
-        if (qubitNum + 1) > self.activeQubits:
+        if qubitNum not in self.qubitPositions:
             raise quantumError("No such qubit to be measured.")
+        position = self._get_position(qubitNum)
 
-        pQ.ops.Measure | self.qubitReg[qubitNum]
+        pQ.ops.Measure | self.qubitReg[position]
 
         self.eng.flush()
 
-        outcome = int(self.qubitReg[qubitNum])
+        outcome = int(self.qubitReg[position])
 
         # return measurement outcome
         return outcome
@@ -275,13 +329,78 @@ class projectQEngine(quantumEngine):
         """
         outcome = self.measure_qubit_inplace(qubitNum)
 
-        self.qubitReg.pop(qubitNum)
+        self.qubitReg.pop(self._remove_position(qubitNum))
 
         # Update the number of qubits
         self.activeQubits = self.activeQubits - 1
 
         return outcome
 
+    def measure_qubits(self, qList, inplace=False):
+        """
+        Measures the qubits in qList in the standard basis. The measurements are flushed to the simulator at once.
+
+        Arguments:
+        qList		list of qubits to be measured
+        inplace		if False the measured qubits are deleted
+        """
+        self._check_qubit_list(qList)
+        positions = [self._get_position(qubitNum) for qubitNum in qList]
+        for position in positions:
+            pQ.ops.Measure | self.qubitReg[position]
+
+        self.eng.flush()
+
+        outcomes = [int(self.qubitReg[position]) for position in positions]
+
+        if not inplace:
+            for qubitNum in qList:
+                self.qubitReg.pop(self._remove_position(qubitNum))
+            self.activeQubits = self.activeQubits - len(qList)
+
+        return outcomes
+
+    def probabilities(self, qList):
+        """
+        Returns the probabilities of the outcomes of measuring the qubits in qList in the standard basis, without
+        changing the state. The outcome of the first qubit in qList is the most significant bit of the index.
+
+        Arguments:
+        qList		list of qubits
+        """
+        self._check_qubit_list(qList)
+        state, axes = self._get_state(qList)
+        return dense_states.probabilities(state, axes).tolist()
+
+    def expectation(self, pauli_string, qList=None):
+        """
+        Returns the expectation value of a tensor product of Paulis, without changing the state.
+
+        Arguments:
+        pauli_string	string of the characters I, X, Y and Z, e.g. "XZ"
+        qList		the qubits the Paulis act on, by default all qubits in the order of get_qubit_numbers
+        """
+        if qList is None:
+            qList = self.get_qubit_numbers()
+        self._pauli_positions(pauli_string, qList)
+        state, axes = self._get_state(qList)
+        return dense_states.expectation(state, pauli_string, axes)
+
+    def separable_qubits(self):
+        """
+        Returns the numbers of the qubits whose reduced state is pure, these are in a product state with the rest of
+        the register.
+        """
+        if self.activeQubits == 0:
+            return []
+        numbers = self.get_qubit_numbers()
+        state, axes = self._get_state(numbers)
+        purities = dense_states.single_qubit_purities(state)
+        return [num for num, axis in zip(numbers, axes) if purities[axis] > 1 - dense_states.PURITY_TOLERANCE]
+
+    def _separable_state(self, qubitNum):
+        return dense_states.pure_state(self.get_qubits([qubitNum])).tolist()
+
     def replace_qubit(self, qubitNum, state):
         """
         Replaces the qubit at position qubitNum with the one given by state.
@@ -302,9 +421,11 @@ class projectQEngine(quantumEngine):
             self.eng = other.eng
             self.qubitReg = list(other.qubitReg)
             self.activeQubits = other.activeQubits
+            return self._absorb_positions(other.get_qubit_numbers(), 0)
         elif other.activeQubits > 0:
-            data = other.get_register_RI()
-            self.absorb_parts(*data, other.activeQubits)
+            newNums = self.absorb_payload(other.get_register_payload())
+            return dict(zip(other.get_qubit_numbers(), newNums))
+        return {}
 
     def absorb_parts(self, R, I, activeQ):
         """
@@ -325,23 +446,46 @@ class projectQEngine(quantumEngine):
             order, (R, I) = R, I
 
             # Convert the real and imaginary parts to a state
-            state = [re + im * 1j for re, im in zip(R, I)]
+            return self._absorb_state(order, np.array(R) + 1j * np.array(I), activeQ)
+        return []
+
+    def absorb_payload(self, payload):
+        """
+        Absorb the qubits of a register sent as a registerPayload by get_register_payload.
+        """
+        self._check_payload(payload, "state_vector")
+        activeQ = len(payload.qubits)
+
+        # Check whether there is space
+        if self.activeQubits + activeQ > self.maxQubits:
+            raise quantumError("Cannot merge: qubits exceed the maximum available.\n")
+
+        if activeQ > 0:
+            return self._absorb_state(payload.info["order"], payload.arrays["state"], activeQ)
+        return []
+
+    def _absorb_state(self, order, state, activeQ):
+        """
+        Adds activeQ qubits in the state vector state, where order maps their positions to bit positions in state.
+        """
+        # Allocate qubits in this engine for the new qubits from the other engine
+        qreg = self.eng.allocate_qureg(activeQ)
 
-            # Allocate qubits in this engine for the new qubits from the other engine
-            qreg = self.eng.allocate_qureg(activeQ)
+        # Put the new qubits in the correct state
+        pQ.ops.StatePreparation(state) | qreg
 
-            # Put the new qubits in the correct state
-            pQ.ops.StatePreparation(state) | qreg
+        # Put the qubits in the correct order
+        # The `order` is a mapping from the previous qubit IDs
+        # to the bit position in the state. The qubits in the `qreg`
+        # are therefore in the old bit positions which needs to be updated.
+        new_qubits = [None] * len(qreg)
+        for old_q_id, old_bit_pos in order.items():
+            new_qubits[old_q_id] = qreg[old_bit_pos]
 
-            # Put the qubits in the correct order
-            # The `order` is a mapping from the previous qubit IDs
-            # to the bit position in the state. The qubits in the `qreg`
-            # are therefore in the old bit positions which needs to be updated.
-            new_qubits = [None] * len(qreg)
-            for old_q_id, old_bit_pos in order.items():
-                new_qubits[old_q_id] = qreg[old_bit_pos]
+        # Add the qubits to the list of qubits
+        offset = self.activeQubits
+        self.qubitReg += new_qubits
 
-            # Add the qubits to the list of qubits
-            self.qubitReg += new_qubits
+        self.activeQubits = offset + activeQ
 
-            self.activeQubits = newNum
+        return [self._add_position(offset + k) for k in range(activeQ)]
@@ -31,14 +31,15 @@ import time
 
 import numpy as np
 from twisted.spread import pb
-from twisted.internet.defer import DeferredLock
-from twisted.internet import reactor
-from twisted.internet.task import deferLater
 from twisted.internet.defer import inlineCallbacks
 
 from netqasm.logging.glob import get_netqasm_logger
 
 from simulaqron import settings
+from simulaqron.virtual_node.basics import countingLock, lockStatistics
+
+# Wait times for the locks of all simulated qubits in this process
+qubitLockStatistics = lockStatistics()
 
 
 class simulatedQubit(pb.Referenceable):
@@ -67,15 +68,16 @@ class simulatedQubit(pb.Referenceable):
         # Number of the simulated qubit, unique at each virtual node
         self.simNum = simNum
 
-        # Lock marshalling access to this qubit
-        self._lock = DeferredLock()
+        # Name of the virtual node holding the virtual qubit backed by this qubit and its number there. Together
+        # with the index of register members at the simulating node, this is the location directory of a register.
+        self.location = None
+
+        # Lock marshalling access to this qubit, the wait times of all qubits are counted together
+        self._lock = countingLock(qubitLockStatistics)
 
         # Mark this qubit as active (still connected to a register)
         self.active = True
 
-        # Time until retry
-        self._delay = 1
-
         # Optional parameters for when the simulation is noise
         self.noisy = settings.simulaqron_settings.noisy_qubits
         self.T1 = settings.simulaqron_settings.t1
@@ -87,11 +89,17 @@ class simulatedQubit(pb.Referenceable):
 
     @inlineCallbacks
     def lock(self):
-        self._logger.debug(f"locking sim qubit in register with num {self.register.num}")
-        while self.isLocked():
-            yield deferLater(reactor, self._delay, lambda: None)
+        self._logger.debug("locking sim qubit in register with num %d", self.register.num)
         yield self._lock.acquire()
-        self._logger.debug(f"got lock for sim qubit in register with num {self.register.num}")
+        self._logger.debug("got lock for sim qubit in register with num %d", self.register.num)
+
+    def try_lock(self):
+        """
+        Acquires the lock of this qubit directly if it is free, without creating a Deferred.
+
+        :return: Whether the lock was acquired.
+        """
+        return self._lock.try_acquire()
 
     @inlineCallbacks
     def remote_lock(self):
@@ -99,7 +107,7 @@ class simulatedQubit(pb.Referenceable):
 
     def unlock(self):
         try:
-            self._logger.debug(f"unlocking sim qubit in register with num {self.register.num}")
+            self._logger.debug("unlocking sim qubit in register with num %d", self.register.num)
             self._lock.release()
         except AssertionError as exc:
             self._logger.error(f"AssertionError {exc}")
@@ -107,6 +115,45 @@ class simulatedQubit(pb.Referenceable):
     def remote_unlock(self):
         self.unlock()
 
+    @inlineCallbacks
+    def remote_lock_with_register(self):
+        """
+        Acquires the lock of the register this qubit is in and then the lock of this qubit. Since the qubit might be
+        moved to another register while waiting, this is repeated until the locked register is the one of the qubit.
+
+        :return: Whether the qubit is still active. If not, no locks are held.
+        """
+        while self.active:
+            register = self.register
+            yield register.lock.acquire()
+            yield self.lock()
+            if self.active and self.register is register:
+                return True
+            self.unlock()
+            register.lock.release()
+        return False
+
+    def try_lock_with_register(self):
+        """
+        Acquires the locks of lock_with_register directly if they are free, without creating Deferreds.
+
+        :return: Whether the locks were acquired. If not, no locks are held.
+        """
+        if not self.active or not self.register.lock.try_acquire():
+            return False
+        if self.try_lock():
+            return True
+        self.register.lock.release()
+        return False
+
+    def remote_unlock_with_register(self):
+        """
+        Releases the locks acquired by lock_with_register. The register can not change while the qubit is locked.
+        """
+        register = self.register
+        self.unlock()
+        register.lock.release()
+
     def isLocked(self):
         return self._lock.locked
 
@@ -120,59 +167,62 @@ class simulatedQubit(pb.Referenceable):
         """
         Make this a fresh qubit.
         """
-        # Create a fresh qubit in the |0> state
-        num = self.register.add_fresh_qubit()
+        # Create a fresh qubit in the |0> state, reusing the slot of a measured out qubit if no operation holds the
+        # register
+        register = self.register
+        num = None
+        if register.spareQubits and register.runs_inline() and register.lock.try_acquire():
+            try:
+                num = register.take_spare_qubit()
+            finally:
+                register.lock.release()
+        if num is None:
+            num = register.add_fresh_qubit()
         self.num = num
 
-        self._logger.info("QUANTUM %s: Adding qubit number %d to register %d", self.node.name, num, self.register.num)
+        self._logger.info("QUANTUM %s: Adding qubit number %d to register %d", self.node.name, num, register.num)
 
     def remote_apply_X(self):
         """
         Apply X gate to itself by passing it onto the underlying register.
         """
         self._logger.debug("VIRTUAL NODE %s: applying X to number %d", self.node.name, self.num)
-        self._apply_random_pauli_noise()
-        self.register.apply_X(self.num)
+        return self._run_noisy(self.register.apply_X)
 
     def remote_apply_K(self):
         """
         Apply K gate to itself by passing it onto the underlying register. Maps computational to Y eigenbasis.
         """
         self._logger.debug("VIRTUAL NODE %s: applying K to number %d", self.node.name, self.num)
-        self._apply_random_pauli_noise()
-        self.register.apply_K(self.num)
+        return self._run_noisy(self.register.apply_K)
 
     def remote_apply_Y(self):
         """
         Apply Y gate.
         """
         self._logger.debug("VIRTUAL NODE %s: applying Y to number %d", self.node.name, self.num)
-        self._apply_random_pauli_noise()
-        self.register.apply_Y(self.num)
+        return self._run_noisy(self.register.apply_Y)
 
     def remote_apply_Z(self):
         """
         Apply Z gate.
         """
         self._logger.debug("VIRTUAL NODE %s: applying Z to number %d", self.node.name, self.num)
-        self._apply_random_pauli_noise()
-        self.register.apply_Z(self.num)
+        return self._run_noisy(self.register.apply_Z)
 
     def remote_apply_H(self):
         """
         Apply H gate.
         """
         self._logger.debug("VIRTUAL NODE %s: applying H to number %d", self.node.name, self.num)
-        self._apply_random_pauli_noise()
-        self.register.apply_H(self.num)
+        return self._run_noisy(self.register.apply_H)
 
     def remote_apply_T(self):
         """
         Apply T gate.
         """
         self._logger.debug("VIRTUAL NODE %s: applying T to number %d", self.node.name, self.num)
-        self._apply_random_pauli_noise()
-        self.register.apply_T(self.num)
+        return self._run_noisy(self.register.apply_T)
 
     def remote_apply_rotation(self, *args):
         """
@@ -190,8 +240,7 @@ class simulatedQubit(pb.Referenceable):
             str(tuple(n)),
             str(a),
         )
-        self._apply_random_pauli_noise()
-        self.register.apply_rotation(self.num, n, a)
+        return self._run_noisy(self.register.apply_rotation, n, a)
 
     def remote_measure_inplace(self):
         """
@@ -200,9 +249,7 @@ class simulatedQubit(pb.Referenceable):
 
         Returns the measurement outcome.
         """
-        self._apply_random_pauli_noise()
-        outcome = self.register.measure_qubit_inplace(self.num)
-        return outcome
+        return self._run_noisy(self.register.measure_qubit_inplace)
 
     def remote_measure(self):
         """
@@ -212,9 +259,7 @@ class simulatedQubit(pb.Referenceable):
         """
 
         # Measure the qubit
-        self._apply_random_pauli_noise()
-        outcome = self.register.measure_qubit(self.num)
-        return outcome
+        return self._run_noisy(self.register.measure_qubit)
 
     def remote_cnot_onto(self, targetNum):
         """
@@ -225,8 +270,7 @@ class simulatedQubit(pb.Referenceable):
         """
 
         self._logger.debug("VIRTUAL NODE %s: CNOT from %d to %d", self.node.name, self.num, targetNum)
-        self._apply_random_pauli_noise()
-        self.register.apply_CNOT(self.num, targetNum)
+        return self._run_noisy(self.register.apply_CNOT, targetNum)
 
     def remote_cphase_onto(self, targetNum):
         """
@@ -235,8 +279,7 @@ class simulatedQubit(pb.Referenceable):
         Arguments
         targetNum    the qubit to use as the target of the CPHASE
         """
-        self._apply_random_pauli_noise()
-        self.register.apply_CPHASE(self.num, targetNum)
+        return self._run_noisy(self.register.apply_CPHASE, targetNum)
 
     def remote_get_sim_number(self):
         """
@@ -258,9 +301,22 @@ class simulatedQubit(pb.Referenceable):
 
     def remote_get_register_RI(self):
         """
-        Returns the register where this qubit is simulated.
+        Returns the real and imaginary parts of the state of the register where this qubit is simulated, or a
+        Deferred firing with them if the register is large.
         """
-        return self.register.get_register_RI()
+        register = self.register
+
+        def get_RI():
+            register.drop_spare_qubits()
+            return register.get_register_RI()
+
+        return register.run(get_RI)
+
+    def remote_get_register_nbytes(self):
+        """
+        Returns the number of bytes of state it takes to move the register of this qubit to another node.
+        """
+        return self.register.state_nbytes()
 
     def remote_get_numbers(self):
         """
@@ -272,9 +328,10 @@ class simulatedQubit(pb.Referenceable):
         """
         Returns the state of the qubits in the list qList by tracing out the rest.
         """
-        backend = settings.simulaqron_settings.sim_backend
-        if backend != settings.SimBackend.QUTIP.value:
-            raise RuntimeError("Cannot get reduced qubit state using backend {}".format(backend))
+        if not hasattr(self.register, "get_qubits_RI"):
+            raise RuntimeError(
+                "Cannot get reduced qubit state using backend {}".format(self.register.__class__.__name__)
+            )
         self._logger.debug("VIRTUAL NODE %s: Returning qubit %d", self.node.name, self.num)
         return self.register.get_qubits_RI([self.num])
 
@@ -284,6 +341,18 @@ class simulatedQubit(pb.Referenceable):
         """
         return (self.simNum, self.node.name)
 
+    def _run_noisy(self, func, *args):
+        """
+        Applies the noise and then func(self.num, *args) through the run method of the register, so that operations
+        on large registers are run in a separate thread. Returns what func returns, or a Deferred firing with it.
+        """
+
+        def apply():
+            self._apply_random_pauli_noise()
+            return func(self.num, *args)
+
+        return self.register.run(apply)
+
     def _apply_random_pauli_noise(self):
         """
         Applies random pauli gate if required
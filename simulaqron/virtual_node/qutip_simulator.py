@@ -30,14 +30,14 @@ import math
 import cmath
 
 import numpy as np
-import logging
 
 try:
     import qutip as qp
 except ImportError:
     raise RuntimeError("If you want to use the qutip backend you need to install the python package 'qutip'")
 
-from simulaqron.virtual_node.basics import quantumEngine, quantumError, noQubitError
+from simulaqron.virtual_node.basics import quantumEngine, quantumError, noQubitError, registerPayload
+from simulaqron.toolbox import dense_states
 
 
 class qutipEngine(quantumEngine):
@@ -87,7 +87,7 @@ class qutipEngine(quantumEngine):
             self.qubitReg = newQubit
 
         # Index number of that qubit
-        num = self.activeQubits
+        num = self._add_position(self.activeQubits)
 
         # Increment the number of qubits
         self.activeQubits = self.activeQubits + 1
@@ -98,8 +98,9 @@ class qutipEngine(quantumEngine):
         """
         Removes the qubit with the desired number qubitNum
         """
-        if (qubitNum + 1) > self.activeQubits:
+        if qubitNum not in self.qubitPositions:
             raise quantumError("No such qubit to remove")
+        position = self._remove_position(qubitNum)
 
         # Check if this the only qubit
         if self.activeQubits == 1:
@@ -108,13 +109,11 @@ class qutipEngine(quantumEngine):
             return
 
         # Compute the list of qubits to keep
-        keepList = []
-        for j in range(self.activeQubits):
-            if j != qubitNum:
-                keepList.append(j)
+        keepList = [j for j in range(self.activeQubits) if j != position]
 
         # Trace out this qubit by taking the partial trace
-        self.qubitReg = self.qubitReg.ptrace(keepList)
+        dimL = [2] * len(keepList)
+        self.qubitReg = qp.Qobj(dense_states.partial_trace(self.qubitReg.full(), keepList), dims=[dimL, dimL])
 
         # Update the number of qubits
         self.activeQubits = self.activeQubits - 1
@@ -129,8 +128,8 @@ class qutipEngine(quantumEngine):
         qList		list of qubits to retrieve, e.g. [1, 4]
         """
         rho = self.get_qubits(qList)
-        Re = rho.full().real.tolist()
-        Im = rho.full().imag.tolist()
+        Re = rho.real.tolist()
+        Im = rho.imag.tolist()
 
         return (Re, Im)
 
@@ -139,11 +138,24 @@ class qutipEngine(quantumEngine):
         Retrieves the entire register in real and imaginary parts and returns the result as a
         list. Twisted only likes to send real valued lists, not complex ones.
         """
-        Re = self.qubitReg.full().real.tolist()
-        Im = self.qubitReg.full().imag.tolist()
+        rho = self.qubitReg.full()
+        Re = rho.real.tolist()
+        Im = rho.imag.tolist()
 
         return (Re, Im)
 
+    def get_register_payload(self):
+        """
+        Returns the density matrix of the register as a registerPayload.
+        """
+        return registerPayload("density_matrix", self.get_qubit_numbers(), {"state": self.qubitReg.full()})
+
+    def state_nbytes(self):
+        """
+        Returns the number of bytes of the density matrix sent by get_register_payload.
+        """
+        return 16 * 4 ** (self.activeQubits - len(self.spareQubits))
+
     def apply_H(self, qubitNum):
         """
         Applies a Hadamard gate to the qubits with number qubitNum.
@@ -239,20 +251,11 @@ class qutipEngine(quantumEngine):
 
     def get_qubits(self, list):
         """
-        Returns the qubits with numbers in list.
+        Returns the density matrix of the qubits with numbers in list, as a numpy array.
+        The qubits appear in the order of their positions in the register.
         """
-
-        # Qutip distinguishes between system dimensionality and matrix dimensionality
-        # so we need to make sure it knows we are talking about multiple qubits
-        k = int(math.log2(self.qubitReg.shape[0]))
-        dimL = []
-        for j in range(k):
-            dimL.append(2)
-
-        self.qubitReg.dims = [dimL, dimL]
-
-        logging.debug("Dimensions %s", self.qubitReg.dims)
-        return self.qubitReg.ptrace(list)
+        positions = sorted(self._get_position(qubitNum) for qubitNum in list)
+        return dense_states.partial_trace(self.qubitReg.full(), positions)
 
     def apply_onequbit_gate(self, gateU, qubitNum):
         """
@@ -264,7 +267,7 @@ class qutipEngine(quantumEngine):
         """
 
         # Compute the overall unitary, identity everywhere with gateU at position qubitNum
-        overallU = qp.gate_expand_1toN(gateU, self.activeQubits, qubitNum)
+        overallU = qp.gate_expand_1toN(gateU, self.activeQubits, self._get_position(qubitNum))
 
         # Qutip distinguishes between system dimensionality and matrix dimensionality
         # so we need to make sure it knows we are talking about multiple qubits
@@ -290,7 +293,8 @@ class qutipEngine(quantumEngine):
         """
 
         # Construct the overall unitary
-        overallU = qp.gate_expand_2toN(gateU, self.activeQubits, qubit1, qubit2)
+        overallU = qp.gate_expand_2toN(gateU, self.activeQubits, self._get_position(qubit1),
+                                       self._get_position(qubit2))
 
         # Qutip distinguishes between system dimensionality and matrix dimensionality
         # so we need to make sure it knows we are talking about multiple qubits
@@ -315,17 +319,18 @@ class qutipEngine(quantumEngine):
         """
 
         # Check we have such a qubit...
-        if (qubitNum + 1) > self.activeQubits:
+        if qubitNum not in self.qubitPositions:
             raise quantumError("No such qubit to be measured.")
+        position = self._get_position(qubitNum)
 
         # Construct the two measurement operators, and put them at the right position
         v0 = qp.basis(2, 0)
         P0 = v0 * v0.dag()
-        M0 = qp.gate_expand_1toN(P0, self.activeQubits, qubitNum)
+        M0 = qp.gate_expand_1toN(P0, self.activeQubits, position)
 
         v1 = qp.basis(2, 1)
         P1 = v1 * v1.dag()
-        M1 = qp.gate_expand_1toN(P1, self.activeQubits, qubitNum)
+        M1 = qp.gate_expand_1toN(P1, self.activeQubits, position)
 
         # Compute the success probabilities
         obj = M0 * self.qubitReg
@@ -357,22 +362,78 @@ class qutipEngine(quantumEngine):
 
         return outcome
 
+    def measure_qubits(self, qList, inplace=False):
+        """
+        Measures the qubits in qList in the standard basis, sampling the joint outcome at once.
+
+        Arguments:
+        qList		list of qubits to be measured
+        inplace		if False the measured qubits are deleted
+        """
+        self._check_qubit_list(qList)
+        positions = [self._get_position(qubitNum) for qubitNum in qList]
+        outcomes, rho = dense_states.dm_measure_qubits(self.qubitReg.full(), positions, inplace=inplace)
+        if not inplace:
+            for qubitNum in qList:
+                self._remove_position(qubitNum)
+            self.activeQubits = self.activeQubits - len(qList)
+        if self.activeQubits == 0:
+            self.qubitReg = qp.Qobj()
+        else:
+            dimL = [2] * self.activeQubits
+            self.qubitReg = qp.Qobj(rho, dims=[dimL, dimL])
+
+        return outcomes
+
+    def probabilities(self, qList):
+        """
+        Returns the probabilities of the outcomes of measuring the qubits in qList in the standard basis, without
+        changing the state. The outcome of the first qubit in qList is the most significant bit of the index.
+
+        Arguments:
+        qList		list of qubits
+        """
+        self._check_qubit_list(qList)
+        positions = [self._get_position(qubitNum) for qubitNum in qList]
+        return dense_states.dm_probabilities(self.qubitReg.full(), positions).tolist()
+
+    def expectation(self, pauli_string, qList=None):
+        """
+        Returns the expectation value of a tensor product of Paulis, without changing the state.
+
+        Arguments:
+        pauli_string	string of the characters I, X, Y and Z, e.g. "XZ"
+        qList		the qubits the Paulis act on, by default all qubits in the order of get_qubit_numbers
+        """
+        positions = self._pauli_positions(pauli_string, qList)
+        return dense_states.dm_expectation(self.qubitReg.full(), pauli_string, positions)
+
+    def separable_qubits(self):
+        """
+        Returns the numbers of the qubits whose reduced state is pure, these are in a product state with the rest of
+        the register.
+        """
+        if self.activeQubits == 0:
+            return []
+        purities = dense_states.dm_single_qubit_purities(self.qubitReg.full())
+        numbers = self.get_qubit_numbers()
+        return [numbers[position] for position in np.flatnonzero(purities > 1 - dense_states.PURITY_TOLERANCE)]
+
+    def _separable_state(self, qubitNum):
+        return qp.Qobj(self.get_qubits([qubitNum]))
+
     def replace_qubit(self, qubitNum, state):
         """
-        Replaces the qubit at position qubitNum with the one given by state.
+        Replaces the qubit with number qubitNum with the one given by state.
         """
 
         # Remove the qubit currently there by tracing it out
         self.remove_qubit(qubitNum)
 
-        # Tensor on the new qubit at the end
-        self.add_qubit(state)
-
-        # Put the new qubit in the correct position
-        qList = list(range(self.activeQubits))
-        qList[qubitNum] = self.activeQubits
-        qList[self.activeQubits - 1] = qubitNum
-        self.qubitReg.permute(qList)
+        # Tensor on the new qubit at the end, it keeps the number of the old qubit
+        num = self.add_qubit(state)
+        if num != qubitNum:
+            self._renumber(num, qubitNum)
 
     def absorb(self, other):
         """
@@ -390,8 +451,11 @@ class qutipEngine(quantumEngine):
         elif other.activeQubits != 0:
             self.qubitReg = qp.tensor(self.qubitReg, other.qubitReg)
 
+        offset = self.activeQubits
         self.activeQubits = newNum
 
+        return self._absorb_positions(other.get_qubit_numbers(), offset)
+
     def absorb_parts(self, R, I, activeQ):
         """
         Absorb the qubits, given in pieces
@@ -402,13 +466,18 @@ class qutipEngine(quantumEngine):
         activeQ		active number of qubits
         """
 
-        # Convert the real and imaginary parts given as lists into a qutip object
-        M = I
-        for s in range(len(I)):
-            for t in range(len(I)):
-                M[s][t] = R[s][t] + I[s][t] * 1j
+        # Convert the real and imaginary parts given as lists into a density matrix
+        return self._absorb_density_matrix(np.array(R) + 1j * np.array(I), activeQ)
 
-        qt = qp.Qobj(M)
+    def absorb_payload(self, payload):
+        """
+        Absorb the qubits of a register sent as a registerPayload by get_register_payload.
+        """
+        self._check_payload(payload, "density_matrix")
+        return self._absorb_density_matrix(payload.arrays["state"], len(payload.qubits))
+
+    def _absorb_density_matrix(self, rho, activeQ):
+        qt = qp.Qobj(rho)
 
         # Check whether there is space
         newNum = self.activeQubits + activeQ
@@ -421,6 +490,7 @@ class qutipEngine(quantumEngine):
         elif qt.shape[0] != 0:
             self.qubitReg = qp.tensor(self.qubitReg, qt)
 
+        offset = self.activeQubits
         self.activeQubits = newNum
 
         # Qutip distinguishes between system dimensionality and matrix dimensionality
@@ -431,3 +501,5 @@ class qutipEngine(quantumEngine):
             dimL.append(2)
 
         self.qubitReg.dims = [dimL, dimL]
+
+        return [self._add_position(offset + k) for k in range(activeQ)]
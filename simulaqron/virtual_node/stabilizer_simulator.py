@@ -26,7 +26,7 @@
 # ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
-from simulaqron.virtual_node.basics import quantumEngine, quantumError, noQubitError
+from simulaqron.virtual_node.basics import quantumEngine, quantumError, noQubitError, registerPayload
 from simulaqron.toolbox.stabilizer_states import StabilizerState
 from simulaqron.general import SimUnsupportedError
 
@@ -60,7 +60,7 @@ class stabilizerEngine(quantumEngine):
         if self.activeQubits >= self.maxQubits:
             raise noQubitError("No more qubits available in register.")
 
-        num = self.activeQubits
+        num = self._add_position(self.activeQubits)
 
         # Prepare a clean qubit state in |0>
         self.qubitReg.add_qubit()
@@ -79,7 +79,7 @@ class stabilizerEngine(quantumEngine):
         except Exception:
             raise ValueError("'newQubits' was not in the correct form to be given as an argument to StabilizerState")
 
-        num = self.activeQubits
+        num = self._add_position(self.activeQubits)
 
         self.qubitReg = self.qubitReg.tensor_product(qubit)
 
@@ -89,7 +89,7 @@ class stabilizerEngine(quantumEngine):
         """
         Removes the qubit with the desired number qubitNum
         """
-        if (qubitNum + 1) > self.activeQubits:
+        if qubitNum not in self.qubitPositions:
             raise quantumError("No such qubit to remove")
 
         self.measure_qubit(qubitNum)
@@ -107,38 +107,58 @@ class stabilizerEngine(quantumEngine):
 
         return Re, Im
 
+    def get_register_payload(self):
+        """
+        Returns the generators as a registerPayload, with the bits of their X-parts, Z-parts and phases packed into
+        bytes by StabilizerState.to_packed.
+        """
+        x_part, z_part, phases = self.qubitReg.to_packed()
+        return registerPayload(
+            "stabilizer",
+            self.get_qubit_numbers(),
+            {"x": x_part, "z": z_part, "phases": phases},
+            {"num_qubits": self.qubitReg.num_qubits},
+        )
+
+    def state_nbytes(self):
+        """
+        Returns the number of bytes of the packed generators sent by get_register_payload.
+        """
+        n = self.activeQubits - len(self.spareQubits)
+        return (2 * n + 1) * ((n + 7) // 8)
+
     def apply_H(self, qubitNum):
         """
         Applies a Hadamard gate to the qubits with number qubitNum.
         """
-        self.qubitReg.apply_H(qubitNum)
+        self.qubitReg.apply_H(self._get_position(qubitNum))
 
     def apply_K(self, qubitNum):
         """
         Applies a K gate to the qubits with number qubitNum. Maps computational basis to Y eigenbasis.
         """
-        self.qubitReg.apply_K(qubitNum)
+        self.qubitReg.apply_K(self._get_position(qubitNum))
 
     def apply_X(self, qubitNum):
         """
         Applies a X gate to the qubits with number qubitNum.
         """
 
-        self.qubitReg.apply_X(qubitNum)
+        self.qubitReg.apply_X(self._get_position(qubitNum))
 
     def apply_Z(self, qubitNum):
         """
         Applies a Z gate to the qubits with number qubitNum.
         """
 
-        self.qubitReg.apply_Z(qubitNum)
+        self.qubitReg.apply_Z(self._get_position(qubitNum))
 
     def apply_Y(self, qubitNum):
         """
         Applies a Y gate to the qubits with number qubitNum.
         """
 
-        self.qubitReg.apply_Y(qubitNum)
+        self.qubitReg.apply_Y(self._get_position(qubitNum))
 
     def apply_T(self, qubitNum):
         """
@@ -164,14 +184,14 @@ class stabilizerEngine(quantumEngine):
         """
         Applies the CNOT to the qubit with the numbers qubitNum1 and qubitNum2.
         """
-        self.qubitReg.apply_CNOT(qubitNum1, qubitNum2)
+        self.qubitReg.apply_CNOT(self._get_position(qubitNum1), self._get_position(qubitNum2))
 
     def apply_CPHASE(self, qubitNum1, qubitNum2):
         """
         Applies the CPHASE to the qubit with the numbers qubitNum1 and qubitNum2.
         """
 
-        self.qubitReg.apply_CZ(qubitNum1, qubitNum2)
+        self.qubitReg.apply_CZ(self._get_position(qubitNum1), self._get_position(qubitNum2))
 
     def apply_onequbit_gate(self, gate, qubitNum):
         """
@@ -205,10 +225,10 @@ class stabilizerEngine(quantumEngine):
         """
 
         # Check we have such a qubit...
-        if (qubitNum + 1) > self.activeQubits:
+        if qubitNum not in self.qubitPositions:
             raise quantumError("No such qubit to be measured.")
 
-        outcome = self.qubitReg.measure(qubitNum, inplace=True)
+        outcome = self.qubitReg.measure(self._get_position(qubitNum), inplace=True)
 
         # return measurement outcome
         return outcome
@@ -220,10 +240,53 @@ class stabilizerEngine(quantumEngine):
         Arguments:
         qubitNum	qubit to be measured
         """
-        outcome = self.qubitReg.measure(qubitNum, inplace=False)
+        outcome = self.qubitReg.measure(self._get_position(qubitNum), inplace=False)
+        self._remove_position(qubitNum)
 
         return outcome
 
+    def probabilities(self, qList):
+        """
+        Returns the probabilities of the outcomes of measuring the qubits in qList in the standard basis, without
+        changing the state. The outcome of the first qubit in qList is the most significant bit of the index.
+
+        Arguments:
+        qList		list of qubits
+        """
+        self._check_qubit_list(qList)
+        return self.qubitReg.probabilities([self._get_position(qubitNum) for qubitNum in qList]).tolist()
+
+    def expectation(self, pauli_string, qList=None):
+        """
+        Returns the expectation value of a tensor product of Paulis, without changing the state.
+
+        Arguments:
+        pauli_string	string of the characters I, X, Y and Z, e.g. "XZ"
+        qList		the qubits the Paulis act on, by default all qubits in the order of get_qubit_numbers
+        """
+        positions = self._pauli_positions(pauli_string, qList)
+        operator = ["I"] * self.activeQubits
+        for pauli, position in zip(pauli_string, positions):
+            operator[position] = pauli
+        return float(self.qubitReg.expectation("".join(operator)))
+
+    def should_split(self):
+        """
+        Looking for separable qubits only takes time polynomial in the number of qubits, so this is always done.
+        """
+        return True
+
+    def separable_qubits(self):
+        """
+        Returns the numbers of the qubits which are not entangled with the rest of the register, which is the case
+        if all generators act on the qubit with either the identity or the same Pauli.
+        """
+        numbers = self.get_qubit_numbers()
+        return [numbers[position] for position in self.qubitReg.separable_positions()]
+
+    def _separable_state(self, qubitNum):
+        return self.qubitReg.single_qubit_state(self._get_position(qubitNum)).to_array().tolist()
+
     def replace_qubit(self, qubitNum, state):
         """
         Replaces the qubit at position qubitNum with the one given by state.
@@ -240,8 +303,11 @@ class stabilizerEngine(quantumEngine):
         if newNum > self.maxQubits:
             raise quantumError("Cannot merge: qubits exceed the maximum available.\n")
 
+        offset = self.activeQubits
         self.qubitReg = self.qubitReg.tensor_product(other.qubitReg)
 
+        return self._absorb_positions(other.get_qubit_numbers(), offset)
+
     def absorb_parts(self, R, I, activeQ):
         """
         Absorb the qubits, given in pieces
@@ -251,9 +317,24 @@ class stabilizerEngine(quantumEngine):
         I		Unused
         activeQ		active number of qubits
         """
+        return self._absorb_state(StabilizerState(R), activeQ)
+
+    def absorb_payload(self, payload):
+        """
+        Absorb the qubits of a register sent as a registerPayload by get_register_payload.
+        """
+        self._check_payload(payload, "stabilizer")
+        arrays = payload.arrays
+        state = StabilizerState.from_packed(arrays["x"], arrays["z"], arrays["phases"], payload.info["num_qubits"])
+        return self._absorb_state(state, len(payload.qubits))
+
+    def _absorb_state(self, state, activeQ):
         # Check whether there is space
         newNum = self.activeQubits + activeQ
         if newNum > self.maxQubits:
             raise quantumError("Cannot merge: qubits exceed the maximum available.\n")
 
-        self.qubitReg = self.qubitReg.tensor_product(StabilizerState(R))
+        offset = self.activeQubits
+        self.qubitReg = self.qubitReg.tensor_product(state)
+
+        return [self._add_position(offset + k) for k in range(activeQ)]
@@ -27,33 +27,44 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import heapq
+import logging
 import random
+from itertools import groupby
 # import traceback
 
-from collections import deque
+from collections import OrderedDict, deque
 
+import numpy as np
 from twisted.spread import pb
 from twisted.internet import reactor
-from twisted.internet.defer import inlineCallbacks, DeferredLock, Deferred, DeferredList
-from twisted.internet.task import deferLater
+from twisted.internet.defer import inlineCallbacks, Deferred, DeferredList, succeed
 from twisted.internet.error import ConnectionRefusedError, CannotListenError
 from twisted.spread.pb import RemoteError, RemoteReference
 
 from netqasm.logging.glob import get_netqasm_logger
 
-from simulaqron.virtual_node.basics import quantumError, noQubitError, virtNetError
-from simulaqron.virtual_node.quantum import simulatedQubit
+from simulaqron.virtual_node.basics import quantumError, noQubitError, virtNetError, countingLock
+from simulaqron.virtual_node.basics import registerLockStatistics, mergeStatistics, registerPayload
+from simulaqron.virtual_node.quantum import simulatedQubit, qubitLockStatistics
 from simulaqron.general.host_config import SocketsConfig
-from simulaqron.settings import simulaqron_settings, SimBackend
-
-if simulaqron_settings.sim_backend == SimBackend.QUTIP.value:
-    from simulaqron.virtual_node.qutip_simulator import qutipEngine
-elif simulaqron_settings.sim_backend == SimBackend.PROJECTQ.value:
-    from simulaqron.virtual_node.project_q_simulator import projectQEngine
-elif simulaqron_settings.sim_backend == SimBackend.STABILIZER.value:
-    from simulaqron.virtual_node.stabilizer_simulator import stabilizerEngine
-else:
-    raise quantumError(f"Unknown backend {simulaqron_settings.sim_backend}")
+from simulaqron.toolbox.manage_nodes import NetworksConfigConstructor
+from simulaqron.virtual_node.engine_registry import get_default_engine, get_engine
+from simulaqron.settings import simulaqron_settings
+
+# Operations accepted by virtualNode.remote_apply_sequence and the number of qubits they act on
+_SEQUENCE_OPERATIONS = {
+    "apply_X": 1,
+    "apply_Y": 1,
+    "apply_Z": 1,
+    "apply_H": 1,
+    "apply_K": 1,
+    "apply_T": 1,
+    "apply_rotation": 1,
+    "measure": 1,
+    "cnot_onto": 2,
+    "cphase_onto": 2,
+}
 
 
 def reraise_remote_error(self, remote_err):
@@ -112,6 +123,12 @@ class Backend(object):
             self._logger.error(f"Error reading the configuration file {virtualFile}: {e}")
             raise e
 
+        # Nodes adjacent to this one in the topology of the network, None if it is fully connected
+        self.neighbors = None
+        networks = NetworksConfigConstructor(file_path=virtualFile).networks
+        if network_name in networks and networks[network_name].topology is not None:
+            self.neighbors = networks[network_name].topology.get(name, [])
+
     def start(self, maxQubits=simulaqron_settings.max_qubits, maxRegisters=simulaqron_settings.max_registers):
         """
         Start listening to requests from other nodes.
@@ -122,7 +139,9 @@ class Backend(object):
 
         try:
             self._logger.debug(f"Starting on port {self.myID.port}")
-            node = virtualNode(self.myID, self.config, maxQubits=maxQubits, maxRegisters=maxRegisters)
+            node = virtualNode(
+                self.myID, self.config, maxQubits=maxQubits, maxRegisters=maxRegisters, neighbors=self.neighbors
+            )
             reactor.listenTCP(self.myID.port, pb.PBServerFactory(node))
 
             self._logger.debug("Running reactor")
@@ -143,8 +162,12 @@ class Backend(object):
 
 
 class virtualNode(pb.Root):
+    # Delay in seconds before the first new attempt to connect to a node which is not up yet. The delay is doubled
+    # after every failed attempt, up to the setting conn_retry_time.
+    minConnRetryTime = 0.02
+
     def __init__(self, ID, config, maxQubits=simulaqron_settings.max_qubits,
-                 maxRegisters=simulaqron_settings.max_registers):
+                 maxRegisters=simulaqron_settings.max_registers, neighbors=None):
         """
         Initialize storing also our own name, hostname and port.
 
@@ -152,6 +175,7 @@ class virtualNode(pb.Root):
         ID		host identifier of this node
         maxQubits	maximum number of qubits to use in the default engine (default 10)
         maxRegister	maximum number of registers
+        neighbors	names of the nodes to connect to at startup, by default all other nodes
         """
         self._logger = get_netqasm_logger(f"{self.__class__.__name__}({ID.name})")
 
@@ -160,12 +184,24 @@ class virtualNode(pb.Root):
         self.myID.root = self
         self.config = config
 
+        # Load the default engine up front, such that a misconfigured backend is noticed at startup
+        get_default_engine(simulaqron_settings.sim_backend)
+
         # Set max nr of registers and virtual qubits
         self.maxRegs = maxRegisters
         self.maxQubits = maxQubits
 
-        # List of connections
-        self.conn = {}
+        # List of connections, ordered from least to most recently used
+        self.conn = OrderedDict()
+
+        # Names of the nodes which are being connected to
+        self._connecting = set()
+
+        # Deferreds waiting for the connection to a node, fired as soon as it is up
+        self._connWaiters = {}
+
+        # Number of failed attempts to connect to each node since the last connection
+        self._connAttempts = {}
 
         # Number of registers _created_ at this node
         # this may not equal the numbers of registers virtually carried
@@ -177,19 +213,35 @@ class virtualNode(pb.Root):
         # Set up the dictionary of registers
         self.registers = {}
 
-        # Initialize the list of qubits at this node
-        self.virtQubits = []
-        self.simQubits = []
+        # Initialize the qubits at this node, indexed by their virtual and simulation numbers respectively
+        self.virtQubits = {}
+        self.simQubits = {}
+
+        # Simulated qubits in each local register, indexed by the register number
+        self.regQubits = {}
+
+        # Local registers which may hold spare qubits, indexed by the register number. Entries are only removed by
+        # _get_spare_register, once the register has no spare qubits left or is not simulated here anymore.
+        self._spareRegs = {}
+
+        # Numbers which have been released again, the smallest one is handed out first
+        self._freeVirtIDs = []
+        self._freeSimIDs = []
+        self._nextVirtID = 0
+        self._nextSimID = 0
 
         # Set up connections to the neighouring nodes in the network
-        self.connectNet()
+        self.connectNet(neighbors)
 
         # Global lock: needs to be acquire whenever we want to manipulate more than one
-        # qubit object
-        self._lock = DeferredLock()
+        # qubit object. Waiters are queued and get the lock as soon as it is released.
+        self._lock = countingLock()
+
+        # Lock used to grant the lock sets of other nodes one at a time if this node is the lock manager
+        self._lockSetLock = countingLock()
 
-        # Time until retry
-        self._delay = 1
+        # Registers moved to this node to be merged and the bytes of state moved for them
+        self.mergeStatistics = mergeStatistics()
 
         # Maximum number of attempts at getting locks
         self.maxAttempts = 300
@@ -200,49 +252,56 @@ class virtualNode(pb.Root):
         # List of halves of epr-pairs received to be polled by NetQASM
         self.qubit_recv_epr = {}
 
-    def connectNet(self):
+    def connectNet(self, neighbors=None):
         """
-        Initialize the connections to the other virtual nodes in the network according to the available
-        configuration.
+        Initialize the connections to the neighbouring virtual nodes in the network, by default all other nodes in
+        the configuration. At most max_connections connections are made up front, the connections to other nodes
+        are made when get_connection first needs them.
+
+        Arguments
+        neighbors	names of the nodes to connect to
         """
+        if neighbors is None:
+            neighbors = list(self.config.hostDict)
+        self._neighbors = [name for name in neighbors if name in self.config.hostDict and name != self.myID.name]
+        if simulaqron_settings.max_connections > 0:
+            self._neighbors = self._neighbors[:simulaqron_settings.max_connections]
 
         for key in self.config.hostDict:
             node = self.config.hostDict[key]
-            if node.name != self.myID.name:
-                self.connect_to_node(node)
-            else:
+            if node.name == self.myID.name:
                 self.conn[node.name] = node
+        for name in self._neighbors:
+            self.connect_to_node(self.config.hostDict[name])
 
     def remote_check_connections(self):
         """
-        Checks if all connections are up. (Just checks if the number of
-        connections equal the number of nodes in config-file)
+        Checks if the connections to the neighbouring nodes made at startup are up. Connections to other nodes are
+        only made when they are used.
         """
-        return len(self.conn) == len(self.config.hostDict)
+        return all(name in self.conn for name in self._neighbors)
 
-    @inlineCallbacks
     def get_connection(self, name):
         """
-        Returns the connection specified by 'name'. If no such connection is
-        up yet but name is in the configuration file, wait and try again.
+        Returns a Deferred firing with the connection specified by 'name'. If no such connection is
+        up yet but name is in the configuration file, it is made and the Deferred fires as soon as it is up.
         """
         if name in self.conn:
-            return self.conn[name]
-        else:
-            self._logger.debug(f"Connection to {name} not up yet, need to wait...")
-            conn_to_return = yield deferLater(
-                reactor,
-                simulaqron_settings.conn_retry_time,
-                self.get_connection,
-                name,
-            )
-            return conn_to_return
+            self.conn.move_to_end(name)
+            return succeed(self.conn[name])
+        self._logger.debug("Connection to %s not up yet, need to wait...", name)
+        if name not in self._connecting and name in self.config.hostDict:
+            self.connect_to_node(self.config.hostDict[name])
+        d = Deferred()
+        self._connWaiters.setdefault(name, []).append(d)
+        return d
 
     def connect_to_node(self, node):
         """
         Connects to other node. If node not up yet, waits for CONF_WAIT_TIME seconds.
         """
         self._logger.debug(f"Trying to connect to node {node.name}.")
+        self._connecting.add(node.name)
         node.factory = pb.PBClientFactory()
         reactor.connectTCP(node.hostname, node.port, node.factory)
         defer = node.factory.getRootObject()
@@ -259,62 +318,152 @@ class virtualNode(pb.Root):
 
         # Add this node to the local connections
         self.conn[node.name] = node
+        self._connecting.discard(node.name)
+        self._connAttempts.pop(node.name, None)
+
+        # Resume everyone waiting for the connection
+        for d in self._connWaiters.pop(node.name, []):
+            d.callback(node)
+
+        self._close_idle_connections(keep=node.name)
+
+    def _close_idle_connections(self, keep=None):
+        """
+        Closes the least recently used idle connections while more than max_connections connections to other nodes
+        are open. Connections which are in use and the connection to the node keep are kept, even if that exceeds
+        the limit.
+        """
+        limit = simulaqron_settings.max_connections
+        if limit <= 0:
+            return
+        excess = len(self.conn) - 1 - limit
+        for name in list(self.conn):
+            if excess <= 0:
+                return
+            if name not in (self.myID.name, keep) and self._connection_idle(name):
+                self._logger.debug("Closing idle connection to %s.", name)
+                node = self.conn.pop(name)
+                node.root.broker.transport.loseConnection()
+                node.root = 0
+                excess -= 1
+
+    def _connection_idle(self, name):
+        """
+        Whether the connection to the node name can be closed: no calls over it are waiting for answers, the node
+        holds no references to objects of this node and no virtual qubit here is simulated there.
+        """
+        node = self.conn[name]
+        broker = node.root.broker
+        if broker.waitingForAnswers or broker.localObjects:
+            return False
+        return not any(q.simNode is node for q in self.virtQubits.values())
 
     def handle_connection_error(self, reason, node):
         """
         Handles errors from trying to connect to other node.
-        If a ConnectionRefusedError is raised another try will be made after CONF_WAIT_TIME seconds.
-        CONF_WAIT_TIME is set in 'settings.py'.
-        Any other error is raised again.
+        If a ConnectionRefusedError is raised another try will be made after the delay given by
+        conn_retry_delay. Any other error is raised again.
         """
 
         try:
             reason.raiseException()
         except ConnectionRefusedError:
-            self._logger.debug(f"Could not connect to {node.name}, trying again...")
-            reactor.callLater(simulaqron_settings.conn_retry_time, self.connect_to_node, node)
+            delay = self.conn_retry_delay(node.name)
+            self._logger.debug("Could not connect to %s, trying again in %.3f seconds...", node.name, delay)
+            reactor.callLater(delay, self.connect_to_node, node)
         except Exception as e:
             self._logger.error(e)
             reactor.stop()
 
-    def get_virtual_id(self):
+    def conn_retry_delay(self, name):
         """
-        This is a crude and horrible cludge to generate unique IDs for virtual qubits.
+        Returns the delay before the next attempt to connect to the node name and counts the attempt. The delay
+        grows exponentially from minConnRetryTime up to the setting conn_retry_time. A random part spreads the
+        attempts of nodes which started at the same time.
         """
+        attempts = self._connAttempts.get(name, 0)
+        self._connAttempts[name] = attempts + 1
+        delay = min(simulaqron_settings.conn_retry_time, self.minConnRetryTime * 2 ** attempts)
+        return random.uniform(delay / 2, delay)
 
-        # Loop through the firt k numbers where k is the number of virtual qubits + 1
-        # Note that this is guaranteed to find a an index which is not yet used
-        for j in range(len(self.virtQubits) + 1):
-            used = 0
-            for q in self.virtQubits:
-                if q.num == j:
-                    used = 1
-            if used == 0:
-                return j
+    def get_virtual_id(self):
+        """
+        Returns an unused number for a virtual qubit. Numbers of removed virtual qubits are reused, smallest first.
+        """
+        if self._freeVirtIDs:
+            return heapq.heappop(self._freeVirtIDs)
+        self._nextVirtID += 1
+        return self._nextVirtID - 1
 
     def get_sim_id(self):
         """
-        Similarly, this is a crude and horrible cludge to generate unique IDs for simulated qubits.
+        Returns an unused number for a simulated qubit. Numbers of removed simulated qubits are reused, smallest first.
+        """
+        if self._freeSimIDs:
+            return heapq.heappop(self._freeSimIDs)
+        self._nextSimID += 1
+        return self._nextSimID - 1
+
+    def _add_virt_qubit(self, qubit):
+        """
+        Adds the virtual qubit to this node, its number should have been obtained from get_virtual_id.
+        """
+        self.virtQubits[qubit.num] = qubit
+
+    def _remove_virt_qubit(self, qubit):
+        """
+        Removes the virtual qubit from this node and releases its number.
+        """
+        del self.virtQubits[qubit.num]
+        heapq.heappush(self._freeVirtIDs, qubit.num)
+
+    def _add_sim_qubit(self, qubit):
+        """
+        Adds the simulated qubit to this node, its simulation number should have been obtained from get_sim_id.
+        """
+        self.simQubits[qubit.simNum] = qubit
+        self.regQubits.setdefault(qubit.register.num, set()).add(qubit)
+
+    def _discard_sim_qubit(self, qubit):
+        """
+        Removes the simulated qubit from the indexes of this node, marks it as inactive and releases its simulation
+        number. This does not touch the register.
+        """
+        qubit.active = False
+        del self.simQubits[qubit.simNum]
+        self._discard_reg_member(qubit)
+        heapq.heappush(self._freeSimIDs, qubit.simNum)
+
+    def _discard_reg_member(self, qubit):
+        """
+        Removes the simulated qubit from the index of the members of its register.
         """
+        members = self.regQubits.get(qubit.register.num)
+        if members is not None:
+            members.discard(qubit)
+            if not members:
+                del self.regQubits[qubit.register.num]
 
-        # Loop through the firt k numbers where k is the number of virtual qubits + 1
-        # Note that this is guaranteed to find a an index which is not yet used
-        for j in range(len(self.simQubits) + 1):
-            used = 0
-            for q in self.simQubits:
-                if q.simNum == j:
-                    used = 1
-            if used == 0:
-                return j
+    def _move_sim_qubit(self, qubit, register, num):
+        """
+        Updates the register and number of the simulated qubit after it has been moved to another local register.
+        """
+        self._discard_reg_member(qubit)
+        qubit.register = register
+        qubit.num = num
+        self.regQubits.setdefault(register.num, set()).add(qubit)
+
+    def _reg_members(self, register):
+        """
+        Returns the simulated qubits in the local register, ordered by their simulation numbers.
+        """
+        return sorted(self.regQubits.get(register.num, ()), key=lambda q: q.simNum)
 
     def _q_num_to_obj(self, num):
         """
         Given the simulation number of a qubit simulated here, return the corresponding object.
         """
-        for q in self.simQubits:
-            if q.simNum == num:
-                return q
-        return None
+        return self.simQubits.get(num)
 
     def remote_isLocked(self):
         return self._lock.locked
@@ -322,15 +471,86 @@ class virtualNode(pb.Root):
     @inlineCallbacks
     def _get_global_lock(self):
         self._logger.debug("GETTING LOCK")
-        while self._lock.locked:
-            yield deferLater(reactor, self._delay, lambda: None)
         yield self._lock.acquire()
         self._logger.debug("GOT LOCK")
 
+    def remote_get_lock_statistics(self):
+        """
+        Returns how often the global lock of this node and the locks of the registers and simulated qubits were
+        acquired, how often an acquirer had to wait and the total and maximal wait times in seconds.
+        """
+        return {
+            "global": self._lock.statistics.to_dict(),
+            "registers": registerLockStatistics.to_dict(),
+            "qubits": qubitLockStatistics.to_dict(),
+        }
+
+    def remote_get_merge_statistics(self):
+        """
+        Returns how many registers were moved to this node to be merged with a local register, their total number of
+        qubits and the total and maximal number of bytes of state moved for them, as well as the number of bytes sent
+        for them after compression, the resulting compression ratio and the time spent encoding and decoding.
+        """
+        return self.mergeStatistics.to_dict()
+
+    @inlineCallbacks
+    def remote_acquire_lock_set(self, names):
+        """
+        Acquires the global locks of the nodes with the given names on behalf of the caller, which releases them
+        again with release_global_lock. This is used if this node is the lock_manager: lock sets are granted one
+        at a time in the order they were requested, so requests never interleave while waiting for their locks.
+
+        Arguments
+        names		names of the nodes to lock
+        """
+        yield self._lockSetLock.acquire()
+        locked = []
+        try:
+            for name in sorted(names):
+                if name not in self.config.hostDict:
+                    raise virtNetError(
+                        f"Trying to get conncetion to virtual node {name}, but this is not in configuration file"
+                    )
+                node = yield self.get_connection(name)
+                yield call_method(node.root, "get_global_lock")
+                locked.append(node)
+        except Exception:
+            # Nodes locked before the failure are released again, otherwise later lock sets would wait for them
+            for node in locked:
+                yield call_method(node.root, "release_global_lock")
+            raise
+        finally:
+            self._lockSetLock.release()
+
     @inlineCallbacks
     def remote_get_global_lock(self):
         yield self._get_global_lock()
 
+    def _try_locked_call(self, qubit, func, *args):
+        """
+        Calls func(*args) directly while holding the global lock of this node and the locks of all qubits in the
+        register of the local sim qubit qubit, if these are all free and operations on the register run inline (see
+        quantumEngine.runs_inline). This is the same locking as done by the operations restructuring a register, but
+        does not create any Deferreds.
+
+        Returns
+        -------
+        tuple: Whether func was called and what it returned
+        """
+        if not qubit.active or not qubit.register.runs_inline() or not self._lock.try_acquire():
+            return (False, None)
+        locked = []
+        try:
+            for q in self._reg_members(qubit.register):
+                if not q.try_lock():
+                    return (False, None)
+                locked.append(q)
+            return (True, func(*args))
+        finally:
+            for q in locked:
+                q.unlock()
+            self._release_global_lock()
+
     def _release_global_lock(self):
         self._logger.debug("RELEASE LOCK")
         if self._lock.locked:
@@ -344,9 +564,8 @@ class virtualNode(pb.Root):
         """
         Acquire the lock on all qubits in the same register as the local sim qubit qubit.
         """
-        for q in self.simQubits:
-            if q.register == qubit.register:
-                yield q.lock()
+        for q in self._reg_members(qubit.register):
+            yield q.lock()
 
     @inlineCallbacks
     def remote_lock_reg_qubits(self, qubitNum):
@@ -360,9 +579,8 @@ class virtualNode(pb.Root):
         """
         Release the lock on all qubits in the same register as qubit.
         """
-        for q in self.simQubits:
-            if q.register == qubit.register:
-                yield q.unlock()
+        for q in self._reg_members(qubit.register):
+            yield q.unlock()
 
     @inlineCallbacks
     def remote_unlock_reg_qubits(self, qubitNum):
@@ -371,15 +589,16 @@ class virtualNode(pb.Root):
         """
         yield self._unlock_reg_qubits(self._q_num_to_obj(qubitNum))
 
-    def remote_add_register(self, maxQubits=10):
+    def remote_add_register(self, maxQubits=10, backend=None):
         """
         Adds a new register to the node..
 
         Arguments:
         maxQubits	maximum number of qubits to use in the default engine
+        backend		name of the engine to simulate the register with (defaults to sim_backend)
         """
         # TODO We have two methods that do the same thing, should deprecate one of them
-        return self.remote_new_register(maxQubits=maxQubits)
+        return self.remote_new_register(maxQubits=maxQubits, backend=backend)
 
     def get_new_reg_num(self):
         """
@@ -389,14 +608,19 @@ class virtualNode(pb.Root):
         self._next_reg_num += 1
         return reg_num
 
-    def remote_new_register(self, maxQubits=10):
+    def remote_new_register(self, maxQubits=10, backend=None):
         """
-        Initialize a local register. Right now, this simple creates a register according to the simple engine backend
-        using qubit.
+        Initialize a local register, simulated by the engine registered under the name backend.
+        Engines are only imported when the first register using them is created.
 
         Arguments:
         maxQubits	maximum number of qubits to use in the default engine (default 10)
+        backend		name of the engine to simulate the register with (defaults to sim_backend)
         """
+        if backend is None:
+            engine = get_default_engine(simulaqron_settings.sim_backend)
+        else:
+            engine = get_engine(backend)
 
         # Make sure that reg numbers are assigned correctly
         if self.numRegs >= self.maxRegs:
@@ -405,14 +629,7 @@ class virtualNode(pb.Root):
 
         self.numRegs = self.numRegs + 1
         regNum = self.get_new_reg_num()
-        if simulaqron_settings.sim_backend == SimBackend.QUTIP.value:
-            newReg = qutipEngine(self.myID, regNum, maxQubits)
-        elif simulaqron_settings.sim_backend == SimBackend.PROJECTQ.value:
-            newReg = projectQEngine(self.myID, regNum, maxQubits)
-        elif simulaqron_settings.sim_backend == SimBackend.STABILIZER.value:
-            newReg = stabilizerEngine(self.myID, regNum, maxQubits)
-        else:
-            raise quantumError(f"Unknown backend {simulaqron_settings.sim_backend}")
+        newReg = engine(self.myID, regNum, maxQubits)
 
         self.registers[regNum] = newReg
 
@@ -430,47 +647,61 @@ class virtualNode(pb.Root):
 
         # Remove register
         self.registers.pop(regnum)
+        self.regQubits.pop(regnum, None)
         self.numRegs -= 1
 
-    @inlineCallbacks
     def remote_new_qubit(self, ignore_max_qubits=False):
         """
         Create a new qubit in the default local register.
 
+        The node lock is not needed here: identifiers are handed out synchronously and the qubit lives in a
+        fresh register, or in a spare slot which is only reused while no register is being restructured.
+
         :param ignore_max_qubits: bool
             Used to ignore the check if max virtual qubits is reached. This is used when creating EPR pairs
             to be able to temporarily create a qubit.
         """
         self._logger.debug("Request to create new qubit.")
 
-        # Get a lock to assure IDs are assigned correctly and maxQubits is consitently checked
-        yield self._get_global_lock()
+        if (len(self.virtQubits) >= self.maxQubits) and (not ignore_max_qubits):
+            self._logger.error("Maximum number of virtual qubits reached.")
+            raise noQubitError("Max virtual qubits reached")
 
-        try:
-            if (len(self.virtQubits) >= self.maxQubits) and (not ignore_max_qubits):
-                self._logger.error("Maximum number of virtual qubits reached.")
-                raise noQubitError("Max virtual qubits reached")
-            else:
-                # Qubit in the simulation backend, initialized to |0>
-                simNum = self.get_sim_id()
+        # Reuse the slot of a measured out qubit if there is one, otherwise create a new register
+        newReg = None
+        if not self._lock.locked:
+            newReg = self._get_spare_register()
+        if newReg is None:
+            newReg = self.remote_add_register()
 
-                # Create a new register
-                newReg = self.remote_add_register()
+        # Qubit in the simulation backend, initialized to |0>
+        simNum = self.get_sim_id()
+        simQubit = simulatedQubit(self.myID, newReg, simNum)
+        simQubit.make_fresh()
 
-                simQubit = simulatedQubit(self.myID, newReg, simNum)
-                simQubit.make_fresh()
+        self._add_sim_qubit(simQubit)
 
-                self.simQubits.append(simQubit)
-
-                # Virtual qubit
-                newNum = self.get_virtual_id()
-                newQubit = virtualQubit(self.myID, self.myID, simQubit, newNum)
-                self.virtQubits.append(newQubit)
-        finally:
-            self._release_global_lock()
+        # Virtual qubit
+        newNum = self.get_virtual_id()
+        newQubit = virtualQubit(self.myID, self.myID, simQubit, newNum)
+        self._add_virt_qubit(newQubit)
+        simQubit.location = (self.myID.name, newNum)
 
         return newQubit
 
+    def _get_spare_register(self):
+        """
+        Returns a local register of the default backend which holds a spare qubit and on which no operation is
+        running, or None if there is none.
+        """
+        engine = get_default_engine(simulaqron_settings.sim_backend)
+        for (regNum, reg) in list(self._spareRegs.items()):
+            if not reg.spareQubits or self.registers.get(regNum) is not reg:
+                del self._spareRegs[regNum]
+            elif type(reg) is engine and not reg.lock.locked and reg.runs_inline():
+                return reg
+        return None
+
     @inlineCallbacks
     def remote_new_qubit_inreg(self, reg):
         """
@@ -481,7 +712,7 @@ class virtualNode(pb.Root):
         if reg.simNode != self.myID:
             raise quantumError("Can only create qubits registers simulated locally by this node.")
 
-        # Get a lock to assure IDs are assigned correctly and maxQubits is consitently checked
+        # The register may be in the middle of being merged or split
         yield self._get_global_lock()
 
         try:
@@ -493,12 +724,13 @@ class virtualNode(pb.Root):
                 simNum = self.get_sim_id()
                 simQubit = simulatedQubit(self.myID, reg, simNum)
                 simQubit.make_fresh()
-                self.simQubits.append(simQubit)
+                self._add_sim_qubit(simQubit)
 
                 # Virtual qubit
                 newNum = self.get_virtual_id()
                 newQubit = virtualQubit(self.myID, self.myID, simQubit, newNum)
-                self.virtQubits.append(newQubit)
+                self._add_virt_qubit(newQubit)
+                simQubit.location = (self.myID.name, newNum)
         finally:
             self._release_global_lock()
 
@@ -690,8 +922,9 @@ class virtualNode(pb.Root):
             )
         remoteNode = yield self.get_connection(targetName)
 
-        # Get lock to prevent access to qubits between sending and manipulating local list
-        yield self._get_global_lock()
+        # Get lock to prevent access to qubits between sending and manipulating local list. The simulating node is
+        # locked as well, in the same order of names as for two qubit gates so that these never wait for each other
+        locked_nodes = yield qubit._lock_sending_nodes(remoteNode)
 
         try:
             # Check whether we are just the virtual, or also the simulating node
@@ -703,34 +936,30 @@ class virtualNode(pb.Root):
                     newNum = yield call_method(remoteNode.root, "add_qubit", self.myID.name, qubit.simQubit)
                 except RemoteError as remote_err:
                     self.reraise_remote_error(remote_err)
+                qubit.simQubit.location = (targetName, newNum)
             else:
                 self._logger.debug(f"Sending qubit simulated remotely at {qubit.simNode.name}")
-                # Also lock the virtual node of the simulating node unless it is the remoteNode or this node
-                locked_node = yield self._lock_simulating_node(exclude=[self.virtNode, remoteNode])
+                # We are only the virtual node, not the simulating one. In this case, we need to ask
+                # the actual simulating node to do the transfer for us. Due to the pecularities of Twisted PB
+                # we need to do this by the simulated qubit number
                 try:
-                    # We are only the virtual node, not the simulating one. In this case, we need to ask
-                    # the actual simulating node to do the transfer for us. Due to the pecularities of Twisted PB
-                    # we need to do this by the simulated qubit number
-                    try:
-                        simQubitNum = yield call_method(qubit.simQubit, "get_sim_number")
-                    except RemoteError as remote_err:
-                        self.reraise_remote_error(remote_err)
-                    try:
-                        newNum = yield call_method(qubit.simNode.root, "transfer_qubit", simQubitNum, targetName)
-                    except RemoteError as remote_err:
-                        self.reraise_remote_error(remote_err)
-                finally:
-                    if locked_node is not None:
-                        yield call_method(locked_node.root, "release_global_lock")
+                    simQubitNum = yield call_method(qubit.simQubit, "get_sim_number")
+                except RemoteError as remote_err:
+                    self.reraise_remote_error(remote_err)
+                try:
+                    newNum = yield call_method(qubit.simNode.root, "transfer_qubit", simQubitNum, targetName)
+                except RemoteError as remote_err:
+                    self.reraise_remote_error(remote_err)
 
             # We gave it away so mark as inactive
             qubit.active = 0
 
             # Remove the qubit from the local virtual list. Note it remains in the simulated
             # list, since we continue to simulate this qubit if we did so before.
-            self.virtQubits.remove(qubit)
+            self._remove_virt_qubit(qubit)
         finally:
-            self._release_global_lock()
+            for node in locked_nodes:
+                yield call_method(node.root, "release_global_lock")
 
         return newNum
 
@@ -765,6 +994,7 @@ class virtualNode(pb.Root):
                 newNum = yield call_method(remoteNode.root, "add_qubit", self.myID.name, simQubit)
             except RemoteError as remote_err:
                 self.reraise_remote_error(remote_err)
+        simQubit.location = (targetName, newNum)
 
         return newNum
 
@@ -787,21 +1017,15 @@ class virtualNode(pb.Root):
             )
         nb = yield self.get_connection(name)
 
-        # Get a lock to make sure IDs are assigned correctly
-        yield self._get_global_lock()
-
-        try:
-            if len(self.virtQubits) >= self.maxQubits:
-                raise noQubitError("Max virtual qubits reached")
+        if len(self.virtQubits) >= self.maxQubits:
+            raise noQubitError("Max virtual qubits reached")
 
-            # Generate a new virtual qubit object for the qubit now at this node
-            newNum = self.get_virtual_id()
-            newQubit = virtualQubit(self.myID, nb, simQubit, newNum)
+        # Generate a new virtual qubit object for the qubit now at this node
+        newNum = self.get_virtual_id()
+        newQubit = virtualQubit(self.myID, nb, simQubit, newNum)
 
-            # Add to local list
-            self.virtQubits.append(newQubit)
-        finally:
-            self._release_global_lock()
+        # Add to local list
+        self._add_virt_qubit(newQubit)
 
         return newNum
 
@@ -813,11 +1037,237 @@ class virtualNode(pb.Root):
         num		number of the virtual qubit
         """
 
-        for q in self.virtQubits:
-            if q.num == num:
-                return q
+        return self.virtQubits.get(num)
 
-        return None
+    @inlineCallbacks
+    def remote_apply_sequence(self, ops):
+        """
+        Applies a sequence of operations to virtual qubits at this node in one call and returns the outcomes of the
+        measurements in it, in their order in the sequence.
+
+        If all qubits are simulated at this node, the global lock and the locks of the qubits in their registers are
+        acquired once and all operations are applied directly to the engines, merging the registers of the qubits of
+        a two qubit gate right before it if they are not the same. Consecutive measurements of qubits in the same
+        register are done by one call to measure_qubits of its engine. Otherwise the operations are applied one after
+        the other as separate calls to the virtual qubits would.
+
+        Arguments
+        ops		list of tuples (gate, nums, params), where gate is the name of a method of virtualQubit such as
+                apply_H, cnot_onto or measure, nums the number of the virtual qubit or for two qubit gates a pair of
+                the numbers of the control and target, and params a list of further arguments, such as [n, a] for
+                apply_rotation or [inplace] for measure
+        """
+        ops = self._check_sequence(ops)
+
+        yield self._get_global_lock()
+        try:
+            qubits = self._sequence_qubits(ops)
+        except quantumError:
+            self._release_global_lock()
+            raise
+
+        if any(q.simNode != q.virtNode for q in qubits.values()):
+            # Remote registers can only be locked and merged by the virtual qubits
+            self._release_global_lock()
+            outcomes = []
+            for (gate, nums, params) in ops:
+                args = [qubits[num] for num in nums[1:]] + params
+                outcome = yield call_method(qubits[nums[0]], gate, *args)
+                if gate == "measure":
+                    outcomes.append(outcome)
+            return outcomes
+
+        locked = []
+        try:
+            yield self._lock_registers([q.simQubit for q in qubits.values()], locked)
+
+            # Operations on large registers return Deferreds, see quantumEngine.run
+            outcomes = []
+            for (measuring, group) in groupby(ops, key=lambda op: op[0] == "measure"):
+                if measuring:
+                    # Consecutive measurements are done jointly for the qubits in the same register
+                    measured = yield self._measure_locked_qubits(
+                        [(qubits[nums[0]], bool(params and params[0])) for (_, nums, params) in group]
+                    )
+                    outcomes.extend(measured)
+                    continue
+                for (gate, nums, params) in group:
+                    yield self._apply_locked_op(qubits, gate, nums, params)
+            return outcomes
+        finally:
+            for q in locked:
+                q.unlock()
+            self._release_global_lock()
+
+    @inlineCallbacks
+    def _apply_locked_op(self, qubits, gate, nums, params):
+        """
+        Applies a gate of a sequence, other than a measurement, to local virtual qubits whose registers are locked.
+
+        Arguments
+        qubits		the virtual qubits of the sequence by their numbers
+        gate		name of the gate
+        nums		numbers of the qubits acted on
+        params		further arguments of the gate
+        """
+        simQubit = qubits[nums[0]].simQubit
+        if len(nums) == 2:
+            # Measurements before may have split the qubits into registers of their own, which are still
+            # locked since the qubits keep their locks when moved
+            target = qubits[nums[1]].simQubit
+            yield self.local_merge_regs(simQubit, target)
+            yield call_method(simQubit, gate, target.num)
+        else:
+            yield call_method(simQubit, gate, *params)
+
+    @inlineCallbacks
+    def _measure_locked_qubits(self, measurements):
+        """
+        Measures local virtual qubits in the standard basis, while this node and the qubits in their registers are
+        locked. The qubits in the same register are measured by a single call to measure_qubits of its engine.
+        Destructively measured qubits are removed afterwards.
+
+        Arguments
+        measurements	list of tuples (qubit, inplace) of a virtual qubit and whether to keep it after measuring
+
+        Returns
+        -------
+        list: The outcomes, in the order of measurements
+        """
+        batches = {}
+        for (qubit, _) in measurements:
+            # A qubit measured in place more than once is only measured once, the state has collapsed already
+            batch = batches.setdefault(qubit.simQubit.register.num, [])
+            if qubit.simQubit not in batch:
+                batch.append(qubit.simQubit)
+
+        results = {}
+        for batch in batches.values():
+            register = batch[0].register
+
+            def measure(batch=batch):
+                for simQubit in batch:
+                    simQubit._apply_random_pauli_noise()
+                return register.measure_qubits([simQubit.num for simQubit in batch], True)
+
+            outcomes = yield register.run(measure)
+            results.update(zip(batch, outcomes))
+        outcomes = [results[qubit.simQubit] for (qubit, _) in measurements]
+
+        for (qubit, inplace) in measurements:
+            if not inplace:
+                yield self._remove_locked_sim_qubit(qubit.simQubit)
+                self._remove_virt_qubit(qubit)
+        return outcomes
+
+    @inlineCallbacks
+    def remote_measure_qubits(self, nums, inplace=False):
+        """
+        Measures the virtual qubits with the numbers nums at this node in the standard basis and returns the outcomes
+        in the order of nums. If the qubits are simulated at this node, the locks are acquired once and the qubits
+        in the same register are measured jointly by its engine, instead of measuring the qubits one by one.
+
+        Arguments
+        nums		numbers of the virtual qubits to measure
+        inplace		if False the measured qubits are removed
+        """
+        outcomes = yield self.remote_apply_sequence([("measure", num, [inplace]) for num in nums])
+        return outcomes
+
+    @inlineCallbacks
+    def remote_probabilities(self, nums):
+        """
+        Returns the probabilities of the outcomes of measuring the virtual qubits with the numbers nums at this node
+        in the standard basis, without changing their state. The outcome of the first qubit is the most significant
+        bit of the index. The qubits must be simulated at this node. The locks are acquired once and the
+        probabilities of the qubits in the same register are computed by one call to its engine.
+
+        Arguments
+        nums		numbers of the virtual qubits
+        """
+        if len(set(nums)) != len(nums):
+            raise quantumError("The qubits to compute probabilities for should be different.")
+
+        yield self._get_global_lock()
+        locked = []
+        try:
+            qubits = [self._get_local_virt_qubit(num) for num in nums]
+            if any(q.simNode != q.virtNode for q in qubits):
+                raise quantumError("Probabilities can only be computed for qubits simulated at this node.")
+            yield self._lock_registers([q.simQubit for q in qubits], locked)
+
+            batches = {}
+            for q in qubits:
+                batches.setdefault(q.simQubit.register.num, []).append(q.simQubit)
+
+            # Combine the probabilities of the registers and order the qubits as in nums
+            probs = np.ones(())
+            order = []
+            for batch in batches.values():
+                register = batch[0].register
+                p = yield register.run(register.probabilities, [simQubit.num for simQubit in batch])
+                probs = np.multiply.outer(probs, np.reshape(p, [2] * len(batch)))
+                order.extend(batch)
+            probs = np.transpose(probs, [order.index(q.simQubit) for q in qubits])
+            return probs.reshape(-1).tolist()
+        finally:
+            for q in locked:
+                q.unlock()
+            self._release_global_lock()
+
+    @inlineCallbacks
+    def _lock_registers(self, simQubits, locked):
+        """
+        Locks all simulated qubits in the registers of the local sim qubits simQubits. The locked qubits are appended
+        to locked, so that the caller can unlock them even if this fails.
+        """
+        registers = {}
+        for simQubit in simQubits:
+            registers.setdefault(simQubit.register.num, simQubit.register)
+        for register in registers.values():
+            for q in self._reg_members(register):
+                yield q.lock()
+                locked.append(q)
+
+    def _check_sequence(self, ops):
+        """
+        Checks the operations given to apply_sequence and returns them as tuples (gate, nums, params), where nums
+        is a tuple of the numbers of the virtual qubits acted on.
+        """
+        checked = []
+        measured = set()
+        for (gate, nums, params) in ops:
+            if gate not in _SEQUENCE_OPERATIONS:
+                raise quantumError(f"Unknown operation {gate} in sequence.")
+            nums = tuple(nums) if _SEQUENCE_OPERATIONS[gate] == 2 else (nums,)
+            if len(set(nums)) != _SEQUENCE_OPERATIONS[gate]:
+                raise quantumError(f"Operation {gate} needs {_SEQUENCE_OPERATIONS[gate]} different qubits.")
+            for num in nums:
+                if num in measured:
+                    raise quantumError(f"Virtual qubit {num} is used after it was measured.")
+            if gate == "measure" and not (params and params[0]):
+                measured.add(nums[0])
+            checked.append((gate, nums, list(params)))
+        return checked
+
+    def _sequence_qubits(self, ops):
+        """
+        Returns the virtual qubits acted on by the checked operations of a sequence by their numbers.
+        """
+        qubits = {}
+        for (_, nums, _) in ops:
+            for num in nums:
+                qubits[num] = self._get_local_virt_qubit(num)
+        return qubits
+
+    def _get_local_virt_qubit(self, num):
+        """
+        Returns the active virtual qubit with number num at this node.
+        """
+        qubit = self.virtQubits.get(num)
+        if qubit is None or qubit.active != 1:
+            raise quantumError(f"No virtual qubit with number {num} at this node.")
+        return qubit
 
     @inlineCallbacks
     def remote_remove_sim_qubit_num(self, delNum):
@@ -840,51 +1290,107 @@ class virtualNode(pb.Root):
         delQubit	simulated qubit object to delete
         """
         # Caution: Only qubits simulated at this node can be removed
-        if delQubit not in self.simQubits:
+        if self.simQubits.get(delQubit.simNum) is not delQubit:
             self._logger.error("Attempt to delete qubit not simulated at this node.")
             raise quantumError("Cannot delete qubits we don't simulate.")
 
-        #
-        delNum = delQubit.num
         delRegister = delQubit.register
 
         # Should already be locked
         assert self._lock.locked, "Virtual node is not locked"
 
+        # Other qubits in the same register, these may be moved to registers of their own below
+        regQubits = [q for q in self._reg_members(delRegister) if q is not delQubit]
+
         try:
             # Lock all relevant qubits first
-            for q in self.simQubits:
-                if q.register == delRegister:
-                    if q.num != delNum:  # Don't lock the delQubit since it should already be locked
-                        yield q.lock()
-                    else:
-                        assert q.isLocked(), "Qubit should be locked but isn't"
-
-            # First we remove the physical qubit from the register
-            delRegister.remove_qubit(delNum)
+            assert delQubit.isLocked(), "Qubit should be locked but isn't"
+            for q in regQubits:
+                yield q.lock()
 
-            # Check if this was the last qubit
-            if delRegister.activeQubits == 0:
-                self.remote_delete_register(delRegister)
-            else:
-                # When removing a qubit, we need to update the positions of the qubits in
-                # the underlying physical register
-                # in all relevant qubit objects.
-                for q in self.simQubits:
-                    # If they are in the same engine, and update is required
-                    if q.register == delRegister:
-                        if q.num > delNum:
-                            q.num = q.num - 1
-
-            # Remove the qubit form the list of simulated qubits
-            self._logger.debug(f"removing qubit {delQubit.simNum} from {self.simQubits}")
-            self.simQubits.remove(delQubit)
+            yield self._remove_locked_sim_qubit(delQubit)
 
         finally:
             # Release all relevant qubits again
-            for q in self.simQubits:
-                if q.register == delRegister:
-                    q.unlock()
+            for q in regQubits:
+                q.unlock()
+
+    @inlineCallbacks
+    def _remove_locked_sim_qubit(self, delQubit):
+        """
+        Removes the simulated qubit object, which is simulated at this node, from the node and the engine. The node
+        and all qubits in the register of delQubit should be locked. The engine is called through its run method, so
+        the returned Deferred has only fired right away if the register runs inline.
+
+        Arguments
+        delQubit	simulated qubit object to delete
+        """
+        delNum = delQubit.num
+        delRegister = delQubit.register
+
+        # If other qubits are still in use, the physical qubit is reset to |0> and its slot kept for the next
+        # allocation. Otherwise the whole register is deleted. The numbers of the other qubits do not change.
+        if delRegister.activeQubits - len(delRegister.spareQubits) > 1:
+            yield delRegister.run(delRegister.reset_qubit, delNum)
+            self._spareRegs[delRegister.num] = delRegister
+            if delRegister.should_split():
+                yield self._split_register(delRegister)
+
+            # A register does not keep more spare qubits than qubits in use, so that it does not stay at the
+            # width it once had when most of its qubits have been measured out
+            inUse = delRegister.activeQubits - len(delRegister.spareQubits)
+            if len(delRegister.spareQubits) > inUse:
+                yield delRegister.run(delRegister.drop_spare_qubits, inUse)
+        else:
+            self.remote_delete_register(delRegister)
+
+        # Remove the qubit form the list of simulated qubits
+        self._logger.debug("removing qubit %d", delQubit.simNum)
+        self._discard_sim_qubit(delQubit)
+
+    def _measure_and_remove(self, qubit):
+        """
+        Measures the local sim qubit qubit and removes it, returning the outcome. The node and all qubits in the
+        register of qubit should be locked, and the register should run inline (see quantumEngine.runs_inline).
+        """
+        outcome = qubit.remote_measure_inplace()
+        failures = []
+        self._remove_locked_sim_qubit(qubit).addErrback(failures.append)
+        if failures:
+            failures[0].raiseException()
+        return outcome
+
+    @inlineCallbacks
+    def _split_register(self, reg):
+        """
+        Moves the qubits of the local register reg which are in a product state with the rest of the register into
+        registers of their own, so that the cost of simulating reg does not depend on them anymore.
+        The simulated qubits in reg should be locked. The engine is called through its run method.
+
+        Arguments
+        reg		register to split
+        """
+        separable = yield reg.run(reg.separable_qubits)
+        separable = [num for num in separable if num not in reg.spareQubits]
+
+        # If all qubits are separable, one of them stays in the register
+        if len(separable) >= reg.activeQubits - len(reg.spareQubits):
+            separable = separable[1:]
+        if not separable:
+            return
+
+        regQubits = {q.num: q for q in self._reg_members(reg)}
+        for num in separable:
+            if self.numRegs >= self.maxRegs:
+                self._logger.debug("Maximum number of registers reached, not splitting register.")
+                break
+            self.numRegs = self.numRegs + 1
+            newReg = type(reg)(self.myID, self.get_new_reg_num())
+            self.registers[newReg.num] = newReg
+
+            self._logger.debug(f"Moving qubit {num} of register {reg.num} to register {newReg.num}.")
+            newNum = yield reg.run(reg.split_qubit, num, newReg)
+            self._move_sim_qubit(regQubits[num], newReg, newNum)
 
     def remote_merge_regs(self, num1, num2):
         """
@@ -897,18 +1403,14 @@ class virtualNode(pb.Root):
         """
 
         # Lookup the qubit objects corresponding to these numbers
-        for q in self.simQubits:
-            if q.simNum == num1:
-                q1 = q
-            elif q.simNum == num2:
-                q2 = q
-
-        self.local_merge_regs(q1, q2)
+        return self.local_merge_regs(self._q_num_to_obj(num1), self._q_num_to_obj(num2))
 
+    @inlineCallbacks
     def local_merge_regs(self, qubit1, qubit2):
         """
         Merges the two local quantum registers. Note that these register may simulate virtual qubits across different
         network nodes. This will ignore maxQubits and simply create one large register allowing twice maxQubits qubits.
+        Large registers are merged in a separate thread, see quantumEngine.run.
 
         Arguments
         qubit1		qubit1 in reg1, called from remote having access to only qubits
@@ -933,23 +1435,24 @@ class virtualNode(pb.Root):
             self._logger.debug("not required")
             return
 
+        if type(reg1) is not type(reg2):
+            raise quantumError("Cannot merge registers simulated by different backends.")
+
         self._logger.debug("need merge")
 
         # Allow reg 1 to absorb reg 2
         reg1.maxQubits = reg1.maxQubits + reg2.activeQubits
 
-        # For relabelling qubit numbers get the offset
-        offset = reg1.activeQubits
-
-        # Add reg2 to reg1
-        reg1.absorb(reg2)
+        # Add reg2 to reg1, this gives the new numbers of the qubits of reg2, including its spare qubits
+        mapping = yield reg1.run(reg1.absorb, reg2)
+        reg1.spareQubits.extend(mapping[num] for num in reg2.spareQubits)
+        if reg1.spareQubits:
+            self._spareRegs[reg1.num] = reg1
 
         # Update the simulated qubit numbering and register
-        for i, q in enumerate(self.simQubits):
-            if q.register == reg2:
-                self._logger.debug(f"Updating register {q.num} to {q.num + offset}.")
-                q.register = reg1
-                q.num = q.num + offset
+        for q in self._reg_members(reg2):
+            self._logger.debug(f"Updating register {q.num} to {mapping[q.num]}.")
+            self._move_sim_qubit(q, reg1, mapping[q.num])
 
         self.remote_delete_register(reg2)
 
@@ -978,103 +1481,124 @@ class virtualNode(pb.Root):
             )
         simNode = yield self.get_connection(simNodeName)
 
+        # Registers of nodes with the same IP address are handed over through shared memory. The payload checks
+        # that both nodes are on the same host and otherwise streams the state.
+        sameHost = self.config.hostDict[simNodeName].ip == self.myID.ip and registerPayload.can_share()
+
         # Fetch the details of the remote register and qubit, and remove sim qubits at node
         try:
-            (R, I, activeQ, oldRegNum, oldQubitNum) = yield call_method(simNode.root, "get_register_del", simQubitNum)
+            (payload, oldRegNum, oldQubitNum, locations, nbytes) = yield call_method(
+                simNode.root, "get_register_del", simQubitNum, sameHost
+            )
         except RemoteError as remote_err:
             self.reraise_remote_error(remote_err)
 
-        # Get numbering offset from previous register: append at end
-        offset = localReg.activeQubits
+        try:
+            # Large registers are streamed after the reply, meanwhile other messages are handled
+            try:
+                yield payload.receive()
+            except RemoteError as remote_err:
+                self.reraise_remote_error(remote_err)
+            oldNums = payload.qubits
+            activeQ = len(oldNums)
+            self.mergeStatistics.record(activeQ, nbytes, payload.wireBytes, payload.encodeTime, payload.decodeTime)
 
-        # Allow localReg to absorb the remote register
-        localReg.maxQubits = localReg.maxQubits + activeQ
-        localReg.absorb_parts(R, I, activeQ)
+            # Allow localReg to absorb the remote register
+            localReg.maxQubits = localReg.maxQubits + activeQ
+            newNums = yield localReg.run(localReg.absorb_payload, payload)
+        finally:
+            payload.release()
 
         # Collect mappings between numbers and objects for updating the virtual qubits
         newD = {}
 
+        # New simulated qubits of the virtual qubits held by each node
+        moved = {}
+
         # Make new qubit objects
         for k in range(activeQ):
             simNum = self.get_sim_id()
-            newQubit = simulatedQubit(self.myID, localReg, simNum, offset + k)
+            newQubit = simulatedQubit(self.myID, localReg, simNum, newNums[k])
             # Lock the qubit directly until merge is finished
             yield newQubit.lock()
-            self.simQubits.append(newQubit)
-            newD[k] = newQubit
-
-        # Issue an update call to all nodes to update their virtual qubits if necessary
-        # for name in self.conn:
-        for name in self.config.hostDict:
-            if name != self.myID.name:
-                nb = yield self.get_connection(name)
-                try:
-                    yield call_method(nb.root, "update_virtual_merge", self.myID.name, simNodeName, oldRegNum, newD)
-                except RemoteError as remote_err:
-                    self.reraise_remote_error(remote_err)
-
-        # Locally, we might also already have virtual qubits which were in the remote simulated
-        # register. Update them as well
-        self._logger.debug("Updating local virtual qubits.")
-        yield self.remote_update_virtual_merge(self.myID.name, simNodeName, oldRegNum, newD)
+            self._add_sim_qubit(newQubit)
+            newD[oldNums[k]] = newQubit
+
+            newQubit.location = locations[k]
+            if locations[k] is not None:
+                (name, virtNum) = locations[k]
+                moved.setdefault(name, {})[virtNum] = newQubit
+
+        # Only the nodes holding virtual qubits of the register need to update them, which they do in parallel
+        self._logger.debug(f"Updating virtual qubits at nodes {list(moved)}.")
+        results = yield DeferredList(
+            [self._update_virtual_merge_at(name, qubits) for name, qubits in moved.items()], consumeErrors=True
+        )
+        for success, result in results:
+            if not success:
+                result.raiseException()
 
         # Return the qubit object corresponding to the new physical qubit
         return newD[oldQubitNum]
 
     @inlineCallbacks
-    def remote_update_virtual_merge(self, newSimNodeName, oldSimNodeName, oldRegNum, newD):
+    def remote_merge_from_num(self, simNodeName, simQubitNum, localQubitNum):
         """
-        Update the virtual qubits to the new simulating node, if applicable. This is extremely
-        inefficient due to not keeping register information in virtualQubit.
+        Bring a remote register to this node, merging it with the register of a locally simulated qubit. This allows
+        other nodes to ask for a merge into a register at this node.
 
         Arguments
-        newSimNodeName	new node simulating this qubit
-        oldSimNodeName	old node simulating the qubit
-        oldReg		old register
-        newD		dictionary mapping qubit numbers to qubit objects at the new simulating node
+        simNodeName	name of the node who simulates right now
+        simQubitNum	simulation number of qubit whose register we will merge
+        localQubitNum	simulation number of the local qubit whose register to merge with
+        """
+        newQubit = yield self.remote_merge_from(simNodeName, simQubitNum, self._q_num_to_obj(localQubitNum).register)
+        return newQubit
+
+    @inlineCallbacks
+    def _update_virtual_merge_at(self, name, qubits):
+        """
+        Ask the node name to update its virtual qubits after a merge.
+
+        Arguments
+        name		name of the node holding the virtual qubits
+        qubits		dictionary mapping numbers of virtual qubits at that node to their new simulated qubits
+        """
+        node = yield self.get_connection(name)
+        yield call_method(node.root, "update_virtual_merge", self.myID.name, qubits)
+
+    @inlineCallbacks
+    def remote_update_virtual_merge(self, newSimNodeName, qubits):
+        """
+        Update virtual qubits whose simulated qubits were merged into a register at another node. The new
+        simulating node looks up the holders of the qubits in its location directory, so only nodes which
+        actually hold affected virtual qubits are asked to update.
+
+        Arguments
+        newSimNodeName	new node simulating these qubits
+        qubits		dictionary mapping numbers of virtual qubits at this node to their new simulated qubits
         """
 
         self._logger.debug("Request to update local virtual qubits.")
 
-        # If this is a third node (not involved in the two qubit gate, but carrying virtual qubits
-        # which were in the simulated register), then they will now be updated. We remark that this function
-        # can only be called from the _simulating node_ now handing over simulation to someone else. Both the simulating
-        # node and the new simulating node are globally locked so there should be no conflicts here in updating:
-        # a third node that may wish to do a 2 qubit gate between the qubits to be updated needs to wait.
+        # Both the old and the new simulating node are globally locked so there should be no conflicts here in
+        # updating: a third node that may wish to do a 2 qubit gate between the qubits to be updated needs to wait.
 
-        # Lookup the local connections for the given node names
+        # Lookup the local connection for the given node name
         if not (newSimNodeName in self.config.hostDict):
             raise virtNetError(
                 f"Trying to get conncetion to virtual node {newSimNodeName}, but this is not in configuration file"
             )
-        if not (oldSimNodeName in self.config.hostDict):
-            raise virtNetError(
-                f"Trying to get conncetion to virtual node {oldSimNodeName}, but this is not in configuration file"
-            )
         newSimNode = yield self.get_connection(newSimNodeName)
-        oldSimNode = yield self.get_connection(oldSimNodeName)
-
-        for q in self.virtQubits:
-            if q.virtNode == q.simNode and q.simNode == oldSimNode:
-                self._logger.debug("Simulating node update.")
-                # We previously simulated this qubit ourselves
-                givenReg = q.simQubit.register.num
-                givenNum = q.simQubit.num
-            elif q.simNode == oldSimNode:
-                self._logger.debug("Previously remote simulator node update.")
-                # We had the virtual qubit but it was simulated elsewhere
-                try:
-                    (givenNum, givenReg) = yield call_method(q.simQubit, "get_numbers")
-                except RemoteError as remote_err:
-                    self.reraise_remote_error(remote_err)
 
-            # Check if this qubit needs updating
-            if q.simNode == oldSimNode and givenReg == oldRegNum:
-                self._logger.debug(
-                    f"Updating virtual qubit {q.num}, previously {oldSimNode.name} now {newSimNode.name}"
-                )
-                q.simNode = newSimNode
-                q.simQubit = newD[givenNum]
+        for num, simQubit in qubits.items():
+            q = self.virtQubits.get(num)
+            if q is None:
+                self._logger.debug(f"Virtual qubit {num} is not at this node anymore, not updating.")
+                continue
+            self._logger.debug(f"Updating virtual qubit {num}, now simulated by {newSimNode.name}")
+            q.simNode = newSimNode
+            q.simQubit = simQubit
 
     @inlineCallbacks
     def remote_get_register_RI(self, qubit):
@@ -1093,6 +1617,7 @@ class virtualNode(pb.Root):
         Return the value of of a locally simulated register which contains this virtual qubit.
         """
 
+        qubit.simQubit.register.drop_spare_qubits()
         (realM, imagM) = qubit.simQubit.register.get_register_RI()
         activeQ = qubit.simQubit.register.activeQubits
         oldRegNum = qubit.simQubit.register.num
@@ -1100,9 +1625,13 @@ class virtualNode(pb.Root):
 
         return (realM, imagM, activeQ, oldRegNum, oldQubitNum)
 
-    def remote_get_register_del(self, qubitNum):
+    def remote_get_register_del(self, qubitNum, sharedMemory=False):
         """
-        Return the value of of a locally simulated register, and remove the simulated qubits from this node.
+        Return the state of a locally simulated register as a registerPayload, which also lists the numbers the
+        qubits had in the register, and remove the simulated qubits from this node. Also returns the locations of the
+        virtual qubits backed by the qubits in the order of the payload, as well as the number of bytes of the state.
+        If sharedMemory is set, the payload is sent through shared memory, which requires the caller to run on the
+        same host.
 
         Caution: virtual qubits not updated.
         """
@@ -1110,32 +1639,36 @@ class virtualNode(pb.Root):
         assert self._lock.locked, "Virtual node is not locked"
 
         # Locate the qubit object for this ID
-        gotQ = None
-        for q in self.simQubits:
-            if q.simNum == qubitNum:
-                gotQ = q
+        gotQ = self._q_num_to_obj(qubitNum)
 
         # If nothing is found, return
         if gotQ is None:
             self._logger.debug(f"No simulated qubit with ID {qubitNum}.")
-            return ([], [], 0, 0, 0)
+            return (registerPayload(), 0, 0, [], 0)
 
-        (realM, imagM) = gotQ.register.get_register_RI()
-        activeQ = gotQ.register.activeQubits
+        # Spare qubits are not sent along
+        gotQ.register.drop_spare_qubits()
+        payload = gotQ.register.get_register_payload()
+        payload.sharedMemory = sharedMemory
+        nbytes = gotQ.register.state_nbytes()
         oldRegNum = gotQ.register.num
         oldQubitNum = gotQ.num
         delRegister = gotQ.register
+        members = self._reg_members(delRegister)
+        locations = {q.num: q.location for q in members}
+        locations = [locations.get(num) for num in payload.qubits]
 
         # Remove all simulated qubits and the register
-        # Need to iterate of simQubits in reverse, otherwise wrong elements are removed
         self._logger.debug(f"removing all sim qubits in reg {oldRegNum}")
-        for q in reversed(self.simQubits):
-            if q.register.num == oldRegNum:
-                self.simQubits.remove(q)
+        # Their locks are released, so that operations waiting for them notice that the qubits moved
+        for q in members:
+            self._discard_sim_qubit(q)
+            if q.isLocked():
+                q.unlock()
 
         self.remote_delete_register(delRegister)
 
-        return (realM, imagM, activeQ, oldRegNum, oldQubitNum)
+        return (payload, oldRegNum, oldQubitNum, locations, nbytes)
 
     @inlineCallbacks
     def remote_get_multiple_qubits(self, qList):
@@ -1195,14 +1728,14 @@ class virtualNode(pb.Root):
         foundOne = False
         prev = None
         for n in simNumList:
-            for q in self.simQubits:
-                if q.simNum == n:
-                    if foundOne is True and prev.register != q.register:
-                        self._logger.error("Getting multiple qubits from different registers not supported.")
-                        return ([], [])
-                    prev = q
-                    foundOne = True
-                    traceList.append(q.num)
+            q = self._q_num_to_obj(n)
+            if q is not None:
+                if foundOne is True and prev.register != q.register:
+                    self._logger.error("Getting multiple qubits from different registers not supported.")
+                    return ([], [])
+                prev = q
+                foundOne = True
+                traceList.append(q.num)
         if not foundOne:
             self._logger.error("No such qubits found.")
             return
@@ -1262,76 +1795,108 @@ class virtualQubit(pb.Referenceable):
         # with the number of the qubits in the register
         self.num = num
 
-    @inlineCallbacks
     def _single_gate(self, name, *args):
         """
         Apply the single gate function to the underlying qubit. This is an internal method used by all the other
         single qubit calls, which will perform the correct local or remote method calls as applicable after
         performing the necessary locking.
 
+        If the qubit is simulated at this node and its locks are free, the gate is applied directly and None is
+        returned. Otherwise a Deferred is returned, which fires once the gate has been applied.
+
         Arguments
         name		name of the method corresponding to the name. For example: name = apply_X
         param		parameters for gates such as rotations (axis,angle)
         """
-        self._logger.debug(f"applying gate {name} to virtual qubit {self.num}")
+        self._logger.debug("applying gate %s to virtual qubit %d", name, self.num)
         if self.active != 1:
             self._logger.error("Attempt to manipulate qubits no longer at this node.")
             return False
 
-        locked_node = yield self._lock_simulating_node()
-        yield call_method(self.simQubit, "lock")
+        if self.simNode == self.virtNode:
+            simQubit = self.simQubit
+            if simQubit.register.runs_inline() and simQubit.try_lock_with_register():
+                try:
+                    getattr(simQubit, f"remote_{name}")(*args)
+                finally:
+                    simQubit.remote_unlock_with_register()
+                return
+
+        return self._single_gate_locked(name, *args)
+
+    @inlineCallbacks
+    def _single_gate_locked(self, name, *args):
+        """
+        Applies the single gate function to the underlying qubit once the locks of the qubit and its register have
+        been acquired.
+        """
+        simQubit = yield self._lock_sim_qubit()
         try:
-            active = yield call_method(self.simQubit, "isActive")
-            if active:
-                yield call_method(self.simQubit, name, *args)
+            yield call_method(simQubit, name, *args)
         finally:
-            yield call_method(self.simQubit, "unlock")
-            assert locked_node == self.simNode, "Something went wrong"
-            yield call_method(self.simNode.root, "release_global_lock")
+            yield call_method(simQubit, "unlock_with_register")
 
     @inlineCallbacks
+    def _lock_sim_qubit(self):
+        """
+        Acquires the lock of the register simulating this qubit and of the simulated qubit itself, without locking
+        the simulating node. If the qubit was moved to another node while waiting, we wait until the node lock held
+        for the move is released and try again with the new simulated qubit.
+
+        Returns
+        -------
+        The locked simulated qubit
+        """
+        while True:
+            simQubit = self.simQubit
+            active = yield call_method(simQubit, "lock_with_register")
+            if active and simQubit is self.simQubit:
+                return simQubit
+            if active:
+                yield call_method(simQubit, "unlock_with_register")
+
+            # The qubit was moved or removed, wait until the node lock held meanwhile has been released
+            locked_node = yield self._lock_simulating_node()
+            yield call_method(locked_node.root, "release_global_lock")
+            if simQubit is self.simQubit:
+                raise quantumError("The simulated qubit does not exist anymore.")
+
     def remote_apply_X(self):
         """
         Apply X gate to itself by passing it onto the underlying register.
         """
-        yield self._single_gate("apply_X")
+        return self._single_gate("apply_X")
 
-    @inlineCallbacks
     def remote_apply_Y(self):
         """
         Apply Y gate.
         """
-        yield self._single_gate("apply_Y")
+        return self._single_gate("apply_Y")
 
-    @inlineCallbacks
     def remote_apply_Z(self):
         """
         Apply Z gate.
         """
-        yield self._single_gate("apply_Z")
+        return self._single_gate("apply_Z")
 
-    @inlineCallbacks
     def remote_apply_H(self):
         """
         Apply H gate.
         """
-        yield self._single_gate("apply_H")
+        return self._single_gate("apply_H")
 
-    @inlineCallbacks
     def remote_apply_K(self):
         """
         Apply K gate - taking computational basis to Y eigenbasis.
         """
-        yield self._single_gate("apply_K")
+        return self._single_gate("apply_K")
 
-    @inlineCallbacks
     def remote_apply_T(self):
         """
         Apply T gate.
         """
-        yield self._single_gate("apply_T")
+        return self._single_gate("apply_T")
 
-    @inlineCallbacks
     def remote_apply_rotation(self, n, a):
         """
         Apply rotation around axis n with angle a.
@@ -1339,21 +1904,52 @@ class virtualQubit(pb.Referenceable):
         n	A tuple of three numbers specifying the rotation axis, e.g n=(1,0,0)
         a	The rotation angle in radians.
         """
-        yield self._single_gate("apply_rotation", n, a)
+        return self._single_gate("apply_rotation", n, a)
 
-    @inlineCallbacks
     def remote_measure(self, inplace=False):
         """
         Measure the qubit in the standard basis. If inplace=False, this does delete the qubit from the simulation.
 
-        Returns the measurement outcome.
+        Returns the measurement outcome. If the qubit is simulated at this node and the locks needed are free, the
+        qubit is measured directly, otherwise the outcome is returned as a Deferred.
         """
 
         if self.active != 1:
             self._logger.error("Attempt to manipulate qubits no longer at this node.")
             return
 
-        self._logger.debug("measuring virtual qubit {self.num}")
+        self._logger.debug("measuring virtual qubit %d", self.num)
+        if self.simNode == self.virtNode:
+            simQubit = self.simQubit
+            if inplace:
+                if simQubit.register.runs_inline() and simQubit.try_lock_with_register():
+                    try:
+                        return simQubit.remote_measure_inplace()
+                    finally:
+                        simQubit.remote_unlock_with_register()
+            else:
+                node = self.simNode.root
+                (measured, outcome) = node._try_locked_call(simQubit, node._measure_and_remove, simQubit)
+                if measured:
+                    self.virtNode.root._remove_virt_qubit(self)
+                    return outcome
+
+        return self._measure_locked(inplace)
+
+    @inlineCallbacks
+    def _measure_locked(self, inplace):
+        """
+        Measures the qubit as remote_measure does, waiting for the locks needed.
+        """
+        if inplace:
+            # The register is not restructured, so the simulating node does not need to be locked
+            simQubit = yield self._lock_sim_qubit()
+            try:
+                outcome = yield call_method(simQubit, "measure_inplace")
+            finally:
+                yield call_method(simQubit, "unlock_with_register")
+            return outcome
+
         locked_node = yield self._lock_simulating_node()
         yield call_method(self.simQubit, "lock")
 
@@ -1366,7 +1962,7 @@ class virtualQubit(pb.Referenceable):
                     yield call_method(self.simNode.root, "remove_sim_qubit_num", num)
 
                     # Delete from virtual qubits
-                    self.virtNode.root.virtQubits.remove(self)
+                    self.virtNode.root._remove_virt_qubit(self)
         finally:
             yield call_method(self.simQubit, "unlock")
             assert locked_node == self.simNode, "Something went wrong"
@@ -1381,11 +1977,13 @@ class virtualQubit(pb.Referenceable):
         This can in fact be everyting from a single node if both qubits are simulated locally or three nodes
         if both qubits are simulated remotely.
 
-        Since deadlocks can occur a random timeout is used when acquiring the locks and the acquisition of the locks
-        will be tried again until success.
+        To avoid deadlocks the locks are always acquired one after the other in the order of the node names, so two
+        gates can never wait for locks held by each other. If a lock_manager node is configured, the locks are
+        instead acquired through that node, which grants one set of locks at a time.
 
         Furthermore, when waiting for locks of a simulating node, this might change in the meantime, so we check
-        that indeed the simulating nodes are the same after acquiring the locks. If not, we try again until success.
+        that indeed the simulating nodes are the same after acquiring the locks. If not, the locks are released
+        and acquired again for the new simulating nodes.
 
         Parameters
         ----------
@@ -1396,44 +1994,95 @@ class virtualQubit(pb.Referenceable):
         -------
         list: The nodes that have been locked so that they can be unlocked again by the caller
         """
-        local_node = self.virtNode
-        control_sim_node = self.simNode
-        target_sim_node = target.simNode
-
-        ds = {}
-        # Get deferreds for locking all the relevant nodes once (which might overlap)
-        for node in set([local_node, control_sim_node, target_sim_node]):
-            ds[node] = call_method(node.root, "get_global_lock")
-        self._logger.debug(f"For merging gonna lock the nodes {list(ds.keys())}")
-        # Deferred for all of the locks
-        d_lock = DeferredList(list(ds.values()), fireOnOneCallback=False, consumeErrors=True)
-        # Since deadlock might occur also schedule a random timeout
-        d_timeout = deferLater(reactor, random.uniform(1, 4), lambda: None)
-        # Yield on either the locks or the timeout
-        yield DeferredList([d_lock, d_timeout], fireOnOneCallback=True, fireOnOneErrback=True, consumeErrors=True)
-        if d_timeout.called:
-            # Timeout so cancel any locks and revert any that were acquired
-            d_lock.cancel()
-            self._logger.debug("Trying to get lock timedout, will try again")
-            for node, d in ds.items():
-                if d.called:
-                    yield call_method(node.root, "release_global_lock")
-            # Try again
-            locked_nodes = yield self._lock_nodes(target=target)
-            return locked_nodes
-        else:
-            assert d_lock.called, "Neither timeout or locked was called"
+        while True:
+            control_sim_node = self.simNode
+            target_sim_node = target.simNode
+            nodes = sorted(set([self.virtNode, control_sim_node, target_sim_node]), key=lambda node: node.name)
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("For merging gonna lock the nodes %s", [node.name for node in nodes])
+            yield self._acquire_lock_set(nodes)
+
             # Check that the simulating nodes have not changed in the meantime
-            if control_sim_node != self.simNode or target_sim_node != target.simNode:
-                self._logger.debug("at least on simulating node changed, releasing and trying again")
-                for node, d in ds.items():
-                    assert d.called, "Something went wrong, locked deferred not called"
+            if control_sim_node == self.simNode and target_sim_node == target.simNode:
+                return nodes
+            self._logger.debug("at least on simulating node changed, releasing and trying again")
+            for node in nodes:
+                yield call_method(node.root, "release_global_lock")
+
+    @inlineCallbacks
+    def _lock_sending_nodes(self, targetNode):
+        """
+        Acquires the global locks needed to send this qubit to the node targetNode, which are those of the node
+        holding it and, unless it is targetNode, of the node simulating it. As for _lock_nodes, the locks are acquired
+        in the order of the node names and acquired again if the simulating node changed while waiting.
+
+        Returns
+        -------
+        list: The nodes that have been locked so that they can be unlocked again by the caller
+        """
+        while True:
+            sim_node = self.simNode
+            nodes = {self.virtNode.name: self.virtNode}
+            if sim_node.name != targetNode.name:
+                nodes.setdefault(sim_node.name, sim_node)
+            nodes = [nodes[name] for name in sorted(nodes)]
+            yield self._acquire_lock_set(nodes)
+
+            if sim_node == self.simNode:
+                return nodes
+            self._logger.debug("simulating node changed, releasing and trying again")
+            for node in nodes:
+                yield call_method(node.root, "release_global_lock")
+
+    @inlineCallbacks
+    def _acquire_lock_set(self, nodes):
+        """
+        Acquires the global locks of the nodes, which should be sorted by name.
+        """
+        manager = simulaqron_settings.lock_manager
+        if manager:
+            managerNode = yield self.virtNode.root.get_connection(manager)
+            try:
+                yield call_method(managerNode.root, "acquire_lock_set", [node.name for node in nodes])
+            except RemoteError as remote_err:
+                self.virtNode.root.reraise_remote_error(remote_err)
+        else:
+            locked = []
+            try:
+                for node in nodes:
+                    yield call_method(node.root, "get_global_lock")
+                    locked.append(node)
+            except Exception:
+                for node in locked:
                     yield call_method(node.root, "release_global_lock")
-                # Try again
-                locked_nodes = yield self._lock_nodes(target=target)
-                return locked_nodes
-            else:
-                return list(ds.keys())
+                raise
+
+    @inlineCallbacks
+    def _plan_merge(self, target):
+        """
+        Decides which of the registers of this qubit and the target, which are simulated at different nodes, is moved
+        to the node simulating the other one. The register whose state takes fewer bytes is moved, so the larger
+        one stays where it is and the gate is executed there. If both are equally large, a register simulated at
+        this node stays here and otherwise the register of the control stays.
+
+        Parameters
+        ----------
+        target : :class:`~.virtualQubit`
+            virtual qubit of the target qubit
+
+        Returns
+        -------
+        tuple: The virtual qubit whose register is moved and the one whose register it is merged with
+        """
+        controlBytes = yield call_method(self.simQubit, "get_register_nbytes")
+        targetBytes = yield call_method(target.simQubit, "get_register_nbytes")
+        self._logger.debug("Registers take %d bytes for control and %d bytes for target", controlBytes, targetBytes)
+
+        controlKey = (controlBytes, self.simNode == self.virtNode)
+        targetKey = (targetBytes, target.simNode == target.virtNode)
+        if targetKey > controlKey:
+            return (self, target)
+        return (target, self)
 
     @inlineCallbacks
     def _lock_inreg(self, qubit):
@@ -1465,7 +2114,6 @@ class virtualQubit(pb.Referenceable):
         except RemoteError as remote_err:
             self.virtNode.root.reraise_remote_error(remote_err)
 
-    @inlineCallbacks
     def remote_cnot_onto(self, target):
         """
         Performs a CNOT operation with this qubit as control, and the other qubit as target.
@@ -1474,9 +2122,8 @@ class virtualQubit(pb.Referenceable):
         target		the virtual qubit to use as the target of the CNOT
         """
 
-        yield self._two_qubit_gate(target, "cnot_onto")
+        return self._two_qubit_gate(target, "cnot_onto")
 
-    @inlineCallbacks
     def remote_cphase_onto(self, target):
         """
         Performs a CPHASE operation with this qubit as control, and the other qubit as target.
@@ -1485,13 +2132,16 @@ class virtualQubit(pb.Referenceable):
         target		the virtual qubit to use as the target of the CPHASE
         """
 
-        yield self._two_qubit_gate(target, "cphase_onto")
+        return self._two_qubit_gate(target, "cphase_onto")
 
-    @inlineCallbacks
     def _two_qubit_gate(self, target, name):
         """
         Perform a two qubit gate including all the required locking.
 
+        If both qubits are simulated at this node in the same register and the locks needed are free, the gate is
+        applied directly and None is returned. Otherwise a Deferred is returned, which fires once the gate has been
+        applied.
+
         Arguments
         target		second virtual qubit (beyond self which is the first)
         name		name of the gate to perform
@@ -1502,8 +2152,24 @@ class virtualQubit(pb.Referenceable):
             return
 
         localName = "".join(["remote_", name])
-        self._logger.debug(f"Doing 2 qubit gate name {name} and local call {localName}")
+        self._logger.debug("Doing 2 qubit gate name %s and local call %s", name, localName)
+
+        if self.simNode == self.virtNode and target.simNode == self.virtNode:
+            simQubit = self.simQubit
+            if simQubit.register is target.simQubit.register:
+                node = self.simNode.root
+                (applied, _) = node._try_locked_call(simQubit, getattr(simQubit, localName), target.simQubit.num)
+                if applied:
+                    return
 
+        return self._two_qubit_gate_locked(target, name)
+
+    @inlineCallbacks
+    def _two_qubit_gate_locked(self, target, name):
+        """
+        Performs a two qubit gate as _two_qubit_gate does, waiting for the locks needed and merging the registers of
+        the qubits if they are not the same.
+        """
         # First lock the relevant nodes
         locked_nodes = yield self._lock_nodes(target=target)
 
@@ -1528,7 +2194,7 @@ class virtualQubit(pb.Referenceable):
 
                     if self.simQubit.register == target.simQubit.register:
                         # They are even in the same register, just do the gate
-                        getattr(self.simQubit, localName)(target.simQubit.num)
+                        yield call_method(self.simQubit, name, target.simQubit.num)
                     else:
                         yield self._lock_inreg(target)
                         self._logger.debug("2qubit command demands register merge.")
@@ -1536,7 +2202,7 @@ class virtualQubit(pb.Referenceable):
                         yield self.simNode.root.local_merge_regs(self.simQubit, target.simQubit)
 
                         # After the merge, just do the gate
-                        getattr(self.simQubit, localName)(target.simQubit.num)
+                        yield call_method(self.simQubit, name, target.simQubit.num)
                 else:
                     # Both are remotely simulated
                     self._logger.debug("2qubit command demands remote register merge.")
@@ -1564,87 +2230,29 @@ class virtualQubit(pb.Referenceable):
 
                     # Execute the 2 qubit gate
                     yield call_method(self.simQubit, name, targetNum)
-                    self._logger.debug(f"Remote 2qubit command to {target.simNode.name}.")
+                    self._logger.debug("Remote 2qubit command to %s.", target.simNode.name)
             else:
-                # They are simulated at two different nodes
-                if self.simNode == self.virtNode:
-                    self._logger.debug("control is simulated locally")
-
-                    # We are the locally simulating node of the first qubit, merge all to us
-                    self._logger.debug(
-                        "2qubit command demands merge from remote target sim %s to us.",
-                        target.simNode.name,
-                    )
-                    (fNum, fNode) = yield call_method(target.simQubit, "get_details")
-                    if fNode != target.simNode.name:
-                        self._logger.error("Inconsistent simulation. Cannot merge.")
-                        raise quantumError("Inconsistent simulation.")
-                    target.simQubit = yield self.simNode.root.remote_merge_from(
-                        target.simNode.name, fNum, self.simQubit.register
-                    )
-
-                    # Get the number of the target in the new register
-                    targetNum = target.simQubit.num
-
-                    # Execute the 2 qubit gate
-                    getattr(self.simQubit, localName)(targetNum)
-
-                elif target.simNode == target.virtNode:
-                    # We are the locally simulating node of the target qubit, merge all to us
-                    self._logger.debug(
-                        "2qubit command demands merge from remote sim %s to us.",
-                        self.simNode.name,
-                    )
-                    (fNum, fNode) = yield call_method(self.simQubit, "get_details")
-                    if fNode != self.simNode.name:
-                        self._logger.error("Inconsistent simulation. Cannot merge.")
-                        raise quantumError("Inconsistent simulation.")
-                    self.simQubit = yield target.simNode.root.remote_merge_from(
-                        self.simNode.name, fNum, target.simQubit.register
-                    )
+                # They are simulated at two different nodes, lock the target register as well
+                yield self._lock_inreg(target)
 
-                    # Get the number of the target in the new register
-                    targetNum = target.simQubit.num
-
-                    # Execute the 2 qubit gate
-                    getattr(self.simQubit, localName)(targetNum)
-
-                else:
-                    self._logger.debug("both are remote")
-                    # Both qubits are remotely simulated - we will pull both registers to become one local register
-                    self._logger.debug(
-                        "2qubit command demands total remote merge from %s and %s.",
-                        target.simNode.name,
-                        self.simNode.name,
-                    )
-
-                    # Create a new local register
-                    newLocalReg = self.virtNode.root.remote_add_register()
-
-                    # Fetch the detail of the two registers from remote
-                    (fNum, fNode) = yield call_method(self.simQubit, "get_details")
-                    if fNode != self.simNode.name:
-                        self._logger.error("Inconsistent simulation. Cannot merge.")
-                        raise quantumError("Inconsistent simulation.")
-                    (tNum, tNode) = yield call_method(target.simQubit, "get_details")
-                    if tNode != target.simNode.name:
-                        self._logger.error("Inconsistent simulation. Cannot merge.")
-                        raise quantumError("Inconsistent simulation.")
-
-                    # Pull the remote registers to this node
-                    self.simQubit = yield self.virtNode.root.remote_merge_from(
-                        self.simNode.name,
-                        fNum,
-                        newLocalReg,
-                    )
-                    target.simQubit = yield target.virtNode.root.remote_merge_from(
-                        target.simNode.name, tNum, newLocalReg
-                    )
-                    # Get the number of the target in the new register
-                    targetNum = target.simQubit.num
-
-                    # Finally, execute the two qubit gate
-                    getattr(self.simQubit, localName)(targetNum)
+                # Move the smaller state to the node simulating the larger one
+                (source, dest) = yield self._plan_merge(target)
+                self._logger.debug(
+                    "2qubit command demands merge from %s to %s.", source.simNode.name, dest.simNode.name
+                )
+                (sNum, sNode) = yield call_method(source.simQubit, "get_details")
+                (dNum, dNode) = yield call_method(dest.simQubit, "get_details")
+                if sNode != source.simNode.name or dNode != dest.simNode.name:
+                    self._logger.error("Inconsistent simulation. Cannot merge.")
+                    raise quantumError("Inconsistent simulation.")
+                source.simQubit = yield call_method(dest.simNode.root, "merge_from_num", sNode, sNum, dNum)
+                source.simNode = dest.simNode
+
+                # Get the number of the target in the new register
+                targetNum = yield call_method(target.simQubit, "get_number")
+
+                # Execute the 2 qubit gate where the register is simulated
+                yield call_method(self.simQubit, name, targetNum)
         except RemoteError as remote_err:
             self.virtNode.root.reraise_remote_error(remote_err)
         finally:
@@ -1717,10 +2325,11 @@ class virtualQubit(pb.Referenceable):
 
     @inlineCallbacks
     def remote_get_register_RI(self):
-        if self.simNode == self.virtNode:
-            realM, imagM = self.simQubit.register.get_register_RI()
-        else:
-            realM, imagM = yield call_method(self.simQubit, "get_register_RI")
+        """
+        Return the real and imaginary part of the simulated register which contains this virtual qubit, without its
+        spare qubits.
+        """
+        realM, imagM = yield call_method(self.simQubit, "get_register_RI")
         return realM, imagM
 
     @inlineCallbacks
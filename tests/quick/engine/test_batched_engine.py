@@ -0,0 +1,132 @@
+import unittest
+import numpy as np
+
+from simulaqron.virtual_node.batched_simulator import batchedEngine
+from simulaqron.virtual_node.basics import noQubitError, quantumError
+
+
+class TestBatchedEngine_init(unittest.TestCase):
+    def test_init(self):
+        eng = batchedEngine("Alice", 0, shots=5)
+        self.assertEqual(eng.maxQubits, 10)
+        self.assertEqual(eng.activeQubits, 0)
+        self.assertEqual(eng.shots, 5)
+
+        eng = batchedEngine("Alice", 0, 5)
+        self.assertEqual(eng.maxQubits, 5)
+        self.assertEqual(eng.shots, 1)
+
+
+class TestBatchedEngine(unittest.TestCase):
+    def setUp(self):
+        self.eng = batchedEngine("Alice", 0, shots=200)
+
+    def test_add_fresh_qubit(self):
+        num = self.eng.add_fresh_qubit()
+        self.assertEqual(num, 0)
+        self.assertEqual(self.eng.activeQubits, 1)
+        self.assertEqual(self.eng.qubitReg.shape, (200, 2))
+
+    def test_add_to_many_fresh_qubits(self):
+        for _ in range(10):
+            self.eng.add_fresh_qubit()
+        with self.assertRaises(noQubitError):
+            self.eng.add_fresh_qubit()
+
+    def test_gates(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_qubit([0, 1])
+        self.eng.apply_H(q1)
+        self.eng.apply_CNOT(q1, q2)
+        self.eng.apply_T(q1)
+        f = 1 / np.sqrt(2)
+        ref = [0, f, f * np.exp(1j * np.pi / 4), 0]
+        R, I = self.eng.get_register_RI()
+        self.assertTrue(np.allclose(np.array(R) + 1j * np.array(I), [ref] * 200))
+
+    def test_measure_per_shot(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_CNOT(q1, q2)
+        outcomes = self.eng.measure_qubit(q1)
+        self.assertEqual(len(outcomes), 200)
+        # Both outcomes occur with overwhelming probability
+        self.assertEqual(set(outcomes), {0, 1})
+        self.assertEqual(self.eng.measure_qubit_inplace(q2), outcomes)
+        self.assertEqual(self.eng.measure_qubit(q2), outcomes)
+        self.assertEqual(self.eng.activeQubits, 0)
+        with self.assertRaises(quantumError):
+            self.eng.measure_qubit(q1)
+
+    def test_measure_qubits(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        q3 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_CNOT(q1, q2)
+        self.eng.apply_X(q3)
+        outcomes = self.eng.measure_qubits([q3, q2], inplace=True)
+        self.assertEqual(len(outcomes), 200)
+        self.assertTrue(all(o[0] == 1 for o in outcomes))
+        outcomes2 = self.eng.measure_qubits([q1, q2])
+        self.assertEqual([o[0] for o in outcomes2], [o[1] for o in outcomes])
+        self.assertEqual([o[1] for o in outcomes2], [o[1] for o in outcomes])
+        self.assertEqual(self.eng.get_qubit_numbers(), [q3])
+
+    def test_probabilities_and_expectation(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_CNOT(q1, q2)
+        self.assertTrue(np.allclose(self.eng.probabilities([q2, q1]), [[0.5, 0, 0, 0.5]] * 200))
+        self.assertTrue(np.allclose(self.eng.expectation("YY"), -1))
+        self.assertTrue(np.allclose(self.eng.expectation("Z", [q2]), 0))
+        self.eng.measure_qubit_inplace(q1)
+        self.assertTrue(np.allclose(self.eng.expectation("ZZ"), 1))
+        self.assertTrue(np.allclose(self.eng.expectation("XX"), 0))
+
+    def test_absorb(self):
+        other = batchedEngine("Bob", 1, shots=200)
+        q1 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.measure_qubit_inplace(q1)
+        o1 = other.add_fresh_qubit()
+        other.apply_X(o1)
+        before = self.eng.qubitReg.copy()
+        mapping = self.eng.absorb(other)
+        self.assertEqual(mapping, {o1: 1})
+        self.assertEqual(self.eng.measure_qubit(mapping[o1]), [1] * 200)
+        self.assertTrue(np.allclose(self.eng.qubitReg, before))
+
+    def test_reset_qubit(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_CNOT(q1, q2)
+        outcomes = self.eng.reset_qubit(q1)
+        self.assertIn(0, outcomes)
+        self.assertIn(1, outcomes)
+        self.assertEqual(self.eng.spareQubits, [q1])
+        self.assertEqual(self.eng.measure_qubit_inplace(q1), [0] * 200)
+        self.assertEqual(self.eng.measure_qubit(q2), outcomes)
+
+    def test_absorb_parts(self):
+        other = batchedEngine("Bob", 1, shots=200)
+        o1 = other.add_fresh_qubit()
+        other.apply_H(o1)
+        other.measure_qubit_inplace(o1)
+        self.eng.add_fresh_qubit()
+        newNums = self.eng.absorb_parts(*other.get_register_RI(), other.activeQubits)
+        self.assertEqual(newNums, [1])
+        self.assertTrue(np.allclose(self.eng.qubitReg[:, 0, :], other.qubitReg))
+
+    def test_absorb_different_shots(self):
+        other = batchedEngine("Bob", 1, shots=10)
+        other.add_fresh_qubit()
+        with self.assertRaises(quantumError):
+            self.eng.absorb(other)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from simulaqron.settings import SimBackend
+from simulaqron.virtual_node import engine_registry
+from simulaqron.virtual_node.basics import quantumError
+from simulaqron.virtual_node.engine_registry import available_engines, default_engines, get_default_engine
+from simulaqron.virtual_node.engine_registry import get_engine, register_engine
+from simulaqron.virtual_node.stabilizer_simulator import stabilizerEngine
+
+
+class dummyEngine(stabilizerEngine):
+    pass
+
+
+class TestEngineRegistry(unittest.TestCase):
+    def tearDown(self):
+        engine_registry._engines.pop("dummy", None)
+        engine_registry._engines.pop("dummy_lazy", None)
+
+    def test_builtin_engines(self):
+        for backend in SimBackend:
+            self.assertIn(backend.value, available_engines())
+
+    def test_get_stabilizer(self):
+        self.assertIs(get_engine(SimBackend.STABILIZER.value), stabilizerEngine)
+
+    def test_default_engines(self):
+        self.assertIn(SimBackend.STABILIZER.value, default_engines())
+        self.assertNotIn(SimBackend.BATCHED.value, default_engines())
+        self.assertIs(get_default_engine(SimBackend.STABILIZER.value), stabilizerEngine)
+        with self.assertRaises(quantumError):
+            get_default_engine(SimBackend.BATCHED.value)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(quantumError):
+            get_engine("no_such_engine")
+
+    def test_register_class(self):
+        register_engine("dummy", dummyEngine)
+        self.assertIs(get_engine("dummy"), dummyEngine)
+        eng = get_engine("dummy")("Alice", 0)
+        self.assertEqual(eng.add_fresh_qubit(), 0)
+
+    def test_register_path(self):
+        register_engine("dummy_lazy", f"{__name__}:dummyEngine")
+        self.assertIsInstance(engine_registry._engines["dummy_lazy"], str)
+        self.assertIs(get_engine("dummy_lazy"), dummyEngine)
+        self.assertIs(engine_registry._engines["dummy_lazy"], dummyEngine)
+
+    def test_register_invalid(self):
+        with self.assertRaises(TypeError):
+            register_engine("dummy", object)
+        register_engine("dummy", "simulaqron.settings:Config")
+        with self.assertRaises(quantumError):
+            get_engine("dummy")
+        register_engine("dummy", "no.such.module:engine")
+        with self.assertRaises(quantumError):
+            get_engine("dummy")
+
+
+if __name__ == '__main__':
+    unittest.main()
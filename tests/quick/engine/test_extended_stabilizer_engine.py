@@ -0,0 +1,149 @@
+import unittest
+import numpy as np
+
+from simulaqron.virtual_node.extended_stabilizer_simulator import extendedStabilizerEngine
+from simulaqron.virtual_node.basics import noQubitError, quantumError
+from simulaqron.toolbox import dense_states
+
+
+def _fidelity(state1, state2):
+    return abs(np.vdot(np.array(state1).reshape(-1), np.array(state2).reshape(-1))) ** 2
+
+
+class TestExtendedStabilizerEngine_init(unittest.TestCase):
+    def test_init(self):
+        eng = extendedStabilizerEngine("Alice", 0)
+        self.assertEqual(eng.maxQubits, 10)
+        self.assertEqual(eng.activeQubits, 0)
+
+        eng = extendedStabilizerEngine("Alice", 0, 5, precision=0.1)
+        self.assertEqual(eng.maxQubits, 5)
+        self.assertEqual(eng.precision, 0.1)
+
+
+class TestExtendedStabilizerEngine(unittest.TestCase):
+    def setUp(self):
+        self.eng = extendedStabilizerEngine("Alice", 0, precision=0)
+
+    def test_add_fresh_qubit(self):
+        num = self.eng.add_fresh_qubit()
+        self.assertEqual(num, 0)
+        self.assertEqual(self.eng.activeQubits, 1)
+
+    def test_add_to_many_fresh_qubits(self):
+        for _ in range(10):
+            self.eng.add_fresh_qubit()
+        with self.assertRaises(noQubitError):
+            self.eng.add_fresh_qubit()
+
+    def test_add_qubit(self):
+        self.eng.add_qubit([[1, 1, 1]])
+        self.eng.add_qubit([0, 1])
+        f = 1 / np.sqrt(2)
+        ref = np.kron([f, -1j * f], [0, 1])
+        self.assertAlmostEqual(_fidelity(self.eng.get_state_vector(), ref), 1)
+
+    def test_ghz_with_T(self):
+        n = 10
+        for _ in range(n):
+            self.eng.add_fresh_qubit()
+        self.eng.apply_H(0)
+        for i in range(n - 1):
+            self.eng.apply_CNOT(i, i + 1)
+        self.eng.apply_T(3)
+        self.eng.apply_rotation(5, (1, 0, 0), np.pi / 3)
+        ref = dense_states.basis_state([0] * n)
+        ref = dense_states.apply_gate(ref, dense_states.H, [0])
+        for i in range(n - 1):
+            ref = dense_states.apply_gate(ref, dense_states.CNOT, [i, i + 1])
+        ref = dense_states.apply_gate(ref, dense_states.T, [3])
+        ref = dense_states.apply_gate(ref, dense_states.rotation((1, 0, 0), np.pi / 3), [5])
+        self.assertAlmostEqual(_fidelity(self.eng.get_state_vector(), ref), 1)
+
+    def test_measure_and_reuse(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_T(q1)
+        self.eng.apply_H(q1)
+        self.eng.apply_CNOT(q1, q2)
+        outcome = self.eng.measure_qubit(q1)
+        self.assertEqual(self.eng.activeQubits, 1)
+        self.assertEqual(self.eng.measure_qubit_inplace(q2), outcome)
+
+        # The removed qubit is reused in the state |0>, the other qubit keeps its number
+        num = self.eng.add_fresh_qubit()
+        self.assertEqual(num, q1)
+        self.assertEqual(self.eng.qubitReg.num_qubits, 2)
+        self.assertEqual(self.eng.measure_qubit(num), 0)
+        self.assertEqual(self.eng.measure_qubit(q2), outcome)
+
+        with self.assertRaises(quantumError):
+            self.eng.remove_qubit(q1)
+
+    def test_measure_qubits(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        q3 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_T(q1)
+        self.eng.apply_CNOT(q1, q2)
+        self.eng.apply_X(q3)
+        outcomes = self.eng.measure_qubits([q3, q2], inplace=True)
+        self.assertEqual(outcomes[0], 1)
+        self.assertEqual(self.eng.measure_qubits([q1, q2]), [outcomes[1]] * 2)
+        self.assertEqual(self.eng.get_qubit_numbers(), [q3])
+
+    def test_probabilities_and_expectation(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_T(q1)
+        self.eng.apply_CNOT(q1, q2)
+        self.eng.measure_qubit(q1)
+        q3 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q3)
+        self.eng.apply_T(q3)
+        self.assertTrue(np.allclose(self.eng.probabilities([q3]), [0.5, 0.5]))
+        self.assertAlmostEqual(self.eng.expectation("X", [q3]), 1 / np.sqrt(2))
+        self.assertAlmostEqual(self.eng.expectation("Y", [q3]), 1 / np.sqrt(2))
+        self.assertAlmostEqual(abs(self.eng.expectation("ZZ", [q2, q3])), 0)
+
+    def test_absorb(self):
+        other = extendedStabilizerEngine("Bob", 1, precision=0)
+        q1 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_T(q1)
+        o1 = other.add_fresh_qubit()
+        o2 = other.add_fresh_qubit()
+        other.apply_X(o2)
+        other.measure_qubit(o1)
+        self.assertEqual(self.eng.absorb(other), {o2: 1})
+        self.assertEqual(self.eng.activeQubits, 2)
+        f = 1 / np.sqrt(2)
+        ref = np.kron([f, f * np.exp(1j * np.pi / 4)], [0, 1])
+        self.assertAlmostEqual(_fidelity(self.eng.get_state_vector(), ref), 1)
+
+    def test_absorb_parts(self):
+        other = extendedStabilizerEngine("Bob", 1, precision=0)
+        o1 = other.add_fresh_qubit()
+        other.apply_H(o1)
+        other.apply_T(o1)
+        other.apply_H(o1)
+        self.eng.add_fresh_qubit()
+        self.eng.absorb_parts(*other.get_register_RI(), other.activeQubits)
+        self.assertEqual(self.eng.activeQubits, 2)
+        ref = np.kron([1, 0], other.get_state_vector())
+        self.assertAlmostEqual(_fidelity(self.eng.get_state_vector(), ref), 1)
+
+    def test_absorb_too_many(self):
+        other = extendedStabilizerEngine("Bob", 1)
+        for _ in range(10):
+            self.eng.add_fresh_qubit()
+        other.add_fresh_qubit()
+        with self.assertRaises(quantumError):
+            self.eng.absorb(other)
+
+
+if __name__ == "__main__":
+    unittest.main()
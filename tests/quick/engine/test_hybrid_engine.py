@@ -0,0 +1,279 @@
+import unittest
+import numpy as np
+
+from simulaqron.virtual_node.hybrid_simulator import hybridEngine
+from simulaqron.virtual_node.basics import noQubitError, quantumError
+from simulaqron.toolbox.stabilizer_states import StabilizerState
+from simulaqron.toolbox import dense_states
+
+
+def _fidelity(state1, state2):
+    return abs(np.vdot(np.array(state1).reshape(-1), np.array(state2).reshape(-1))) ** 2
+
+
+class TestHybridEngine_init(unittest.TestCase):
+    def test_init(self):
+        eng = hybridEngine("Alice", 0)
+        self.assertEqual(eng.maxQubits, 10)
+        self.assertEqual(eng.activeQubits, 0)
+        self.assertFalse(eng.promoted)
+
+        eng = hybridEngine("Alice", 0, 5)
+        self.assertEqual(eng.maxQubits, 5)
+        self.assertEqual(eng.activeQubits, 0)
+
+
+class TestHybridEngine(unittest.TestCase):
+    def setUp(self):
+        self.eng = hybridEngine("Alice", 0)
+
+    def test_add_fresh_qubit(self):
+        num = self.eng.add_fresh_qubit()
+        self.assertEqual(num, 0)
+        self.assertEqual(self.eng.activeQubits, 1)
+        self.assertFalse(self.eng.promoted)
+
+    def test_add_to_many_fresh_qubits(self):
+        for _ in range(10):
+            self.eng.add_fresh_qubit()
+        with self.assertRaises(noQubitError):
+            self.eng.add_fresh_qubit()
+
+    def test_add_qubit(self):
+        num = self.eng.add_qubit([[1, 0]])
+        self.assertEqual(num, 0)
+        self.assertFalse(self.eng.promoted)
+        num = self.eng.add_qubit([0, 1])
+        self.assertEqual(num, 1)
+        self.assertTrue(self.eng.promoted)
+        self.assertEqual(self.eng.activeQubits, 2)
+        self.assertAlmostEqual(_fidelity(self.eng.get_state_vector(), [0, 1 / np.sqrt(2), 0, 1 / np.sqrt(2)]), 1)
+
+    def test_clifford_stays_stabilizer(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_CNOT(q1, q2)
+        self.eng.apply_K(q2)
+        self.eng.apply_CPHASE(q1, q2)
+        self.assertFalse(self.eng.promoted)
+        state, imag = self.eng.get_register_RI()
+        self.assertIsNone(imag)
+        ref = StabilizerState(2)
+        ref.apply_H(0)
+        ref.apply_CNOT(0, 1)
+        ref.apply_K(1)
+        ref.apply_CZ(0, 1)
+        self.assertEqual(StabilizerState(state), ref)
+
+    def test_T_promotes_only_product_qubit(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        q3 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_CNOT(q1, q2)
+        self.eng.apply_H(q3)
+        self.eng.apply_T(q3)
+        self.assertEqual(self.eng.denseQubits, [q3])
+        self.assertEqual(self.eng.stabQubits, [q1, q2])
+        f = 1 / np.sqrt(2)
+        bell = np.array([f, 0, 0, f])
+        plus_T = np.array([f, f * np.exp(1j * np.pi / 4)])
+        self.assertAlmostEqual(_fidelity(self.eng.get_state_vector(), np.kron(bell, plus_T)), 1)
+
+    def test_T_promotes_entangled_qubits(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_CNOT(q1, q2)
+        self.eng.apply_T(q2)
+        self.assertEqual(sorted(self.eng.denseQubits), [q1, q2])
+        self.assertEqual(self.eng.stabQubits, [])
+        f = 1 / np.sqrt(2)
+        self.assertAlmostEqual(_fidelity(self.eng.get_state_vector(), [f, 0, 0, f * np.exp(1j * np.pi / 4)]), 1)
+
+    def test_mixed_two_qubit_gate(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        self.eng.apply_rotation(q1, (1, 0, 0), np.pi / 2)
+        self.eng.apply_CNOT(q1, q2)
+        self.assertEqual(sorted(self.eng.denseQubits), [q1, q2])
+        f = 1 / np.sqrt(2)
+        self.assertAlmostEqual(_fidelity(self.eng.get_state_vector(), [f, 0, 0, -1j * f]), 1)
+
+    def test_against_dense_simulation(self):
+        state = dense_states.empty_state()
+        for _ in range(4):
+            self.eng.add_fresh_qubit()
+            state = dense_states.tensor(state, dense_states.basis_state([0]))
+        ops = [
+            ("apply_H", dense_states.H, [0]),
+            ("apply_CNOT", dense_states.CNOT, [0, 1]),
+            ("apply_K", dense_states.K, [2]),
+            ("apply_T", dense_states.T, [1]),
+            ("apply_CPHASE", dense_states.CPHASE, [1, 2]),
+            ("apply_Y", dense_states.Y, [3]),
+            ("apply_H", dense_states.H, [3]),
+            ("apply_CNOT", dense_states.CNOT, [3, 0]),
+        ]
+        for name, gate, qubits in ops:
+            getattr(self.eng, name)(*qubits)
+            state = dense_states.apply_gate(state, gate, qubits)
+        self.assertAlmostEqual(_fidelity(self.eng.get_state_vector(), state), 1)
+
+    def test_get_qubits(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        q3 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_CNOT(q1, q2)
+        self.eng.apply_X(q3)
+        self.eng.apply_T(q3)
+        rho = self.eng.get_qubits([q3])
+        self.assertTrue(np.allclose(rho, [[0, 0], [0, 1]]))
+        self.assertEqual(self.eng.stabQubits, [q1, q2])
+        rho = self.eng.get_qubits([q2, q1])
+        f = 1 / np.sqrt(2)
+        bell = np.array([f, 0, 0, f])
+        self.assertTrue(np.allclose(rho, np.outer(bell, bell)))
+        rho = self.eng.get_qubits([q1, q3])
+        self.assertTrue(np.allclose(rho, np.diag([0, 0.5, 0, 0.5])))
+        with self.assertRaises(quantumError):
+            self.eng.get_qubits([5])
+
+    def test_measure_inplace_demotes(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_T(q1)
+        self.eng.apply_CNOT(q1, q2)
+        outcome = self.eng.measure_qubit_inplace(q1)
+        self.assertIn(q1, self.eng.stabQubits)
+        self.assertEqual(self.eng.measure_qubit_inplace(q1), outcome)
+        self.assertEqual(self.eng.measure_qubit(q2), outcome)
+        self.assertEqual(self.eng.activeQubits, 1)
+
+    def test_measure_keeps_numbers(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        q3 = self.eng.add_fresh_qubit()
+        self.eng.apply_T(q2)
+        self.eng.apply_X(q3)
+        self.assertEqual(self.eng.measure_qubit(q1), 0)
+        self.assertEqual(self.eng.activeQubits, 2)
+        self.assertEqual(self.eng.get_qubit_numbers(), [q2, q3])
+        self.assertEqual(self.eng.measure_qubit(q3), 1)
+        with self.assertRaises(quantumError):
+            self.eng.remove_qubit(q1)
+        self.assertEqual(self.eng.add_fresh_qubit(), q1)
+        self.assertEqual(self.eng.measure_qubit(q2), 0)
+
+    def test_measure_qubits(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        q3 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_T(q1)
+        self.eng.apply_CNOT(q1, q2)
+        self.eng.apply_X(q3)
+        outcomes = self.eng.measure_qubits([q3, q2], inplace=True)
+        self.assertEqual(outcomes[0], 1)
+        self.assertEqual(self.eng.denseQubits, [q1])
+        self.assertEqual(self.eng.measure_qubits([q1, q2]), [outcomes[1]] * 2)
+        self.assertEqual(self.eng.get_qubit_numbers(), [q3])
+
+    def test_probabilities_and_expectation(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        q3 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_CNOT(q1, q2)
+        self.eng.apply_H(q3)
+        self.eng.apply_T(q3)
+        self.assertEqual(self.eng.denseQubits, [q3])
+        self.assertTrue(np.allclose(self.eng.probabilities([q3, q1]), [0.25] * 4))
+        self.assertTrue(np.allclose(self.eng.probabilities([q2, q1]), [0.5, 0, 0, 0.5]))
+        self.assertAlmostEqual(self.eng.expectation("XXX"), 1 / np.sqrt(2))
+        self.assertAlmostEqual(self.eng.expectation("YZ", [q3, q2]), 0)
+        self.assertAlmostEqual(self.eng.expectation("ZZ", [q2, q1]), 1)
+        self.assertEqual(self.eng.denseQubits, [q3])
+
+    def test_split_qubit(self):
+        q1 = self.eng.add_fresh_qubit()
+        q2 = self.eng.add_fresh_qubit()
+        q3 = self.eng.add_fresh_qubit()
+        q4 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_CNOT(q1, q2)
+        self.eng.apply_H(q3)
+        self.eng.apply_T(q3)
+        self.eng.apply_Y(q4)
+        self.assertEqual(sorted(self.eng.separable_qubits()), [q3, q4])
+
+        other = hybridEngine("Bob", 1)
+        o3 = self.eng.split_qubit(q3, other)
+        o4 = self.eng.split_qubit(q4, other)
+        self.assertEqual(self.eng.get_qubit_numbers(), [q1, q2])
+        self.assertEqual(other.denseQubits, [o3])
+        self.assertEqual(other.stabQubits, [o4])
+        f = 1 / np.sqrt(2)
+        plus_T = np.array([f, f * np.exp(1j * np.pi / 4)])
+        self.assertAlmostEqual(_fidelity(other.get_state_vector(), np.kron(plus_T, [0, 1])), 1)
+
+    def test_should_split(self):
+        self.eng.maxSplitQubits = 1
+        qubits = [self.eng.add_fresh_qubit() for _ in range(3)]
+        for q in qubits:
+            self.eng.apply_H(q)
+        self.assertTrue(self.eng.should_split())
+
+        # Only the qubits in the dense part count
+        self.eng.apply_T(qubits[0])
+        self.assertTrue(self.eng.should_split())
+        self.eng.apply_T(qubits[1])
+        self.assertFalse(self.eng.should_split())
+
+    def test_absorb(self):
+        other = hybridEngine("Bob", 1)
+        q1 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(q1)
+        self.eng.apply_T(q1)
+        o1 = other.add_fresh_qubit()
+        o2 = other.add_fresh_qubit()
+        other.apply_X(o1)
+        other.apply_T(o2)
+        self.assertEqual(self.eng.absorb(other), {o1: 1, o2: 2})
+        self.assertEqual(self.eng.activeQubits, 3)
+        self.assertEqual(self.eng.stabQubits, [1])
+        self.assertEqual(self.eng.denseQubits, [0, 2])
+        f = 1 / np.sqrt(2)
+        ref = np.kron(np.kron([f, f * np.exp(1j * np.pi / 4)], [0, 1]), [1, 0])
+        self.assertAlmostEqual(_fidelity(self.eng.get_state_vector(), ref), 1)
+
+    def test_absorb_too_many(self):
+        other = hybridEngine("Bob", 1)
+        for _ in range(10):
+            self.eng.add_fresh_qubit()
+        other.add_fresh_qubit()
+        with self.assertRaises(quantumError):
+            self.eng.absorb(other)
+
+    def test_absorb_parts(self):
+        other = hybridEngine("Bob", 1)
+        q1 = other.add_fresh_qubit()
+        other.apply_H(q1)
+        self.eng.add_fresh_qubit()
+        self.assertEqual(self.eng.absorb_parts(*other.get_register_RI(), other.activeQubits), [1])
+        self.assertFalse(self.eng.promoted)
+
+        other.apply_T(q1)
+        self.eng.absorb_parts(*other.get_register_RI(), other.activeQubits)
+        self.assertEqual(self.eng.denseQubits, [2])
+        f = 1 / np.sqrt(2)
+        plus = [f, f]
+        ref = np.kron(np.kron([1, 0], plus), [f, f * np.exp(1j * np.pi / 4)])
+        self.assertAlmostEqual(_fidelity(self.eng.get_state_vector(), ref), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
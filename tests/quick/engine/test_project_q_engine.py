@@ -200,6 +200,42 @@ class TestProjectQEngine(unittest.TestCase):
         ref = [1 / 2, 1 / 2, 1 / 2, -1 / 2]
         self.assertAlmostEqual(self.abs_inner_product(state, ref), 1)
 
+    @if_has_module
+    def test_get_qubits(self):
+        num1 = self.eng.add_fresh_qubit()
+        num2 = self.eng.add_fresh_qubit()
+        num3 = self.eng.add_fresh_qubit()
+        self.eng.apply_X(num2)
+        self.eng.apply_H(num3)
+        rho = self.eng.get_qubits([num1, num2])
+        self.assertTrue(np.allclose(rho, np.diag([0, 1, 0, 0])))
+        rho = self.eng.get_qubits([num3])
+        self.assertTrue(np.allclose(rho, [[0.5, 0.5], [0.5, 0.5]]))
+
+    @if_has_module
+    def test_measure_qubits(self):
+        num1 = self.eng.add_fresh_qubit()
+        num2 = self.eng.add_fresh_qubit()
+        num3 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(num1)
+        self.eng.apply_CNOT(num1, num2)
+        self.eng.apply_X(num3)
+        outcomes = self.eng.measure_qubits([num3, num2], inplace=True)
+        self.assertEqual(outcomes[0], 1)
+        self.assertEqual(self.eng.measure_qubits([num1, num2]), [outcomes[1]] * 2)
+        self.assertEqual(self.eng.activeQubits, 1)
+
+    @if_has_module
+    def test_probabilities_and_expectation(self):
+        num1 = self.eng.add_fresh_qubit()
+        num2 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(num1)
+        self.eng.apply_CNOT(num1, num2)
+        self.assertTrue(np.allclose(self.eng.probabilities([num2, num1]), [0.5, 0, 0, 0.5]))
+        self.assertAlmostEqual(self.eng.expectation("XX"), 1)
+        self.assertAlmostEqual(self.eng.expectation("YY"), -1)
+        self.assertAlmostEqual(self.eng.expectation("Z", [num2]), 0)
+
     @if_has_module
     def test_measure0(self):
         num = self.eng.add_fresh_qubit()
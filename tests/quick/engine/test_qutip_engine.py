@@ -28,12 +28,14 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import unittest
+import numpy as np
 
 from simulaqron.toolbox import has_module
 from simulaqron.settings import SimBackend
 
 if has_module.main(SimBackend.QUTIP.value):
 
+    import qutip as qp
     from simulaqron.virtual_node.qutip_simulator import qutipEngine
 
     _has_module = True
@@ -101,6 +103,125 @@ class TestQutipEngine(unittest.TestCase):
         outcome = se.measure_qubit(0)
         self.assertEqual(outcome, 1)
 
+    @if_has_module
+    def test_get_qubits(self):
+        se = qutipEngine("alice", 0)
+
+        for _ in range(4):
+            se.add_fresh_qubit()
+        se.apply_H(0)
+        se.apply_CNOT(0, 2)
+        se.apply_rotation(3, (1, 0, 0), 1)
+        se.apply_CNOT(3, 1)
+        reg = se.qubitReg
+        for qList in [[0], [2, 0], [1, 3], [0, 1, 3]]:
+            rho = se.get_qubits(qList)
+            ref = qp.Qobj(reg.full(), dims=[[2] * 4, [2] * 4]).ptrace(sorted(qList)).full()
+            self.assertTrue(np.allclose(rho, ref))
+
+    @if_has_module
+    def test_measure_qubits(self):
+        se = qutipEngine("alice", 0)
+
+        num1 = se.add_fresh_qubit()
+        num2 = se.add_fresh_qubit()
+        num3 = se.add_fresh_qubit()
+        se.apply_H(num1)
+        se.apply_CNOT(num1, num2)
+        se.apply_X(num3)
+        outcomes = se.measure_qubits([num3, num1], inplace=True)
+        self.assertEqual(outcomes[0], 1)
+        self.assertTrue(np.allclose(se.probabilities([num2]), [1 - outcomes[1], outcomes[1]]))
+        self.assertEqual(se.measure_qubits([num2, num1]), [outcomes[1]] * 2)
+        self.assertEqual(se.activeQubits, 1)
+        self.assertEqual(se.measure_qubit(num3), 1)
+
+    @if_has_module
+    def test_probabilities_and_expectation(self):
+        se = qutipEngine("alice", 0)
+
+        num1 = se.add_fresh_qubit()
+        num2 = se.add_fresh_qubit()
+        se.apply_rotation(num1, (0, 1, 0), np.pi / 3)
+        se.apply_CNOT(num1, num2)
+        p1 = np.sin(np.pi / 6) ** 2
+        self.assertTrue(np.allclose(se.probabilities([num2, num1]), [1 - p1, 0, 0, p1]))
+        self.assertAlmostEqual(se.expectation("ZI"), 1 - 2 * p1)
+        self.assertAlmostEqual(se.expectation("XX"), np.sin(np.pi / 3))
+        self.assertAlmostEqual(se.expectation("Y", [num2]), 0)
+
+    @if_has_module
+    def test_remove_keeps_numbers(self):
+        se = qutipEngine("alice", 0)
+
+        num1 = se.add_fresh_qubit()
+        num2 = se.add_fresh_qubit()
+        se.apply_X(num2)
+        se.remove_qubit(num1)
+        self.assertEqual(se.get_qubit_numbers(), [num2])
+        rho = se.get_qubits([num2])
+        self.assertAlmostEqual(rho[1][1].real, 1)
+        outcome = se.measure_qubit(num2)
+        self.assertEqual(outcome, 1)
+
+    @if_has_module
+    def test_replace_keeps_number(self):
+        se = qutipEngine("alice", 0)
+
+        num1 = se.add_fresh_qubit()
+        num2 = se.add_fresh_qubit()
+        num3 = se.add_fresh_qubit()
+        se.remove_qubit(num1)
+        se.replace_qubit(num3, qp.basis(2, 1) * qp.basis(2, 1).dag())
+        self.assertEqual(se.get_qubit_numbers(), [num2, num3])
+        self.assertEqual(se.measure_qubit_inplace(num3), 1)
+        self.assertEqual(se.add_fresh_qubit(), num1)
+        self.assertEqual(se.add_fresh_qubit(), 3)
+
+    @if_has_module
+    def test_split_qubit(self):
+        se = qutipEngine("alice", 0)
+        se2 = qutipEngine("alice", 1)
+
+        num1 = se.add_fresh_qubit()
+        num2 = se.add_fresh_qubit()
+        num3 = se.add_fresh_qubit()
+        se.apply_H(num1)
+        se.apply_CNOT(num1, num2)
+        se.apply_rotation(num3, (1, 0, 0), np.pi / 3)
+        self.assertEqual(se.separable_qubits(), [num3])
+        rho = se.get_qubits([num3])
+        self.assertEqual(se.split_qubit(num3, se2), 0)
+        self.assertEqual(se.get_qubit_numbers(), [num1, num2])
+        self.assertTrue(np.allclose(se2.get_qubits([0]), rho))
+        self.assertEqual(se.measure_qubit(num1), se.measure_qubit(num2))
+
+    @if_has_module
+    def test_should_split(self):
+        se = qutipEngine("alice", 0)
+        se.maxSplitQubits = 2
+        num1 = se.add_fresh_qubit()
+        se.add_fresh_qubit()
+        self.assertTrue(se.should_split())
+        se.add_fresh_qubit()
+        self.assertFalse(se.should_split())
+
+        # Spare qubits do not count
+        se.reset_qubit(num1)
+        self.assertTrue(se.should_split())
+
+    @if_has_module
+    def test_state_nbytes(self):
+        se = qutipEngine("alice", 0)
+
+        num1 = se.add_fresh_qubit()
+        se.add_fresh_qubit()
+        se.reset_qubit(num1)
+        self.assertEqual(se.state_nbytes(), 16 * 4)
+        se.drop_spare_qubits()
+        R, I = se.get_register_RI()
+        self.assertEqual(se.state_nbytes(), np.array(R, dtype=complex).nbytes)
+
 
 if __name__ == '__main__':
     if _has_module:
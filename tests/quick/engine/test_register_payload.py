@@ -0,0 +1,255 @@
+import unittest
+from unittest import mock
+import numpy as np
+from twisted.internet import task
+from twisted.spread import banana, pb
+from twisted.test import iosim
+
+from simulaqron.toolbox import has_module
+from simulaqron.settings import SimBackend, simulaqron_settings
+from simulaqron.virtual_node import basics
+from simulaqron.virtual_node.basics import registerPayload, quantumError, mergeStatistics
+from simulaqron.virtual_node.stabilizer_simulator import stabilizerEngine
+from simulaqron.virtual_node.hybrid_simulator import hybridEngine
+from simulaqron.virtual_node.batched_simulator import batchedEngine
+from simulaqron.virtual_node.extended_stabilizer_simulator import extendedStabilizerEngine
+
+ENGINES = [stabilizerEngine, hybridEngine, batchedEngine, extendedStabilizerEngine]
+
+if has_module.main(SimBackend.QUTIP.value):
+    from simulaqron.virtual_node.qutip_simulator import qutipEngine
+
+    ENGINES.append(qutipEngine)
+
+
+def send(payload):
+    """
+    Serializes and deserializes the payload as Twisted PB does when it is sent to another node.
+    """
+    broker = pb.Broker()
+    return broker.unserialize(banana.decode(banana.encode(broker.serialize(payload))))
+
+
+def connect(payload):
+    """
+    Sends the payload to a client over an in memory transport, and returns the received payload and the pump
+    delivering the messages between both sides.
+    """
+    class Root(pb.Root):
+        def remote_get_payload(self):
+            return payload
+
+    factory = pb.PBClientFactory()
+    server = pb.PBServerFactory(Root()).buildProtocol(None)
+    client = factory.buildProtocol(None)
+    pump = iosim.connect(server, iosim.makeFakeServer(server), client, iosim.makeFakeClient(client))
+    results = []
+    factory.getRootObject().addCallback(lambda root: root.callRemote("get_payload")).addCallback(results.append)
+    pump.flush()
+    return results[0], pump
+
+
+class TestRegisterPayload(unittest.TestCase):
+    def test_send(self):
+        arrays = {
+            "state": np.arange(200000) * (1 + 2j),
+            "generators": np.eye(3, dtype=bool)[:, ::-1],
+            "empty": np.zeros((0, 0), dtype=bool),
+        }
+        payload = send(registerPayload("test", [3, 1], arrays, {"order": {0: 1, 1: 0}}))
+        self.assertIsInstance(payload, registerPayload)
+        self.assertEqual(payload.kind, "test")
+        self.assertEqual(payload.qubits, [3, 1])
+        self.assertEqual(payload.info, {"order": {0: 1, 1: 0}})
+        self.assertEqual(payload.nbytes, sum(array.nbytes for array in arrays.values()))
+        for name, array in arrays.items():
+            self.assertEqual(payload.arrays[name].dtype, array.dtype)
+            self.assertTrue(np.array_equal(payload.arrays[name], array))
+        self.assertTrue(payload.arrays["state"].flags.writeable)
+        self.assertIsNone(payload.stream)
+
+    def test_sparse(self):
+        state = np.zeros(2 ** 12, dtype=complex)
+        state[0] = state[-1] = 1 / np.sqrt(2)
+        generators = np.zeros((24, 25), dtype=bool)
+        generators[3, 7] = True
+        dense = np.arange(100, dtype=float)
+        payload = registerPayload("test", [0], {"state": state, "generators": generators, "dense": dense})
+        self.assertEqual(payload._encode(state)[0]["sparse"], np.dtype(np.uint32).str)
+        self.assertEqual(payload._encode(generators)[0]["sparse"], np.dtype(np.uint32).str)
+        self.assertIsNone(payload._encode(dense)[0]["sparse"])
+
+        received = send(payload)
+        self.assertLess(received.wireBytes, payload.nbytes / 10)
+        for name, array in payload.arrays.items():
+            self.assertEqual(received.arrays[name].dtype, array.dtype)
+            self.assertTrue(np.array_equal(received.arrays[name], array))
+
+    def test_compression(self):
+        arrays = {"state": np.tile(np.arange(8) * (1 + 2j), 10000), "small": np.arange(10, dtype=float)}
+        payload = registerPayload("test", [0], arrays)
+        for codec in ["zlib", "lzma", "none"]:
+            with self.subTest(codec=codec):
+                with mock.patch.dict(simulaqron_settings._config, payload_compression=codec):
+                    self.assertEqual(payload._encode(arrays["state"])[0]["codec"], None if codec == "none" else codec)
+                    self.assertIsNone(payload._encode(arrays["small"])[0]["codec"])
+                    received = send(payload)
+                if codec == "none":
+                    self.assertEqual(received.wireBytes, payload.nbytes)
+                else:
+                    self.assertLess(received.wireBytes, payload.nbytes / 10)
+                for name, array in arrays.items():
+                    self.assertTrue(np.array_equal(received.arrays[name], array))
+
+        with mock.patch.dict(simulaqron_settings._config, payload_compression_threshold=10 ** 9):
+            self.assertIsNone(payload._encode(arrays["state"])[0]["codec"])
+
+    def assertUnlinked(self, name):
+        from multiprocessing import shared_memory
+
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+    @unittest.skipIf(not registerPayload.can_share(), "Shared memory is not supported")
+    def test_shared_memory(self):
+        arrays = {"state": np.arange(5000) * (1 + 2j), "generators": np.eye(50, dtype=bool)}
+        payload = registerPayload("test", [0], arrays)
+        payload.sharedMemory = True
+        with mock.patch.object(basics, "reactor", task.Clock()):
+            received, pump = connect(payload)
+        self.assertIsNone(received.stream)
+        self.assertEqual(received.wireBytes, payload.nbytes)
+        for name, array in arrays.items():
+            self.assertTrue(np.array_equal(received.arrays[name], array))
+
+        # The sender unlinks the segment once the receiver has mapped it, the mapping is closed when released
+        segment = received._segment
+        received.receive()
+        pump.flush()
+        self.assertUnlinked(segment.name)
+        self.assertTrue(np.array_equal(received.arrays["state"], arrays["state"]))
+        received.release()
+        self.assertEqual(received.arrays, {})
+        self.assertIsNone(received._segment)
+        self.assertIsNone(segment.buf)
+        received.release()
+
+    @unittest.skipIf(not registerPayload.can_share(), "Shared memory is not supported")
+    def test_shared_memory_other_host(self):
+        arrays = {"state": np.arange(5000) * (1 + 2j), "generators": np.eye(50, dtype=bool)}
+        payload = registerPayload("test", [0], arrays)
+        payload.sharedMemory = True
+        names = []
+
+        def share():
+            (shared, owner) = registerPayload._share(payload)
+            names.append(shared["name"])
+            return (shared, owner)
+
+        with mock.patch.object(basics, "reactor", task.Clock()), mock.patch.object(payload, "_share", share):
+            # The sender asks for its host first, then the receiver
+            with mock.patch.object(basics, "_host_id", side_effect=["Alice", "Bob"]):
+                received, pump = connect(payload)
+
+        # The arrays are streamed from the segment instead, which is unlinked afterwards
+        self.assertIsNone(received._segment)
+        self.assertIsNotNone(received.stream)
+        done = []
+        received.receive().addCallback(done.append)
+        pump.flush()
+        self.assertEqual(len(done), 1)
+        for name, array in arrays.items():
+            self.assertTrue(np.array_equal(received.arrays[name], array))
+        self.assertUnlinked(names[0])
+
+    @unittest.skipIf(not registerPayload.can_share(), "Shared memory is not supported")
+    def test_shared_memory_timeout(self):
+        payload = registerPayload("test", [0], {"state": np.arange(10) * 1j})
+        clock = task.Clock()
+        with mock.patch.object(basics, "reactor", clock):
+            (shared, owner) = payload._share()
+
+        # The segment is unlinked by the sender if the receiver does not map it in time
+        clock.advance(registerPayload.shareTimeout - 1)
+        self.assertIsNotNone(owner.segment)
+        clock.advance(1)
+        self.assertIsNone(owner.segment)
+        self.assertUnlinked(shared["name"])
+
+        # A receiver arriving late falls back to streaming
+        received = registerPayload()
+        self.assertFalse(received._attach(shared, {"state": ("<c16", [10])}))
+
+    def test_statistics(self):
+        statistics = mergeStatistics()
+        statistics.record(2, 1000, 100, 0.5, 0.25)
+        statistics.record(1, 200)
+        self.assertEqual(statistics.to_dict(), {
+            "merges": 2,
+            "qubits_moved": 3,
+            "bytes_moved": 1200,
+            "max_bytes_moved": 1000,
+            "wire_bytes": 300,
+            "compression_ratio": 4.0,
+            "encode_time": 0.5,
+            "decode_time": 0.25,
+        })
+
+    def test_stream(self):
+        arrays = {
+            "state": np.arange(5000) * (1 + 2j),
+            "generators": np.eye(50, dtype=bool),
+            "compressed": np.tile(np.arange(8.), 5000),
+        }
+        payload = registerPayload("test", [0], arrays)
+        payload.chunkSize = 1000
+        payload.streamThreshold = 10000
+        received, pump = connect(payload)
+        self.assertIsNotNone(received.stream)
+        self.assertEqual(received.nbytes, payload.nbytes)
+
+        done = []
+        received.receive().addCallback(done.append)
+        pump.flush()
+        self.assertEqual(len(done), 1)
+        self.assertIsNone(received.stream)
+        for name, array in arrays.items():
+            self.assertTrue(np.array_equal(received.arrays[name], array))
+
+
+class TestEnginePayloads(unittest.TestCase):
+    def test_absorb_payload(self):
+        for engine in ENGINES:
+            with self.subTest(engine=engine.__name__):
+                eng = engine("Alice", 0)
+                num1 = eng.add_fresh_qubit()
+                num2 = eng.add_fresh_qubit()
+                eng.apply_H(num1)
+                eng.apply_CNOT(num1, num2)
+                eng.apply_K(num2)
+                if engine is not stabilizerEngine:
+                    eng.apply_T(num2)
+                payload = send(eng.get_register_payload())
+                self.assertEqual(payload.qubits, [num1, num2])
+
+                other = engine("Bob", 1)
+                other.apply_X(other.add_fresh_qubit())
+                newNums = other.absorb_payload(payload)
+                self.assertEqual(other.activeQubits, 3)
+                for qubits in [[num1, num2], [num1]]:
+                    self.assertTrue(np.allclose(
+                        other.probabilities([newNums[[num1, num2].index(q)] for q in qubits]),
+                        eng.probabilities(qubits),
+                    ))
+                for pauli in ["XY", "YX", "ZZ"]:
+                    self.assertTrue(np.allclose(other.expectation(pauli, newNums), eng.expectation(pauli)))
+
+    def test_wrong_kind(self):
+        for engine in ENGINES:
+            with self.subTest(engine=engine.__name__):
+                with self.assertRaises(quantumError):
+                    engine("Alice", 0).absorb_payload(registerPayload("unknown", [0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -68,6 +68,20 @@ class TestStabilizerEngine(unittest.TestCase):
         state, _ = self.eng.get_register_RI()
         self.assertTrue(StabilizerState(state) == StabilizerState(2))
 
+    def test_state_nbytes(self):
+        num1 = self.eng.add_fresh_qubit()
+        self.eng.add_fresh_qubit()
+        self.eng.add_fresh_qubit()
+        self.assertEqual(self.eng.state_nbytes(), 7)
+        self.eng.reset_qubit(num1)
+        self.assertEqual(self.eng.state_nbytes(), 5)
+        self.eng.drop_spare_qubits()
+        self.assertEqual(self.eng.state_nbytes(), self.eng.get_register_payload().nbytes)
+        for _ in range(8):
+            self.eng.add_fresh_qubit()
+        self.assertEqual(self.eng.state_nbytes(), 21 * 2)
+        self.assertEqual(self.eng.state_nbytes(), self.eng.get_register_payload().nbytes)
+
     def test_H(self):
         num = self.eng.add_fresh_qubit()
         self.eng.apply_H(num)
@@ -151,6 +165,69 @@ class TestStabilizerEngine(unittest.TestCase):
         self.assertEqual(m, 0)
         self.assertEqual(self.eng.activeQubits, 1)
 
+    def test_measure_keeps_numbers(self):
+        num1 = self.eng.add_fresh_qubit()
+        num2 = self.eng.add_fresh_qubit()
+        num3 = self.eng.add_fresh_qubit()
+        self.eng.apply_X(num3)
+        self.assertEqual(self.eng.measure_qubit(num1), 0)
+        self.assertEqual(self.eng.get_qubit_numbers(), [num2, num3])
+        self.assertEqual(self.eng.measure_qubit(num3), 1)
+        with self.assertRaises(quantumError):
+            self.eng.measure_qubit(num1)
+        self.assertEqual(self.eng.add_fresh_qubit(), num1)
+        self.assertEqual(self.eng.get_qubit_numbers(), [num2, num1])
+
+    def test_smallest_free_number(self):
+        nums = [self.eng.add_fresh_qubit() for _ in range(5)]
+        for num in [nums[3], nums[1]]:
+            self.eng.measure_qubit(num)
+        self.assertEqual(self.eng.add_fresh_qubit(), nums[1])
+        self.assertEqual(self.eng.add_fresh_qubit(), nums[3])
+        self.assertEqual(self.eng.add_fresh_qubit(), 5)
+
+    def test_absorb_numbers(self):
+        num1 = self.eng.add_fresh_qubit()
+        self.eng.add_fresh_qubit()
+        self.eng.measure_qubit(num1)
+        eng2 = stabilizerEngine("Alice", 0)
+        eng2.add_fresh_qubit()
+        num2 = eng2.add_fresh_qubit()
+        eng2.apply_X(num2)
+        mapping = self.eng.absorb(eng2)
+        self.assertEqual(mapping, {0: 0, 1: 2})
+        self.assertEqual(self.eng.measure_qubit(mapping[num2]), 1)
+
+    def test_measure_qubits(self):
+        num1 = self.eng.add_fresh_qubit()
+        num2 = self.eng.add_fresh_qubit()
+        num3 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(num1)
+        self.eng.apply_CNOT(num1, num2)
+        self.eng.apply_X(num3)
+        outcomes = self.eng.measure_qubits([num3, num2], inplace=True)
+        self.assertEqual(outcomes[0], 1)
+        self.assertEqual(self.eng.activeQubits, 3)
+        self.assertEqual(self.eng.measure_qubits([num1, num2]), [outcomes[1]] * 2)
+        self.assertEqual(self.eng.get_qubit_numbers(), [num3])
+        with self.assertRaises(quantumError):
+            self.eng.measure_qubits([num3, num3])
+
+    def test_probabilities_and_expectation(self):
+        num1 = self.eng.add_fresh_qubit()
+        num2 = self.eng.add_fresh_qubit()
+        num3 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(num1)
+        self.eng.apply_CNOT(num1, num3)
+        self.eng.apply_X(num2)
+        self.assertEqual(self.eng.probabilities([num3, num2]), [0, 0.5, 0, 0.5])
+        self.assertEqual(self.eng.expectation("XX", [num1, num3]), 1)
+        self.assertEqual(self.eng.expectation("ZZZ"), -1)
+        self.assertEqual(self.eng.expectation("Z", [num1]), 0)
+        with self.assertRaises(ValueError):
+            self.eng.expectation("ZZ", [num1])
+        self.assertEqual(self.eng.activeQubits, 3)
+
     def test_absorb_both_empty(self):
         eng2 = stabilizerEngine("Alice", 0)
         self.eng.absorb(eng2)
@@ -261,6 +338,49 @@ class TestStabilizerEngine(unittest.TestCase):
         state, _ = self.eng.get_register_RI()
         self.assertTrue(StabilizerState(state) == StabilizerState([[1, 1, 0, 0], [0, 0, 1, 1]]))
 
+    def test_reset_qubit(self):
+        num1 = self.eng.add_fresh_qubit()
+        num2 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(num1)
+        self.eng.apply_CNOT(num1, num2)
+        outcome = self.eng.reset_qubit(num1)
+        self.assertEqual(self.eng.activeQubits, 2)
+        self.assertEqual(self.eng.spareQubits, [num1])
+        self.assertEqual(self.eng.measure_qubit_inplace(num2), outcome)
+        self.assertEqual(self.eng.measure_qubit_inplace(num1), 0)
+        self.assertEqual(self.eng.take_spare_qubit(), num1)
+        self.assertIsNone(self.eng.take_spare_qubit())
+
+    def test_drop_spare_qubits(self):
+        num1 = self.eng.add_fresh_qubit()
+        num2 = self.eng.add_fresh_qubit()
+        self.eng.apply_X(num2)
+        self.eng.reset_qubit(num1)
+        self.eng.drop_spare_qubits()
+        self.assertEqual(self.eng.spareQubits, [])
+        self.assertEqual(self.eng.get_qubit_numbers(), [num2])
+        self.assertEqual(self.eng.measure_qubit(num2), 1)
+
+    def test_split_qubit(self):
+        num1 = self.eng.add_fresh_qubit()
+        num2 = self.eng.add_fresh_qubit()
+        num3 = self.eng.add_fresh_qubit()
+        self.eng.apply_H(num1)
+        self.eng.apply_CNOT(num1, num2)
+        self.eng.apply_CNOT(num1, num3)
+        self.assertEqual(self.eng.separable_qubits(), [])
+        outcome = self.eng.measure_qubit_inplace(num2)
+        self.assertEqual(self.eng.separable_qubits(), [num1, num2, num3])
+
+        self.eng.apply_H(num3)
+        self.eng.apply_CNOT(num3, num1)
+        self.assertEqual(self.eng.separable_qubits(), [num2])
+        other = stabilizerEngine("Alice", 1)
+        self.assertEqual(self.eng.split_qubit(num2, other), 0)
+        self.assertEqual(self.eng.get_qubit_numbers(), [num1, num3])
+        self.assertEqual(self.eng.measure_qubit(num1) ^ self.eng.measure_qubit(num3), outcome)
+        self.assertEqual(other.measure_qubit(0), outcome)
+
     def test_absorb_parts_other_empty(self):
         num = self.eng.add_fresh_qubit()
         self.eng.apply_H(num)
@@ -0,0 +1,127 @@
+import unittest
+import numpy as np
+
+from simulaqron.toolbox.extended_stabilizer_states import ExtendedStabilizerState
+from simulaqron.toolbox import dense_states
+
+_GATES = {
+    "X": dense_states.X,
+    "Y": dense_states.Y,
+    "Z": dense_states.Z,
+    "H": dense_states.H,
+    "K": dense_states.K,
+    "S": np.diag([1, 1j]),
+    "T": dense_states.T,
+}
+
+
+def _fidelity(state1, state2):
+    return abs(np.vdot(state1.reshape(-1), state2.reshape(-1))) ** 2
+
+
+class TestExtendedStabilizerStates(unittest.TestCase):
+    def test_init(self):
+        state = ExtendedStabilizerState(3)
+        self.assertEqual(state.num_qubits, 3)
+        self.assertEqual(state.num_terms, 1)
+        self.assertAlmostEqual(_fidelity(state.to_state_vector(), dense_states.basis_state([0, 0, 0])), 1)
+
+    def test_random_circuits(self):
+        rng = np.random.default_rng(42)
+        n = 4
+        for _ in range(20):
+            state = ExtendedStabilizerState(n)
+            ref = dense_states.basis_state([0] * n)
+            for _ in range(30):
+                gate = rng.integers(0, 9)
+                q1, q2 = (int(q) for q in rng.choice(n, 2, replace=False))
+                if gate < 7:
+                    name = "XYZHKST"[gate]
+                    getattr(state, "apply_" + name)(q1)
+                    ref = dense_states.apply_gate(ref, _GATES[name], [q1])
+                elif gate == 7:
+                    state.apply_CNOT(q1, q2)
+                    ref = dense_states.apply_gate(ref, dense_states.CNOT, [q1, q2])
+                else:
+                    state.apply_CZ(q1, q2)
+                    ref = dense_states.apply_gate(ref, dense_states.CPHASE, [q1, q2])
+            self.assertAlmostEqual(_fidelity(state.to_state_vector(), ref), 1)
+
+    def test_T_doubles_terms(self):
+        state = ExtendedStabilizerState(2)
+        # T is diagonal on |0>
+        state.apply_T(0)
+        self.assertEqual(state.num_terms, 1)
+        state.apply_H(0)
+        state.apply_T(0)
+        self.assertEqual(state.num_terms, 2)
+
+    def test_probabilities_and_expectation(self):
+        rng = np.random.default_rng(7)
+        n = 3
+        for _ in range(10):
+            state = ExtendedStabilizerState(n)
+            ref = dense_states.basis_state([0] * n)
+            for _ in range(15):
+                name = "XYZHKST"[rng.integers(0, 7)]
+                q = int(rng.integers(0, n))
+                getattr(state, "apply_" + name)(q)
+                ref = dense_states.apply_gate(ref, _GATES[name], [q])
+                q1, q2 = (int(q) for q in rng.choice(n, 2, replace=False))
+                state.apply_CNOT(q1, q2)
+                ref = dense_states.apply_gate(ref, dense_states.CNOT, [q1, q2])
+            for positions in [[0], [2, 1], [1, 0, 2]]:
+                self.assertTrue(np.allclose(state.probabilities(positions), dense_states.probabilities(ref, positions)))
+            for operator in ["XII", "ZYX", "IZZ", "YYY"]:
+                expected = dense_states.expectation(ref, operator, list(range(n)))
+                self.assertAlmostEqual(state.expectation(operator), expected)
+
+    def test_measure(self):
+        for _ in range(10):
+            state = ExtendedStabilizerState(2)
+            state.apply_H(0)
+            state.apply_T(0)
+            state.apply_H(0)
+            state.apply_CNOT(0, 1)
+            outcome = state.measure(0)
+            self.assertEqual(state.measure(1), outcome)
+            self.assertEqual(state.num_terms, 1)
+            self.assertAlmostEqual(_fidelity(state.to_state_vector(), dense_states.basis_state([outcome] * 2)), 1)
+
+    def test_measure_statistics(self):
+        # After H T H the probability of 1 is sin(pi / 8) ^ 2
+        ones = 0
+        for _ in range(400):
+            state = ExtendedStabilizerState(1)
+            state.apply_H(0)
+            state.apply_T(0)
+            state.apply_H(0)
+            ones += state.measure(0)
+        self.assertAlmostEqual(ones / 400, np.sin(np.pi / 8) ** 2, delta=0.07)
+
+    def test_precision(self):
+        exact = ExtendedStabilizerState(1)
+        truncated = ExtendedStabilizerState(1, precision=0.2)
+        for state in [exact, truncated]:
+            state.apply_H(0)
+            state.apply_T(0)
+            state.apply_H(0)
+        self.assertEqual(exact.num_terms, 2)
+        self.assertEqual(truncated.num_terms, 1)
+
+    def test_tensor_product_and_lists(self):
+        state1 = ExtendedStabilizerState(1)
+        state1.apply_H(0)
+        state1.apply_T(0)
+        state1.apply_H(0)
+        state2 = ExtendedStabilizerState(2)
+        state2.apply_H(0)
+        state2.apply_CNOT(0, 1)
+        state = state1.tensor_product(ExtendedStabilizerState.from_lists(*state2.to_lists()))
+        self.assertEqual(state.num_qubits, 3)
+        ref = dense_states.tensor(state1.to_state_vector(), state2.to_state_vector())
+        self.assertAlmostEqual(_fidelity(state.to_state_vector(), ref), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
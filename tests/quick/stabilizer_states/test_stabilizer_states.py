@@ -135,6 +135,20 @@ class TestStabilizerStates(unittest.TestCase):
 
         self.assertTrue(s1 == s2)
 
+    def test_to_packed(self):
+        s1 = StabilizerState(nx.complete_graph(11))
+        s1.apply_S(3)
+        s1.apply_X(5)
+        x_part, z_part, phases = s1.to_packed()
+        self.assertEqual(x_part.shape, (11, 2))
+        self.assertEqual(phases.shape, (2,))
+        s2 = StabilizerState.from_packed(x_part, z_part, phases, 11)
+        self.assertEqual(s2.num_qubits, 11)
+        self.assertTrue(np.array_equal(s1.to_array(), s2.to_array()))
+
+        s3 = StabilizerState.from_packed(*StabilizerState().to_packed(), 0)
+        self.assertEqual(s3.num_qubits, 0)
+
     def test_tensor_product(self):
         s1 = StabilizerState([[0, 1]])  # The state |0>
         s2 = StabilizerState([[0, 1]])  # The state |0>
@@ -386,6 +400,58 @@ class TestStabilizerStates(unittest.TestCase):
                 output = s.contains(stabilizer)
                 self.assertEqual(output, expected)
 
+    def test_expectation(self):
+        tests = [  # operator, expected
+            ("XX", 1),
+            ("-1YY", 1),
+            ("YY", -1),
+            ("ZZ", 1),
+            ("ZI", 0),
+            ("XY", 0),
+        ]
+
+        for operator, expected in tests:
+            with self.subTest(operator=operator, expected=expected):
+                s = StabilizerState(["XX", "ZZ"])
+                self.assertEqual(s.expectation(operator), expected)
+
+    def test_probabilities(self):
+        tests = [  # stabilizers, positions, expected
+            (["ZI", "IZ"], [0, 1], [1, 0, 0, 0]),
+            (["-1ZI", "IZ"], [1, 0], [0, 1, 0, 0]),
+            (["XX", "ZZ"], [0, 1], [0.5, 0, 0, 0.5]),
+            (["XX", "-1ZZ"], [1, 0], [0, 0.5, 0.5, 0]),
+            (["XX", "ZZ"], [1], [0.5, 0.5]),
+            (["XXX", "ZZI", "IZZ"], [2, 0], [0.5, 0, 0, 0.5]),
+            (["XI", "-1IZ"], [0, 1], [0, 0.5, 0, 0.5]),
+        ]
+
+        for stabilizers, positions, expected in tests:
+            with self.subTest(stabilizers=stabilizers, positions=positions):
+                s = StabilizerState(stabilizers)
+                self.assertTrue(np.allclose(s.probabilities(positions), expected))
+
+    def test_separable_positions(self):
+        tests = [  # stabilizers, expected
+            (["XX", "ZZ"], []),
+            (["XXI", "ZZI", "-1IIY"], [2]),
+            (["XIZ", "-1IZI", "ZIX"], [1]),
+            (["ZI", "IX"], [0, 1]),
+        ]
+
+        for stabilizers, expected in tests:
+            with self.subTest(stabilizers=stabilizers):
+                s = StabilizerState(stabilizers)
+                self.assertEqual(s.separable_positions(), expected)
+
+    def test_single_qubit_state(self):
+        s = StabilizerState(["XXI", "ZZI", "-1IIY"])
+        self.assertEqual(s.single_qubit_state(2), StabilizerState(["-1Y"]))
+        s = StabilizerState(["XIZ", "-1IZI", "ZIX"])
+        self.assertEqual(s.single_qubit_state(1), StabilizerState(["-1Z"]))
+        with self.assertRaises(ValueError):
+            s.single_qubit_state(0)
+
     def test_measure_eigenstate(self):
         tests = [  # stabilizers, qubit, expected
             (["ZI", "IZ"], 0, 0),
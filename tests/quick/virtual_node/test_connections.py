@@ -0,0 +1,106 @@
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+
+from simulaqron.settings import simulaqron_settings
+from simulaqron.virtual_node.virtual import virtualNode
+
+
+class TestConnections(unittest.TestCase):
+    def setUp(self):
+        myID = SimpleNamespace(name="Alice")
+        self.node = virtualNode(myID, SimpleNamespace(hostDict={"Alice": myID}))
+
+    def test_own_connection(self):
+        d = self.node.get_connection("Alice")
+        self.assertIs(d.result, self.node.myID)
+
+    def test_waiters_resume_on_connection(self):
+        bob = SimpleNamespace(name="Bob")
+        results = []
+        self.node.get_connection("Bob").addCallback(results.append)
+        self.node.get_connection("Bob").addCallback(results.append)
+        self.assertEqual(results, [])
+
+        root = object()
+        self.node.handle_connection(root, bob)
+        self.assertEqual(results, [bob, bob])
+        self.assertIs(bob.root, root)
+        self.assertIs(self.node.get_connection("Bob").result, bob)
+
+    def test_retry_delay(self):
+        maxDelay = simulaqron_settings.conn_retry_time
+        delays = [self.node.conn_retry_delay("Bob") for _ in range(20)]
+        for attempt, delay in enumerate(delays):
+            expected = min(maxDelay, self.node.minConnRetryTime * 2 ** attempt)
+            self.assertGreaterEqual(delay, expected / 2)
+            self.assertLessEqual(delay, expected)
+        self.assertGreater(delays[-1], maxDelay / 2 - 1e-9)
+
+        # A successful connection resets the delay
+        self.node.handle_connection(object(), SimpleNamespace(name="Bob"))
+        self.assertLessEqual(self.node.conn_retry_delay("Bob"), self.node.minConnRetryTime)
+
+
+def make_root():
+    """
+    Returns a stand-in for the root object of another node, with the parts of its broker used by the node.
+    """
+    transport = SimpleNamespace(closed=False)
+    transport.loseConnection = lambda: setattr(transport, "closed", True)
+    return SimpleNamespace(broker=SimpleNamespace(waitingForAnswers={}, localObjects={}, transport=transport))
+
+
+class TestLazyConnections(unittest.TestCase):
+    def setUp(self):
+        self.hosts = {name: SimpleNamespace(name=name) for name in ["Alice", "Bob", "Charlie", "David", "Eve"]}
+        self.connecting = []
+
+        def connect_to_node(node, host):
+            node._connecting.add(host.name)
+            self.connecting.append(host.name)
+
+        patcher = mock.patch.object(virtualNode, "connect_to_node", connect_to_node)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.node = virtualNode(self.hosts["Alice"], SimpleNamespace(hostDict=self.hosts), neighbors=["Bob"])
+
+    def connect(self, name):
+        root = make_root()
+        self.node.handle_connection(root, self.hosts[name])
+        return root
+
+    def test_neighbors_only(self):
+        self.assertEqual(self.connecting, ["Bob"])
+        self.assertFalse(self.node.remote_check_connections())
+        self.connect("Bob")
+        self.assertTrue(self.node.remote_check_connections())
+
+    def test_connect_on_first_use(self):
+        results = []
+        self.node.get_connection("Charlie").addCallback(results.append)
+        self.node.get_connection("Charlie").addCallback(results.append)
+        self.assertEqual(self.connecting, ["Bob", "Charlie"])
+        self.connect("Charlie")
+        self.assertEqual(results, [self.hosts["Charlie"]] * 2)
+
+    def test_close_least_recently_used(self):
+        with mock.patch.dict(simulaqron_settings._config, max_connections=2):
+            bob = self.connect("Bob")
+            charlie = self.connect("Charlie")
+            self.node.get_connection("Bob")
+            david = self.connect("David")
+            self.assertTrue(charlie.broker.transport.closed)
+            self.assertEqual(list(self.node.conn), ["Alice", "Bob", "David"])
+
+            # Connections in use are kept
+            bob.broker.waitingForAnswers[1] = None
+            self.node.virtQubits[0] = SimpleNamespace(simNode=self.hosts["David"])
+            self.connect("Eve")
+            self.assertEqual(list(self.node.conn), ["Alice", "Bob", "David", "Eve"])
+            self.assertFalse(bob.broker.transport.closed)
+            self.assertFalse(david.broker.transport.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from types import SimpleNamespace
+
+from simulaqron.virtual_node.virtual import virtualNode
+
+
+class TestLocationDirectory(unittest.TestCase):
+    def setUp(self):
+        myID = SimpleNamespace(name="Alice")
+        self.node = virtualNode(myID, SimpleNamespace(hostDict={"Alice": myID}))
+
+    def test_new_qubits(self):
+        q1 = self.node.remote_new_qubit()
+        q2 = self.node.remote_new_qubit()
+        self.assertEqual(q1.simQubit.location, ("Alice", q1.num))
+        self.assertEqual(q2.simQubit.location, ("Alice", q2.num))
+
+    def test_register_del_and_update(self):
+        q1 = self.node.remote_new_qubit()
+        q2 = self.node.remote_new_qubit()
+        q3 = self.node.remote_new_qubit()
+        sim1, sim2 = q1.simQubit, q2.simQubit
+
+        self.node._get_global_lock()
+        sim1.lock()
+        sim2.lock()
+        self.node.local_merge_regs(sim1, sim2)
+        sim1.unlock()
+        sim2.unlock()
+        expectedBytes = sim1.register.state_nbytes()
+        (payload, _, _, locations, nbytes) = self.node.remote_get_register_del(sim2.simNum)
+        self.node._release_global_lock()
+
+        self.assertEqual(len(payload.qubits), 2)
+        self.assertEqual(nbytes, expectedBytes)
+        self.assertEqual(
+            dict(zip(payload.qubits, locations)), {sim1.num: ("Alice", q1.num), sim2.num: ("Alice", q2.num)}
+        )
+
+        # Only the listed virtual qubits are updated
+        d = self.node.remote_update_virtual_merge("Alice", {q1.num: sim2, q2.num: sim1})
+        self.assertTrue(d.called)
+        self.assertIs(q1.simQubit, sim2)
+        self.assertIs(q2.simQubit, sim1)
+        self.assertIsNot(q3.simQubit, sim1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+import unittest
+from types import SimpleNamespace
+
+from simulaqron.virtual_node.basics import countingLock, lockStatistics, virtNetError
+from simulaqron.virtual_node.virtual import virtualNode
+
+
+class TestCountingLock(unittest.TestCase):
+    def test_uncontended(self):
+        lock = countingLock()
+        d = lock.acquire()
+        self.assertTrue(d.called)
+        lock.release()
+        self.assertEqual(lock.statistics.to_dict(), {
+            "acquisitions": 1,
+            "contended": 0,
+            "wait_time": 0.0,
+            "max_wait_time": 0.0,
+        })
+
+    def test_handoff_in_order(self):
+        lock = countingLock()
+        order = []
+        lock.acquire()
+        lock.acquire().addCallback(lambda _: order.append(1))
+        lock.acquire().addCallback(lambda _: order.append(2))
+        self.assertEqual(order, [])
+
+        # Releasing hands the lock to the next waiter right away
+        lock.release()
+        self.assertEqual(order, [1])
+        self.assertTrue(lock.locked)
+        lock.release()
+        self.assertEqual(order, [1, 2])
+        lock.release()
+        self.assertFalse(lock.locked)
+
+        self.assertEqual(lock.statistics.acquisitions, 3)
+        self.assertEqual(lock.statistics.contended, 2)
+        self.assertGreaterEqual(lock.statistics.waitTime, lock.statistics.maxWaitTime)
+
+    def test_try_acquire(self):
+        lock = countingLock()
+        self.assertTrue(lock.try_acquire())
+        self.assertTrue(lock.locked)
+        self.assertFalse(lock.try_acquire())
+        d = lock.acquire()
+        self.assertFalse(d.called)
+        lock.release()
+        self.assertTrue(d.called)
+        lock.release()
+        self.assertFalse(lock.locked)
+        self.assertEqual(lock.statistics.acquisitions, 2)
+
+    def test_shared_statistics(self):
+        statistics = lockStatistics()
+        lock1 = countingLock(statistics)
+        lock2 = countingLock(statistics)
+        lock1.acquire()
+        lock2.acquire()
+        lock1.acquire()
+        lock1.release()
+        self.assertEqual(statistics.acquisitions, 3)
+        self.assertEqual(statistics.contended, 1)
+
+
+class TestRegisterLocks(unittest.TestCase):
+    def setUp(self):
+        self.node = virtualNode(SimpleNamespace(name="Alice"), SimpleNamespace(hostDict={}))
+
+    def test_gates_on_other_registers_proceed(self):
+        q1 = self.node.remote_new_qubit()
+        q2 = self.node.remote_new_qubit()
+        self.assertIsNot(q1.simQubit.register, q2.simQubit.register)
+
+        # Neither the node lock nor the lock of another register hold up a single qubit gate
+        self.node._get_global_lock()
+        self.assertTrue(q1.simQubit.remote_lock_with_register().called)
+        self.assertIsNone(q2.remote_apply_X())
+        self.assertFalse(q2.simQubit.register.lock.locked)
+
+        # A gate on the locked register waits for it
+        d = q1.remote_apply_X()
+        self.assertFalse(d.called)
+        q1.simQubit.remote_unlock_with_register()
+        self.assertTrue(d.called)
+        self.node._release_global_lock()
+
+        self.assertEqual(q1.remote_measure(inplace=True), 1)
+        self.assertEqual(q2.remote_measure(inplace=True), 1)
+
+
+class Host:
+    def __init__(self, name):
+        self.name = name
+
+
+class TestLocalFastPath(unittest.TestCase):
+    def setUp(self):
+        myID = Host("Alice")
+        self.node = virtualNode(myID, SimpleNamespace(hostDict={"Alice": myID}))
+
+    def test_measure(self):
+        q = self.node.remote_new_qubit()
+        self.assertIsNone(q.remote_apply_X())
+        self.assertEqual(q.remote_measure(), 1)
+        self.assertEqual(self.node.virtQubits, {})
+        self.assertEqual(self.node.simQubits, {})
+
+    def test_measure_waits_for_node_lock(self):
+        q = self.node.remote_new_qubit()
+        self.node._get_global_lock()
+        d = q.remote_measure()
+        self.assertFalse(d.called)
+        self.node._release_global_lock()
+        self.assertEqual(d.result, 0)
+        self.assertEqual(self.node.simQubits, {})
+
+    def test_two_qubit_gate(self):
+        q1 = self.node.remote_new_qubit()
+        q2 = self.node.remote_new_qubit()
+        q1.remote_apply_X()
+
+        # The registers are merged first, which needs the node lock
+        d = q1.remote_cnot_onto(q2)
+        self.assertTrue(d.called)
+        self.assertIs(q1.simQubit.register, q2.simQubit.register)
+
+        # In the same register the gate is applied directly, unless a qubit of the register is locked
+        self.assertIsNone(q1.remote_cnot_onto(q2))
+        q3 = self.node.remote_new_qubit()
+        q1.remote_cnot_onto(q3)
+        q3.simQubit.lock()
+        d = q1.remote_cnot_onto(q2)
+        self.assertFalse(d.called)
+        q3.simQubit.unlock()
+        self.assertTrue(d.called)
+        self.assertFalse(self.node._lock.locked)
+
+        self.assertEqual(q1.remote_measure(), 1)
+        self.assertEqual(q2.remote_measure(), 1)
+        self.assertEqual(q3.remote_measure(), 1)
+
+
+class TestLockSets(unittest.TestCase):
+    def setUp(self):
+        hosts = {name: Host(name) for name in ["Alice", "Bob", "Carol"]}
+        config = SimpleNamespace(hostDict=hosts)
+        self.nodes = {name: virtualNode(host, config, neighbors=[]) for name, host in hosts.items()}
+        for node in self.nodes.values():
+            for name, other in self.nodes.items():
+                node.conn[name] = SimpleNamespace(name=name, root=other)
+
+    def test_failed_lock_set_is_released(self):
+        results = []
+        self.nodes["Carol"].remote_acquire_lock_set(["Bob", "Alice", "Dave"]).addBoth(results.append)
+        self.assertTrue(results[0].check(virtNetError))
+        for node in self.nodes.values():
+            self.assertFalse(node._lock.locked)
+        self.assertFalse(self.nodes["Carol"]._lockSetLock.locked)
+
+    def test_send_locks_in_name_order(self):
+        (alice, bob) = (self.nodes["Alice"], self.nodes["Bob"])
+        simQubit = alice.remote_new_qubit().simQubit
+        qubit = bob.virtQubits[bob.remote_add_qubit("Alice", simQubit).result]
+
+        # The simulating node Alice is locked before the sending node Bob, as two qubit gates do
+        alice._get_global_lock()
+        d = bob.remote_send_qubit(qubit, "Carol")
+        self.assertFalse(d.called)
+        self.assertFalse(bob._lock.locked)
+        alice._release_global_lock()
+        self.assertTrue(d.called)
+        self.assertIs(self.nodes["Carol"].virtQubits[d.result].simQubit, simQubit)
+        self.assertEqual(bob.virtQubits, {})
+        for node in self.nodes.values():
+            self.assertFalse(node._lock.locked)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.python.threadpool import ThreadPool
+from twisted.trial import unittest
+
+from simulaqron.settings import simulaqron_settings
+from simulaqron.virtual_node import basics
+from simulaqron.virtual_node.stabilizer_simulator import stabilizerEngine
+from simulaqron.virtual_node.virtual import virtualNode
+
+
+class Host:
+    def __init__(self, name):
+        self.name = name
+
+
+class TestOffload(unittest.TestCase):
+    def setUp(self):
+        pool = ThreadPool(0, 2)
+        pool.start()
+        self.addCleanup(pool.stop)
+        for patcher in [
+            mock.patch.object(basics, "get_offload_pool", return_value=pool),
+            mock.patch.dict(simulaqron_settings._config, offload_threshold=1),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_inline(self):
+        eng = stabilizerEngine("Alice", 0)
+        num = eng.add_fresh_qubit()
+        with mock.patch.dict(simulaqron_settings._config, offload_threshold=0):
+            self.assertTrue(eng.runs_inline())
+            self.assertIsNone(eng.run(eng.apply_X, num))
+            self.assertEqual(eng.run(eng.measure_qubit_inplace, num), 1)
+
+    @inlineCallbacks
+    def test_thread(self):
+        eng = stabilizerEngine("Alice", 0)
+        num = eng.add_fresh_qubit()
+        threads = []
+
+        def apply_X(qubitNum):
+            threads.append(threading.current_thread())
+            eng.apply_X(qubitNum)
+
+        d = eng.run(apply_X, num)
+        self.assertIsInstance(d, Deferred)
+        self.assertFalse(eng.runs_inline())
+
+        # Small operations requested meanwhile wait until the operations before them have finished
+        with mock.patch.dict(simulaqron_settings._config, offload_threshold=0):
+            outcome = eng.run(eng.measure_qubit_inplace, num)
+            self.assertIsInstance(outcome, Deferred)
+        outcome = yield outcome
+        self.assertEqual(outcome, 1)
+        self.assertTrue(d.called)
+        self.assertNotEqual(threads, [threading.current_thread()])
+        self.assertEqual(eng._pending, 0)
+
+    @inlineCallbacks
+    def test_virtual_node(self):
+        myID = Host("Alice")
+        node = virtualNode(myID, SimpleNamespace(hostDict={"Alice": myID}))
+        q1 = node.remote_new_qubit()
+        q2 = node.remote_new_qubit()
+
+        d = q1.remote_apply_X()
+        self.assertIsInstance(d, Deferred)
+        yield d
+        yield q1.remote_cnot_onto(q2)
+        self.assertIs(q1.simQubit.register, q2.simQubit.register)
+
+        outcomes = yield node.remote_apply_sequence([("measure", q1.num, [True]), ("measure", q2.num, [])])
+        self.assertEqual(outcomes, [1, 1])
+        self.assertFalse(node._lock.locked)
+        self.assertEqual(list(node.virtQubits), [q1.num])
+
+    @inlineCallbacks
+    def test_remove(self):
+        myID = Host("Alice")
+        node = virtualNode(myID, SimpleNamespace(hostDict={"Alice": myID}))
+        (q1, q2, q3) = [node.remote_new_qubit() for _ in range(3)]
+        yield q1.remote_apply_H()
+        yield q1.remote_cnot_onto(q2)
+        yield q2.remote_cnot_onto(q3)
+        register = q1.simQubit.register
+        threads = {}
+
+        def record(name, func):
+            def call(*args):
+                threads.setdefault(name, []).append(threading.current_thread())
+                return func(*args)
+            return call
+
+        for name in ["reset_qubit", "separable_qubits", "split_qubit"]:
+            patcher = mock.patch.object(register, name, record(name, getattr(register, name)))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # The measured qubit is reset and the others, now in a product state, are split off in the thread pool
+        d = q1.remote_measure()
+        self.assertIsInstance(d, Deferred)
+        outcome = yield d
+        self.assertEqual(sorted(threads), ["reset_qubit", "separable_qubits", "split_qubit"])
+        for calls in threads.values():
+            self.assertNotIn(threading.current_thread(), calls)
+        self.assertIsNot(q2.simQubit.register, q3.simQubit.register)
+        outcomes = yield node.remote_apply_sequence([("measure", q2.num, []), ("measure", q3.num, [])])
+        self.assertEqual(outcomes, [outcome, outcome])
+        self.assertFalse(node._lock.locked)
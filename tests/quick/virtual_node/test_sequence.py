@@ -0,0 +1,121 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from simulaqron.virtual_node.basics import quantumError
+from simulaqron.virtual_node.virtual import virtualNode
+
+
+class Host:
+    def __init__(self, name):
+        self.name = name
+
+
+class TestApplySequence(unittest.TestCase):
+    def setUp(self):
+        myID = Host("Alice")
+        self.node = virtualNode(myID, SimpleNamespace(hostDict={"Alice": myID}))
+
+    def result(self, d):
+        results = []
+        d.addBoth(results.append)
+        self.assertEqual(len(results), 1)
+        return results[0]
+
+    def apply(self, ops):
+        return self.result(self.node.remote_apply_sequence(ops))
+
+    def test_ghz(self):
+        q1 = self.node.remote_new_qubit()
+        q2 = self.node.remote_new_qubit()
+        q3 = self.node.remote_new_qubit()
+        acquisitions = self.node._lock.statistics.acquisitions
+
+        outcomes = self.apply([
+            ("apply_H", q1.num, []),
+            ("cnot_onto", (q1.num, q2.num), []),
+            ("cnot_onto", [q2.num, q3.num], []),
+            ("measure", q1.num, []),
+            ("measure", q2.num, [True]),
+            ("measure", q3.num, [False]),
+        ])
+        self.assertEqual(len(outcomes), 3)
+        self.assertEqual(len(set(outcomes)), 1)
+
+        # The node is locked once for the whole sequence and the measured qubits are removed
+        self.assertEqual(self.node._lock.statistics.acquisitions, acquisitions + 1)
+        self.assertFalse(self.node._lock.locked)
+        self.assertEqual(list(self.node.virtQubits), [q2.num])
+        self.assertEqual([q.simNum for q in self.node.simQubits.values()], [q2.simQubit.simNum])
+        self.assertFalse(q2.simQubit.isLocked())
+
+    def test_gate_after_measurement(self):
+        for _ in range(20):
+            q1 = self.node.remote_new_qubit()
+            q2 = self.node.remote_new_qubit()
+            q3 = self.node.remote_new_qubit()
+
+            # Measuring q1 leaves q2 and q3 in a product state, which are then split into registers of their own
+            outcomes = self.apply([
+                ("apply_H", q1.num, []),
+                ("cnot_onto", (q1.num, q2.num), []),
+                ("cnot_onto", (q2.num, q3.num), []),
+                ("measure", q1.num, []),
+                ("cnot_onto", (q2.num, q3.num), []),
+                ("measure", q2.num, []),
+                ("measure", q3.num, []),
+            ])
+            self.assertEqual(outcomes[1:], [outcomes[0], 0])
+            self.assertFalse(self.node._lock.locked)
+
+    def test_measure_qubits(self):
+        qubits = [self.node.remote_new_qubit() for _ in range(4)]
+        ops = [("apply_H", qubits[0].num, []), ("apply_X", qubits[3].num, [])]
+        ops += [("cnot_onto", (qubits[0].num, q.num), []) for q in qubits[1:3]]
+        self.apply(ops)
+        register = qubits[0].simQubit.register
+
+        # The qubits in the same register are measured with a single call to the engine
+        with mock.patch.object(register, "measure_qubits", wraps=register.measure_qubits) as measure_qubits:
+            outcomes = self.result(self.node.remote_measure_qubits([q.num for q in qubits[:3]], inplace=True))
+        measure_qubits.assert_called_once()
+        self.assertEqual(len(set(outcomes)), 1)
+
+        outcomes = self.result(self.node.remote_measure_qubits([q.num for q in reversed(qubits)]))
+        self.assertEqual(outcomes, [1] + [outcomes[1]] * 3)
+        self.assertEqual(self.node.virtQubits, {})
+        self.assertEqual(self.node.simQubits, {})
+
+    def test_probabilities(self):
+        (q1, q2, q3) = [self.node.remote_new_qubit() for _ in range(3)]
+        self.apply([("apply_H", q1.num, []), ("cnot_onto", (q1.num, q2.num), []), ("apply_X", q3.num, [])])
+        probs = self.result(self.node.remote_probabilities([q2.num, q3.num, q1.num]))
+        self.assertEqual(len(probs), 8)
+        self.assertTrue(np.allclose(probs, [0, 0, 0.5, 0, 0, 0, 0, 0.5]))
+        self.assertFalse(self.node._lock.locked)
+        self.assertTrue(self.result(self.node.remote_probabilities([q1.num, q1.num])).check(quantumError))
+
+    def test_single_qubit_gates(self):
+        q = self.node.remote_new_qubit()
+        ops = [("apply_X", q.num, []), ("apply_H", q.num, []), ("apply_H", q.num, []), ("measure", q.num, [])]
+        self.assertEqual(self.apply(ops), [1])
+
+    def test_invalid(self):
+        q = self.node.remote_new_qubit()
+        for ops in [
+            [("apply_W", q.num, [])],
+            [("apply_X", q.num + 1, [])],
+            [("cnot_onto", (q.num, q.num), [])],
+            [("measure", q.num, []), ("apply_X", q.num, [])],
+        ]:
+            with self.subTest(ops=ops):
+                failure = self.apply(ops)
+                self.assertTrue(failure.check(quantumError))
+                self.assertFalse(self.node._lock.locked)
+        self.assertEqual(self.apply([("measure", q.num, [True])]), [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from simulaqron.virtual_node.virtual import virtualNode
+
+
+class Host:
+    def __init__(self, name):
+        self.name = name
+
+
+class TestSpareQubits(unittest.TestCase):
+    def setUp(self):
+        myID = Host("Alice")
+        self.node = virtualNode(myID, SimpleNamespace(hostDict={"Alice": myID}))
+
+    def result(self, d):
+        results = []
+        d.addBoth(results.append)
+        self.assertEqual(len(results), 1)
+        return results[0]
+
+    def measure_ghz(self):
+        """
+        Measures one qubit of a GHZ state of three qubits, and returns the qubit left in the register which keeps the
+        slot of the measured qubit as a spare.
+        """
+        (q1, q2, q3) = [self.node.remote_new_qubit() for _ in range(3)]
+        q1.remote_apply_H()
+        q1.remote_cnot_onto(q2)
+        q2.remote_cnot_onto(q3)
+        register = q1.simQubit.register
+        q1.remote_measure()
+        qubit = q2 if q2.simQubit.register is register else q3
+        self.assertIs(qubit.simQubit.register, register)
+        self.assertTrue(register.spareQubits)
+        return qubit
+
+    def test_register_RI(self):
+        for get_RI in [lambda q: q.remote_get_register_RI(), self.node.remote_get_register_RI]:
+            qubit = self.measure_ghz()
+            (realM, imagM) = self.result(get_RI(qubit))
+
+            # The spare slot of the measured qubit is not part of the returned state
+            self.assertEqual(qubit.simQubit.register.activeQubits, 1)
+            self.assertEqual((realM, imagM), tuple(qubit.simQubit.remote_get_register_RI()))
+
+    def test_reuse_unlocked(self):
+        register = self.measure_ghz().simQubit.register
+        spare = list(register.spareQubits)
+
+        # No slot is taken over while an operation holds the register
+        register.lock.acquire()
+        q4 = self.node.remote_new_qubit()
+        self.assertIsNot(q4.simQubit.register, register)
+        self.assertEqual(register.spareQubits, spare)
+        register.lock.release()
+
+        q5 = self.node.remote_new_qubit()
+        self.assertIs(q5.simQubit.register, register)
+        self.assertEqual(register.spareQubits, [])
+        self.assertFalse(register.lock.locked)
+
+        # The register has no spare qubits left and is dropped from the index
+        self.assertIsNone(self.node._get_spare_register())
+        self.assertEqual(self.node._spareRegs, {})
+
+    def test_spares_capped(self):
+        qubits = [self.node.remote_new_qubit() for _ in range(4)]
+        qubits[0].remote_apply_H()
+        for (control, target) in zip(qubits, qubits[1:]):
+            control.remote_cnot_onto(target)
+        register = qubits[0].simQubit.register
+
+        # Keep the measured out qubits in the register instead of splitting it
+        with mock.patch.object(register, "should_split", return_value=False):
+            for qubit in qubits[:3]:
+                qubit.remote_measure()
+                self.assertLessEqual(len(register.spareQubits), register.activeQubits - len(register.spareQubits))
+        self.assertIs(qubits[3].simQubit.register, register)
+        self.assertEqual(register.activeQubits, 2)
+        self.assertEqual(len(register.spareQubits), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()